@@ -0,0 +1,59 @@
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import get_settings
+from app.db.base import get_async_db
+from app.db.models import User, UserRole
+from app.services.dataloader import DataLoader
+from app.services.principal_cache import principal_cache
+from app.services.read_your_writes import read_your_writes
+from app.services.user_service import UserService
+
+settings = get_settings()
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/users/login")
+
+def get_loader(db: AsyncSession = Depends(get_async_db)) -> DataLoader:
+    """每个请求一个批量加载器，与请求共用同一个会话"""
+    return DataLoader(db)
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    # 稳态下已验证的令牌直接命中缓存，不访问用户表
+    cached_user = principal_cache.get(token)
+    if cached_user is not None:
+        await read_your_writes.apply(db, cached_user.id)
+        return cached_user
+
+    credentials_exception = HTTPException(
+        status_code=401,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(
+            token,
+            settings.SECRET_KEY,
+            algorithms=[settings.ALGORITHM]
+        )
+        subject = payload.get("sub")
+        if subject is None:
+            raise credentials_exception
+        user_id = int(subject)
+    except (JWTError, ValueError):
+        raise credentials_exception
+
+    user = await UserService.get_user_by_id(db, user_id)
+    if user is None:
+        raise credentials_exception
+    principal_cache.set(token, user, payload.get("exp"))
+    await read_your_writes.apply(db, user.id)
+    return user
+
+async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    """只允许管理员访问"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return current_user
@@ -0,0 +1,12 @@
+from typing import Any
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+def render(adapter: TypeAdapter, data: Any, status_code: int = 200) -> Response:
+    """按响应模型校验后由 pydantic-core 直接序列化为 bytes，跳过 jsonable_encoder"""
+    value = adapter.validate_python(data, from_attributes=True)
+    return Response(
+        content=adapter.dump_json(value),
+        status_code=status_code,
+        media_type="application/json"
+    )
@@ -0,0 +1,73 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from app.api.deps import get_current_user
+from app.api.responses import render
+from app.db.base import get_async_db
+from app.db.models import Order, User, UserRole
+from app.services.metering import RESOLUTIONS, traffic_meter
+from pydantic import BaseModel, TypeAdapter
+
+router = APIRouter()
+
+# 未指定 start 时各粒度默认查询的时间范围
+DEFAULT_WINDOWS = {
+    "minute": timedelta(hours=1),
+    "hour": timedelta(days=1),
+    "day": timedelta(days=30),
+}
+
+class UsagePoint(BaseModel):
+    bucket: int
+    bytes_in: int
+    bytes_out: int
+
+class UsageResponse(BaseModel):
+    order_id: int
+    resolution: str
+    start: datetime
+    end: datetime
+    bytes_in: int
+    bytes_out: int
+    items: List[UsagePoint]
+
+USAGE_ADAPTER = TypeAdapter(UsageResponse)
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """带时区的参数转为无时区UTC，与库中时间保持一致"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+@router.get("/{order_id}/usage", response_model=UsageResponse)
+async def get_order_usage(
+    order_id: int,
+    resolution: str = Query("hour", pattern="^(minute|hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """订单流量用量，读取分钟/小时/天汇总，bucket 为桶起始的Unix时间戳"""
+    order = await db.get(Order, order_id)
+    if order is None or (
+        order.user_id != current_user.id and current_user.role != UserRole.ADMIN
+    ):
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    end = _as_utc(end) or datetime.utcnow()
+    start = _as_utc(start) or end - DEFAULT_WINDOWS[resolution]
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    rollups = await traffic_meter.get_usage(db, order_id, RESOLUTIONS[resolution], start, end)
+    return render(USAGE_ADAPTER, {
+        "order_id": order_id,
+        "resolution": resolution,
+        "start": start,
+        "end": end,
+        "bytes_in": sum(rollup.bytes_in for rollup in rollups),
+        "bytes_out": sum(rollup.bytes_out for rollup in rollups),
+        "items": rollups,
+    })
@@ -1,14 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, Security
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Security
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from datetime import timedelta
+from uuid import uuid4
 from app.core.config import get_settings
 from app.core.security import create_access_token, validate_password
-from app.db.base import get_db
+from app.api.deps import get_current_admin, get_current_user
+from app.api.responses import render
+from app.db.base import get_async_db
 from app.db.models import User, UserRole
+from app.services.query_optimizer import CountStrategy
 from app.services.user_service import UserService
-from pydantic import BaseModel, EmailStr
+from app.services.background_tasks import task_manager
+from app.services.user_import import IMPORT_FORMATS, ImportTooLarge, import_users_task, user_importer
+from pydantic import BaseModel, ConfigDict, EmailStr, TypeAdapter
 from fastapi_limiter.depends import RateLimiter
 
 settings = get_settings()
@@ -22,23 +28,36 @@ class UserCreate(BaseModel):
     whmcs_client_id: int = None
 
 class UserResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     username: str
     email: str
     role: UserRole
     is_active: bool
 
-    class Config:
-        from_attributes = True
+class UserPage(BaseModel):
+    items: List[UserResponse]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+class UserSearchPage(BaseModel):
+    items: List[UserResponse]
+    page: int
+    has_more: bool
 
 class Token(BaseModel):
     access_token: str
     token_type: str
 
+# 列表接口直接从ORM行序列化为bytes
+USER_PAGE_ADAPTER = TypeAdapter(UserPage)
+USER_SEARCH_PAGE_ADAPTER = TypeAdapter(UserSearchPage)
+
 @router.post("/login", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _: str = Depends(RateLimiter(times=5, minutes=5))  # 5次/5分钟的限制
 ):
     user = await UserService.authenticate_user(db, form_data.username, form_data.password)
@@ -65,7 +84,7 @@ async def login(
 @router.post("/users", response_model=UserResponse)
 async def create_user(
     user_in: UserCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Security(get_current_user, scopes=["admin"])
 ):
     if not validate_password(user_in.password):
@@ -84,6 +103,75 @@ async def create_user(
     )
     return user
 
+@router.get("/users", response_model=UserPage)
+async def list_users(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    role: Optional[UserRole] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_admin)
+):
+    try:
+        # 用户表写入不频繁，使用缓存的精确计数
+        users, next_cursor, total = await UserService.list_users(
+            db, cursor, limit, role, count_strategy=CountStrategy.CACHED
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return render(
+        USER_PAGE_ADAPTER,
+        {"items": users, "next_cursor": next_cursor, "total": total}
+    )
+
+@router.get("/users/search", response_model=UserSearchPage)
+async def search_users(
+    q: str = Query(..., min_length=1, max_length=100),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_admin)
+):
+    users, has_more = await UserService.search_users(db, q, page, per_page)
+    return render(
+        USER_SEARCH_PAGE_ADAPTER,
+        {"items": users, "page": page, "has_more": has_more}
+    )
+
+@router.post("/users/import", status_code=202)
+async def import_users(
+    request: Request,
+    current_user: User = Depends(get_current_admin)
+):
+    """批量导入用户，请求体为JSON数组、CSV或NDJSON，按Content-Type区分"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    fmt = IMPORT_FORMATS.get(content_type)
+    if fmt is None:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Unsupported content type, expected one of {', '.join(IMPORT_FORMATS)}"
+        )
+    try:
+        path = await user_importer.save_upload(request.stream(), fmt)
+    except ImportTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    task_id = uuid4().hex
+    await task_manager.add_task(
+        task_id, import_users_task, path, fmt,
+        priority="low"
+    )
+    return {"task_id": task_id, "status": "queued"}
+
+@router.get("/users/import/{task_id}")
+async def get_import_status(
+    task_id: str,
+    current_user: User = Depends(get_current_admin)
+):
+    status = await task_manager.get_task_status(task_id)
+    if status["status"] == "not_found":
+        raise HTTPException(status_code=404, detail="Import not found")
+    return status
+
 @router.get("/users/me", response_model=UserResponse)
 async def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
@@ -91,7 +179,7 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
 @router.get("/users/{user_id}", response_model=UserResponse)
 async def read_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Security(get_current_user, scopes=["admin"])
 ):
     user = await UserService.get_user_by_id(db, user_id)
@@ -103,7 +191,7 @@ async def read_user(
 async def update_user(
     user_id: int,
     user_update: UserCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Security(get_current_user, scopes=["admin"])
 ):
     if user_update.password and not validate_password(user_update.password):
@@ -127,7 +215,7 @@ async def update_user(
 @router.delete("/users/{user_id}")
 async def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Security(get_current_user, scopes=["admin"])
 ):
     success = await UserService.delete_user(db, user_id)
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 import os
 from functools import lru_cache
 
@@ -16,25 +16,109 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # 密码哈希进程池配置（默认按CPU核心数）
+    PASSWORD_HASH_WORKERS: Optional[int] = None
+    PASSWORD_HASH_MAX_CONCURRENCY: Optional[int] = None
+    # 批量导入使用独立的进程池，不占用登录校验的进程
+    PASSWORD_HASH_IMPORT_WORKERS: int = 1
+    
+    # 已验证用户缓存配置（实际过期时间不超过令牌exp）
+    PRINCIPAL_CACHE_TTL: int = 300
+    PRINCIPAL_CACHE_MAXSIZE: int = 10000
+    
     # 数据库配置
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./frp_manager.db")
     DB_POOL_SIZE: int = 5
     DB_MAX_OVERFLOW: int = 10
     DB_POOL_TIMEOUT: int = 30
     
+    # SQLite性能配置（仅对文件数据库生效）：WAL模式，单写连接 + 只读连接池
+    SQLITE_PROFILE_ENABLED: bool = True
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT: int = 5000  # 毫秒
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE: int = -64000  # 负数表示KiB
+    SQLITE_READ_POOL_SIZE: int = 4
+    
+    # 只读副本（JSON列表），GET请求的查询轮询分配到健康的副本
+    DATABASE_REPLICA_URLS: List[str] = []
+    REPLICA_HEALTH_CHECK_INTERVAL: float = 10.0
+    # 用户写入后多少秒内的请求仍读主库
+    READ_YOUR_WRITES_TTL: int = 5
+    
     # Redis配置
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     
+    # 两级缓存配置（L1为进程内缓存，L2为Redis）
+    TIERED_CACHE_L1_SIZE: int = 1000
+    TIERED_CACHE_TTL: int = 60
+    TIERED_CACHE_STALE_TTL: int = 30
+    
+    # 精确计数缓存时间（秒），表写入时会立即失效
+    COUNT_CACHE_TTL: int = 60
+    
     # WHMCS配置
     WHMCS_URL: Optional[str] = os.getenv("WHMCS_URL")
     WHMCS_API_IDENTIFIER: Optional[str] = os.getenv("WHMCS_API_IDENTIFIER")
     WHMCS_API_SECRET: Optional[str] = os.getenv("WHMCS_API_SECRET")
     
+    # 后台任务队列配置
+    TASK_CONCURRENCY: int = 4
+    TASK_QUEUE_MAX_LENGTH: int = 10000
+    TASK_RESULT_TTL: int = 3600
+    TASK_VISIBILITY_TIMEOUT: int = 300
+    TASK_MAX_RETRIES: int = 3
+    
+    # 批量导入用户配置
+    USER_IMPORT_DIR: str = "./data/imports"
+    USER_IMPORT_CHUNK_SIZE: int = 500
+    USER_IMPORT_MAX_BYTES: int = 100 * 1024 * 1024
+    
+    # 主节点选举租约时长（秒），决定周期任务的故障切换时间
+    LEADER_LEASE_SECONDS: int = 15
+    
+    # 到期订单处理配置
+    ORDER_SWEEP_INTERVAL: int = 300
+    ORDER_SWEEP_BATCH_SIZE: int = 500
+    ORDER_SWEEP_CONCURRENCY: int = 10
+    ORDER_SWEEP_MAX_ATTEMPTS: int = 5
+    
+    # FRP流量计量配置：frps dashboard地址（可带 user:password@），代理名需能解析出订单ID
+    METERING_FRPS_URLS: List[str] = []
+    METERING_PROXY_TYPES: List[str] = ["tcp", "udp", "http", "https", "stcp", "xtcp"]
+    METERING_PROXY_PATTERN: str = r"^order[_-](\d+)"
+    METERING_INTERVAL: int = 60
+    METERING_BATCH_SIZE: int = 5000
+    METERING_SAMPLE_RETENTION: int = 2 * 86400
+    METERING_MINUTE_RETENTION: int = 7 * 86400
+    
+    # 按月用量开票配置：默认每月1-3日每小时运行一次，为上个月开票，已开票的客户跳过
+    USAGE_INVOICING_ENABLED: bool = False
+    INVOICE_CRON: str = "0 * 1-3 * *"
+    INVOICE_BATCH_SIZE: int = 500
+    INVOICE_CONCURRENCY: int = 5
+    INVOICE_MAX_PER_SECOND: float = 5
+    INVOICE_MAX_RUNTIME: int = 3600
+    INVOICE_DUE_DAYS: int = 7
+    INVOICE_MAX_ATTEMPTS: int = 3
+    INVOICE_TRAFFIC_PRICE_PER_GB: float = 0.0
+    
+    # WHMCS产品目录同步配置
+    CATALOG_SYNC_INTERVAL: int = 600
+    CATALOG_BILLING_CYCLE: str = "monthly"
+    CATALOG_CURRENCY: Optional[str] = None
+    
     # Sentry配置
     SENTRY_DSN: Optional[str] = os.getenv("SENTRY_DSN")
     
     # 速率限制配置
     RATE_LIMIT_PER_MINUTE: int = 60
+    RATE_LIMIT_PER_HOUR: int = 1000
+    # 按路由前缀覆盖默认规则，例如 {"/token": "5/minute,20/hour"}
+    RATE_LIMIT_ROUTES: Dict[str, str] = {}
+    # 本地快速路径每次从Redis预取的令牌数，0表示禁用
+    RATE_LIMIT_LOCAL_BATCH: int = 0
+    RATE_LIMIT_SYNC_INTERVAL: float = 1.0
     
     class Config:
         case_sensitive = True
@@ -0,0 +1,93 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional
+from passlib.context import CryptContext
+from prometheus_client import Gauge
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+HASH_QUEUE_DEPTH = Gauge(
+    'password_hash_queue_depth',
+    'Password hashing jobs waiting for a free slot'
+)
+HASH_IN_FLIGHT = Gauge(
+    'password_hash_in_flight',
+    'Password hashing jobs running in the process pool'
+)
+
+# 进程池中执行的函数必须是模块级函数，才能被pickle
+def _hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _hash_passwords(passwords: List[str]) -> List[str]:
+    return [pwd_context.hash(password) for password in passwords]
+
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+class HashingExecutor:
+    """在独立进程池中执行bcrypt，避免阻塞事件循环"""
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_concurrency: Optional[int] = None
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # 超过并发上限的请求在事件循环中排队，而不是堆积在进程池内部
+        self.max_concurrency = max_concurrency or self.max_workers * 2
+        self.queue_depth = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        # 信号量需在运行中的事件循环内创建
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        self.queue_depth += 1
+        HASH_QUEUE_DEPTH.inc()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queue_depth -= 1
+            HASH_QUEUE_DEPTH.dec()
+
+        HASH_IN_FLIGHT.inc()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            HASH_IN_FLIGHT.dec()
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        """计算密码哈希"""
+        return await self._run(_hash_password, password)
+
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        """批量计算哈希，按进程数切片并行执行，减少进程间往返"""
+        if not passwords:
+            return []
+        size = -(-len(passwords) // self.max_workers)
+        batches = await asyncio.gather(*(
+            self._run(_hash_passwords, passwords[i:i + size])
+            for i in range(0, len(passwords), size)
+        ))
+        return [hashed for batch in batches for hashed in batch]
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """校验密码"""
+        return await self._run(_verify_password, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
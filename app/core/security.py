@@ -1,17 +1,15 @@
 from datetime import datetime, timedelta
 from typing import Optional, Union
 from jose import jwt
-from passlib.context import CryptContext
 from .config import get_settings
+from .hashing import HashingExecutor
 
 settings = get_settings()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+password_hasher = HashingExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_concurrency=settings.PASSWORD_HASH_MAX_CONCURRENCY
+)
+import_hasher = HashingExecutor(max_workers=settings.PASSWORD_HASH_IMPORT_WORKERS)
 
 def create_access_token(
     subject: Union[str, int], 
@@ -1,10 +1,29 @@
+from urllib.parse import urlparse
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.pool import QueuePool
 from app.core.config import get_settings
+from app.db.replicas import ReplicaSet
+from app.db.routing import WRITER_KEY, RoutingSession
+from app.db.sqlite import apply_sqlite_profile, create_sqlite_engines, is_sqlite_file
 
 settings = get_settings()
 
+# 同步驱动对应的异步驱动
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "mysql+pymysql": "mysql+aiomysql",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def get_async_url(url: str) -> str:
+    """将同步数据库URL转换为异步驱动URL"""
+    scheme = urlparse(url).scheme
+    if scheme not in ASYNC_DRIVERS:
+        raise ValueError(f"Unsupported database type: {scheme}")
+    return url.replace(scheme, ASYNC_DRIVERS[scheme], 1)
+
 engine = create_engine(
     settings.DATABASE_URL,
     poolclass=QueuePool,
@@ -13,7 +32,53 @@ engine = create_engine(
     pool_timeout=settings.DB_POOL_TIMEOUT
 )
 
+use_sqlite_profile = settings.SQLITE_PROFILE_ENABLED and is_sqlite_file(settings.DATABASE_URL)
+if use_sqlite_profile:
+    apply_sqlite_profile(engine)
+
+# aiosqlite 使用 NullPool，不接受连接池大小参数
+async_pool_args = {}
+if urlparse(settings.DATABASE_URL).scheme != "sqlite":
+    async_pool_args = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+
+if use_sqlite_profile:
+    # 单写连接 + 只读连接池，WAL模式下读不阻塞写
+    async_engine, async_read_engine = create_sqlite_engines(
+        get_async_url(settings.DATABASE_URL)
+    )
+else:
+    async_engine = create_async_engine(
+        get_async_url(settings.DATABASE_URL),
+        pool_pre_ping=True,
+        **async_pool_args,
+    )
+    async_read_engine = None
+
+# 只读查询的去向：配置的副本，或SQLite的只读连接池
+replica_engines = [
+    create_async_engine(get_async_url(url), pool_pre_ping=True, **async_pool_args)
+    for url in settings.DATABASE_REPLICA_URLS
+]
+if async_read_engine is not None:
+    replica_engines.append(async_read_engine)
+replica_set = (
+    ReplicaSet(replica_engines, settings.REPLICA_HEALTH_CHECK_INTERVAL)
+    if replica_engines else None
+)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    readers=replica_set,
+    autoflush=False,
+    expire_on_commit=False,
+)
 Base = declarative_base()
 
 def get_db():
@@ -22,3 +87,13 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def primary_session() -> AsyncSession:
+    """所有查询都走主库的会话，供先读后写的后台任务使用"""
+    return AsyncSessionLocal(info={WRITER_KEY: True})
+
+async def get_async_db():
+    # 路由是惰性的：读走副本，首次写入后该会话才固定到主库，
+    # 写请求不会在调用WHMCS或计算哈希期间一直占用主库连接
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Boolean, Index
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, Enum, Boolean, Index, UniqueConstraint
+from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
 from .base import Base
@@ -29,6 +30,8 @@ class User(Base):
     __table_args__ = (
         Index('idx_user_email_username', 'email', 'username'),
         Index('idx_user_role_active', 'role', 'is_active'),
+        Index('idx_user_created_id', 'created_at', 'id'),
+        Index('idx_user_whmcs_client', 'whmcs_client_id'),
     )
 
 class Product(Base):
@@ -59,11 +62,15 @@ class Order(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     product_id = Column(Integer, ForeignKey("products.id"))
     whmcs_order_id = Column(Integer, nullable=True)
+    whmcs_service_id = Column(Integer, nullable=True)
     amount = Column(Float)
-    status = Column(String)  # pending, active, suspended, cancelled
+    status = Column(String)  # pending, active, suspending, suspended, unsuspending, cancelled, failed, needs_review
+    idempotency_key = Column(String, unique=True, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     expires_at = Column(DateTime, nullable=True)
     last_renewed_at = Column(DateTime, nullable=True)
+    sweep_attempts = Column(Integer, default=0)  # 暂停/恢复失败次数，达到上限后转为 needs_review
+    sweep_next_attempt_at = Column(DateTime, nullable=True)
     
     # 关系
     user = relationship("User", back_populates="orders")
@@ -74,4 +81,74 @@ class Order(Base):
         Index('idx_order_user', 'user_id'),
         Index('idx_order_status', 'status'),
         Index('idx_order_dates', 'created_at', 'expires_at'),
+        Index('idx_order_status_expires', 'status', 'expires_at', 'id'),
+        Index('idx_order_created_id', 'created_at', 'id'),
+        Index('idx_order_user_created_id', 'user_id', 'created_at', 'id'),
+    )
+
+class OrderOutbox(Base):
+    __tablename__ = "order_outbox"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"))
+    idempotency_key = Column(String, unique=True)
+    whmcs_client_id = Column(Integer, nullable=True)
+    whmcs_product_id = Column(Integer)
+    status = Column(String, default="pending")  # pending, sending, done, failed, needs_review
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)
+    claim_token = Column(String, nullable=True)  # 本次认领的标识，投递前核对
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # 索引
+    __table_args__ = (
+        Index('idx_outbox_status_next', 'status', 'next_attempt_at'),
+    )
+
+class TrafficSample(Base):
+    """每次采集的原始流量增量，只保留较短时间，用于排查；不加外键以保持写入轻量"""
+    __tablename__ = "traffic_samples"
+    
+    order_id = Column(Integer, primary_key=True)
+    ts = Column(Integer, primary_key=True)  # Unix时间戳（秒）
+    bytes_in = Column(BigInteger, default=0)
+    bytes_out = Column(BigInteger, default=0)
+
+class TrafficRollup(Base):
+    """按分钟/小时/天累计的流量，采集时增量更新，用量查询只读此表"""
+    __tablename__ = "traffic_rollups"
+    
+    order_id = Column(Integer, primary_key=True)
+    resolution = Column(Integer, primary_key=True)  # 60, 3600, 86400
+    bucket = Column(Integer, primary_key=True)  # 桶起始的Unix时间戳
+    bytes_in = Column(BigInteger, default=0)
+    bytes_out = Column(BigInteger, default=0)
+    
+    # 索引
+    __table_args__ = (
+        Index('idx_rollup_resolution_bucket', 'resolution', 'bucket'),
+    )
+
+class UsageInvoice(Base):
+    """每个WHMCS客户每个账期一条开票记录，唯一约束保证重跑时不会重复开票"""
+    __tablename__ = "usage_invoices"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    whmcs_client_id = Column(Integer, nullable=False)
+    period = Column(String(7), nullable=False)  # YYYY-MM
+    status = Column(String, default="pending")  # pending, invoiced, empty, needs_review, failed
+    amount = Column(Float, default=0)
+    whmcs_invoice_id = Column(Integer, nullable=True)
+    attempts = Column(Integer, default=0)  # 已发送的CreateInvoice次数
+    claim_token = Column(String, nullable=True)  # 认领该记录的运行标识
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    invoiced_at = Column(DateTime, nullable=True)
+    
+    # 索引
+    __table_args__ = (
+        UniqueConstraint('whmcs_client_id', 'period', name='uq_usage_invoice_client_period'),
+        Index('idx_usage_invoice_period_status', 'period', 'status'),
     )
@@ -0,0 +1,62 @@
+from typing import List, Optional
+import asyncio
+import itertools
+import logging
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+class ReplicaSet:
+    """只读副本集合：轮询选择健康的副本，全部不可用时返回 None 由调用方回退到主库"""
+
+    def __init__(self, engines: List[AsyncEngine], check_interval: float = 10.0):
+        self.engines = engines
+        self.check_interval = check_interval
+        self.healthy = {id(engine): True for engine in engines}
+        self._cycle = itertools.cycle(engines) if engines else None
+        self._task: Optional[asyncio.Task] = None
+
+    def pick(self) -> Optional[Engine]:
+        for _ in range(len(self.engines)):
+            engine = next(self._cycle)
+            if self.healthy[id(engine)]:
+                return engine.sync_engine
+        return None
+
+    async def check(self) -> None:
+        for engine in self.engines:
+            try:
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+                healthy = True
+            except Exception as e:
+                logger.warning(f"Replica {engine.url.render_as_string()} failed health check: {str(e)}")
+                healthy = False
+            if healthy != self.healthy[id(engine)]:
+                logger.info(
+                    f"Replica {engine.url.render_as_string()} is now "
+                    f"{'healthy' if healthy else 'unhealthy'}"
+                )
+            self.healthy[id(engine)] = healthy
+
+    async def start(self) -> None:
+        if self.engines and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for engine in self.engines:
+            await engine.dispose()
+
+    async def _run(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.check_interval)
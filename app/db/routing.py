@@ -0,0 +1,49 @@
+from typing import Any, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.sql.selectable import Select
+from app.db.replicas import ReplicaSet
+
+# session.info 中的路由标记
+WRITER_KEY = "use_writer"
+WROTE_KEY = "wrote"
+READER_KEY = "reader"
+WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+def is_write(clause: Any) -> bool:
+    if isinstance(clause, UpdateBase):
+        return True
+    if isinstance(clause, Select):
+        return clause._for_update_arg is not None
+    if isinstance(clause, TextClause):
+        return clause.text.lstrip().upper().startswith(WRITE_PREFIXES)
+    return False
+
+def pin_to_primary(session: Session) -> None:
+    """之后该会话的所有查询都使用主库"""
+    session.info[WRITER_KEY] = True
+
+class RoutingSession(Session):
+    """只读查询使用只读副本；写操作以及之后同一会话内的所有查询使用主库，保证读到自己的写入"""
+
+    def __init__(self, *args: Any, readers: Optional[ReplicaSet] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.readers = readers
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.readers is None:
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        if self._flushing or is_write(clause):
+            self.info[WRITER_KEY] = True
+            self.info[WROTE_KEY] = True
+        if self.info.get(WRITER_KEY):
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        # 同一会话固定使用一个副本，避免在不同复制进度间来回切换
+        reader = self.info.get(READER_KEY)
+        if reader is None:
+            reader = self.readers.pick()
+            if reader is None:
+                return super().get_bind(mapper, clause=clause, **kwargs)
+            self.info[READER_KEY] = reader
+        return reader
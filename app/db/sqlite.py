@@ -0,0 +1,62 @@
+from typing import List, Tuple
+from urllib.parse import urlparse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.core.config import get_settings
+
+settings = get_settings()
+
+def is_sqlite_file(url: str) -> bool:
+    """内存数据库不支持WAL，只对文件数据库启用性能配置"""
+    parsed = urlparse(url)
+    if not parsed.scheme.startswith("sqlite"):
+        return False
+    return parsed.path not in ("", "/", "/:memory:")
+
+def sqlite_pragmas(read_only: bool = False) -> List[str]:
+    pragmas = [
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT}",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size={settings.SQLITE_CACHE_SIZE}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+def apply_sqlite_profile(engine: Engine, read_only: bool = False) -> None:
+    """每个新连接建立时设置PRAGMA"""
+    pragmas = sqlite_pragmas(read_only)
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+def create_sqlite_engines(async_url: str) -> Tuple[AsyncEngine, AsyncEngine]:
+    """返回 (写引擎, 读引擎)：写引擎只有一个连接，写事务在连接池处排队而不是在文件锁上忙等"""
+    writer = create_async_engine(
+        async_url,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    reader = create_async_engine(
+        async_url,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=settings.SQLITE_READ_POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    apply_sqlite_profile(writer.sync_engine)
+    apply_sqlite_profile(reader.sync_engine, read_only=True)
+    return writer, reader
@@ -1,4 +1,5 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_limiter import FastAPILimiter
 from fastapi_limiter.depends import RateLimiter
@@ -9,9 +10,19 @@ import time
 import asyncio
 
 from app.core.config import get_settings
-from app.api.v1.endpoints import users
+from app.core.security import import_hasher, password_hasher
+from app.api.v1.endpoints import orders, users
 from app.services.background_tasks import task_manager
 from app.services.cache_service import cache_service
+from app.services.tiered_cache import tiered_cache
+from app.services.catalog_sync import catalog_sync
+from app.services.order_sweeper import order_sweeper
+from app.services.metering import traffic_meter
+from app.services.invoicing import usage_invoicer
+from app.services.scheduler import scheduler
+from app.services.whmcs_client import whmcs_client
+from app.services.search import install_search_indexes
+from app.db.base import async_engine, replica_set
 
 settings = get_settings()
 
@@ -27,6 +38,7 @@ app = FastAPI(
     version=settings.VERSION,
     docs_url="/api/docs",
     redoc_url="/api/redoc",
+    default_response_class=ORJSONResponse,
 )
 
 # 设置CORS
@@ -62,14 +74,44 @@ async def startup():
     )
     await FastAPILimiter.init(redis_client)
     
+    # 创建搜索索引（幂等）
+    async with async_engine.begin() as conn:
+        await conn.run_sync(install_search_indexes)
+    
+    # 订阅缓存失效广播
+    await tiered_cache.start()
+    
+    # 只读副本健康检查
+    if replica_set is not None:
+        await replica_set.start()
+    
     # 启动后台任务处理器
-    asyncio.create_task(task_manager.start())
+    await task_manager.start()
+    
+    # 周期任务只在选举出的主节点上运行
+    if catalog_sync.enabled:
+        scheduler.add_job("catalog_sync", catalog_sync.sync, interval=catalog_sync.interval)
+    scheduler.add_job("order_sweep", order_sweeper.sweep, interval=order_sweeper.interval)
+    if traffic_meter.enabled:
+        scheduler.add_job("traffic_ingest", traffic_meter.ingest, interval=traffic_meter.interval)
+    if settings.USAGE_INVOICING_ENABLED:
+        scheduler.add_job("usage_invoicing", usage_invoicer.run, cron=settings.INVOICE_CRON)
+    await scheduler.start()
 
 # 关闭事件
 @app.on_event("shutdown")
 async def shutdown():
     # 停止后台任务处理器
     await task_manager.stop()
+    await tiered_cache.stop()
+    await scheduler.stop()
+    if replica_set is not None:
+        await replica_set.stop()
+    await whmcs_client.close()
+    await traffic_meter.close()
+    # 关闭密码哈希进程池
+    password_hasher.shutdown()
+    import_hasher.shutdown()
 
 # 注册路由
 app.include_router(
@@ -77,6 +119,11 @@ app.include_router(
     prefix=f"{settings.API_V1_STR}/users",
     tags=["users"]
 )
+app.include_router(
+    orders.router,
+    prefix=f"{settings.API_V1_STR}/orders",
+    tags=["orders"]
+)
 
 # 健康检查端点
 @app.get("/health")
@@ -1,102 +1,290 @@
-from typing import Any, Callable
+from typing import Any, Callable, Dict, List, Optional
+from contextvars import ContextVar
 import asyncio
+import json
+import random
+import time
 from datetime import datetime
 import logging
 from app.core.config import get_settings
+from app.services.cache_service import cache_service
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
+# 当前正在执行的任务ID，供处理函数上报进度
+current_task_id: ContextVar[Optional[str]] = ContextVar("current_task_id", default=None)
+
+# 优先级通道，按顺序取任务
+PRIORITIES = ("high", "normal", "low")
+
+# 从第一个非空通道取出任务，并在同一原子操作内登记到处理中集合
+# KEYS: 各优先级队列..., 处理中集合
+# ARGV: 可见性超时截止时间
+POP_SCRIPT = """
+local processing = KEYS[#KEYS]
+for i = 1, #KEYS - 1 do
+    local task_id = redis.call('LPOP', KEYS[i])
+    if task_id then
+        redis.call('ZADD', processing, ARGV[1], task_id)
+        return task_id
+    end
+end
+return false
+"""
+
+# 将到期的延迟任务或超时未完成的任务移回队列
+# KEYS: 来源有序集合, 任务哈希前缀
+# ARGV: 当前时间, 队列键前缀
+REQUEUE_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 100)
+for _, task_id in ipairs(ids) do
+    redis.call('ZREM', KEYS[1], task_id)
+    local priority = redis.call('HGET', KEYS[2] .. task_id, 'priority') or 'normal'
+    redis.call('RPUSH', ARGV[2] .. priority, task_id)
+end
+return #ids
+"""
+
 class BackgroundTaskManager:
-    def __init__(self):
-        self.tasks = {}
+    """基于Redis持久化队列的后台任务调度器
+
+    任务按名称注册，参数以JSON保存，进程重启后未完成的任务会重新入队。
+    固定数量的worker从优先级通道中取任务，并发数不会超过 concurrency。
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 4,
+        max_queue_length: int = 10000,
+        result_ttl: int = 3600,
+        visibility_timeout: int = 300,
+        default_max_retries: int = 3,
+        retry_backoff: float = 2,
+        prefix: str = "tasks"
+    ):
+        self.concurrency = concurrency
+        self.max_queue_length = max_queue_length
+        self.result_ttl = result_ttl
+        self.visibility_timeout = visibility_timeout
+        self.default_max_retries = default_max_retries
+        self.retry_backoff = retry_backoff
+        self.prefix = prefix
+        self.handlers: Dict[str, Callable] = {}
         self.running = False
-        self.task_queue = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._redis = cache_service.redis_client
+        self._pop = self._redis.register_script(POP_SCRIPT)
+        self._requeue = self._redis.register_script(REQUEUE_SCRIPT)
+
+    def _queue_key(self, priority: str) -> str:
+        return f"{self.prefix}:queue:{priority}"
+
+    def _job_key(self, task_id: str) -> str:
+        return f"{self.prefix}:job:{task_id}"
+
+    def _result_key(self, task_id: str) -> str:
+        return f"{self.prefix}:result:{task_id}"
+
+    def register(self, name: Optional[str] = None):
+        """注册任务处理函数的装饰器"""
+        def decorator(func: Callable):
+            func.task_name = name or func.__name__
+            self.handlers[func.task_name] = func
+            return func
+        return decorator
 
     async def add_task(
         self,
         task_id: str,
-        func: Callable,
+        func: Any,
         *args: Any,
+        priority: str = "normal",
+        max_retries: Optional[int] = None,
         **kwargs: Any
     ):
-        """添加后台任务"""
-        await self.task_queue.put({
-            'id': task_id,
-            'func': func,
-            'args': args,
-            'kwargs': kwargs,
-            'added_at': datetime.utcnow()
+        """添加后台任务，func 为已注册的处理函数或其名称"""
+        name = func if isinstance(func, str) else getattr(func, "task_name", None)
+        if name not in self.handlers:
+            raise ValueError(f"Task handler {name or func} is not registered")
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority}")
+
+        queued = 0
+        for lane in PRIORITIES:
+            queued += await self._redis.llen(self._queue_key(lane))
+        if queued >= self.max_queue_length:
+            raise RuntimeError("Task queue is full")
+
+        await self._redis.hset(self._job_key(task_id), mapping={
+            'name': name,
+            'args': json.dumps(args),
+            'kwargs': json.dumps(kwargs),
+            'priority': priority,
+            'attempts': 0,
+            'max_retries': self.default_max_retries if max_retries is None else max_retries,
+            'status': 'queued',
+            'added_at': datetime.utcnow().isoformat(),
         })
-        logger.info(f"Added task {task_id} to queue")
+        await self._redis.rpush(self._queue_key(priority), task_id)
+        logger.info(f"Added task {task_id} to {priority} queue")
 
     async def start(self):
         """启动任务处理器"""
+        if self.running:
+            return
         self.running = True
+        # 重新入队上次进程退出时未完成的任务
+        await self._requeue_due(f"{self.prefix}:processing")
+        self._workers = [
+            asyncio.create_task(self._worker(index))
+            for index in range(self.concurrency)
+        ]
+        self._workers.append(asyncio.create_task(self._scheduler()))
+
+    async def stop(self):
+        """停止任务处理器"""
+        self.running = False
+        # 等待正在执行的任务完成
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def _requeue_due(self, source: str) -> int:
+        return await self._requeue(
+            keys=[source, f"{self.prefix}:job:"],
+            args=[time.time(), f"{self.prefix}:queue:"]
+        )
+
+    async def _scheduler(self):
+        """定期处理到期的重试任务和超时任务"""
         while self.running:
             try:
-                task = await self.task_queue.get()
-                task_id = task['id']
-                self.tasks[task_id] = asyncio.create_task(
-                    self._execute_task(task)
-                )
-                self.tasks[task_id].add_done_callback(
-                    lambda t, tid=task_id: self._task_done(tid)
+                await self._requeue_due(f"{self.prefix}:delayed")
+                await self._requeue_due(f"{self.prefix}:processing")
+            except Exception as e:
+                logger.error(f"Error requeueing tasks: {str(e)}")
+            await asyncio.sleep(1)
+
+    async def _worker(self, index: int):
+        while self.running:
+            try:
+                task_id = await self._pop(
+                    keys=[self._queue_key(lane) for lane in PRIORITIES]
+                    + [f"{self.prefix}:processing"],
+                    args=[time.time() + self.visibility_timeout]
                 )
             except Exception as e:
                 logger.error(f"Error processing task: {str(e)}")
+                await asyncio.sleep(1)
                 continue
+            if not task_id:
+                await asyncio.sleep(0.5)
+                continue
+            try:
+                await self._execute_task(task_id)
+            except Exception as e:
+                # Redis读写失败时任务仍在处理中集合里，可见性超时后会重新入队
+                logger.error(f"Error executing task {task_id}: {str(e)}")
+                await asyncio.sleep(1)
 
-    async def stop(self):
-        """停止任务处理器"""
-        self.running = False
-        # 等待所有任务完成
-        remaining_tasks = list(self.tasks.values())
-        if remaining_tasks:
-            await asyncio.gather(*remaining_tasks, return_exceptions=True)
-        self.tasks.clear()
-
-    async def _execute_task(self, task: dict) -> Any:
+    async def _execute_task(self, task_id: str) -> None:
         """执行任务"""
+        job_key = self._job_key(task_id)
+        job = await self._redis.hgetall(job_key)
+        if not job:
+            await self._redis.zrem(f"{self.prefix}:processing", task_id)
+            return
+
+        attempts = int(job['attempts']) + 1
+        await self._redis.hset(job_key, mapping={'status': 'running', 'attempts': attempts})
+        heartbeat = asyncio.create_task(self._heartbeat(task_id))
+        token = current_task_id.set(task_id)
         try:
-            func = task['func']
-            args = task['args']
-            kwargs = task['kwargs']
-            result = await func(*args, **kwargs)
-            logger.info(f"Task {task['id']} completed successfully")
-            return result
+            func = self.handlers[job['name']]
+            result = await func(*json.loads(job['args']), **json.loads(job['kwargs']))
         except Exception as e:
-            logger.error(f"Task {task['id']} failed: {str(e)}")
-            raise
+            if attempts <= int(job['max_retries']):
+                # 带抖动的指数退避后重试
+                delay = random.uniform(0, self.retry_backoff * 2 ** attempts)
+                await self._redis.hset(job_key, 'status', 'retrying')
+                await self._redis.zadd(f"{self.prefix}:delayed", {task_id: time.time() + delay})
+                await self._redis.zrem(f"{self.prefix}:processing", task_id)
+                logger.warning(f"Task {task_id} failed ({str(e)}), retry {attempts} in {delay:.1f}s")
+                return
+            logger.error(f"Task {task_id} failed: {str(e)}")
+            await self._finish(task_id, "failed", str(e))
+            return
+        finally:
+            current_task_id.reset(token)
+            heartbeat.cancel()
+
+        logger.info(f"Task {task_id} completed successfully")
+        await self._finish(task_id, "completed", result)
+
+    async def _heartbeat(self, task_id: str) -> None:
+        """执行期间定期延长可见性超时，避免长任务被重复执行"""
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                await self._redis.zadd(
+                    f"{self.prefix}:processing",
+                    {task_id: time.time() + self.visibility_timeout},
+                    xx=True
+                )
+            except Exception as e:
+                logger.error(f"Heartbeat failed for task {task_id}: {str(e)}")
+
+    async def _finish(self, task_id: str, status: str, result: Any) -> None:
+        """写入结果存储并在TTL后自动过期"""
+        try:
+            payload = json.dumps({"status": status, "result": result})
+        except TypeError:
+            payload = json.dumps({"status": status, "result": str(result)})
+        pipeline = self._redis.pipeline()
+        pipeline.set(self._result_key(task_id), payload, ex=self.result_ttl)
+        pipeline.delete(self._job_key(task_id))
+        pipeline.zrem(f"{self.prefix}:processing", task_id)
+        await pipeline.execute()
+
+    async def report_progress(self, **progress: Any) -> None:
+        """在处理函数内调用，保存当前任务的进度；重试时可通过 get_progress 断点续做"""
+        task_id = current_task_id.get()
+        if task_id is None:
+            return
+        await self._redis.hset(self._job_key(task_id), 'progress', json.dumps(progress))
 
-    def _task_done(self, task_id: str):
-        """任务完成回调"""
-        if task_id in self.tasks:
-            del self.tasks[task_id]
+    async def get_progress(self) -> Dict[str, Any]:
+        """读取当前任务上次保存的进度"""
+        task_id = current_task_id.get()
+        if task_id is None:
+            return {}
+        progress = await self._redis.hget(self._job_key(task_id), 'progress')
+        return json.loads(progress) if progress else {}
 
     async def get_task_status(self, task_id: str) -> dict:
         """获取任务状态"""
-        if task_id in self.tasks:
-            task = self.tasks[task_id]
-            if task.done():
-                try:
-                    result = task.result()
-                    status = "completed"
-                except Exception as e:
-                    result = str(e)
-                    status = "failed"
-            else:
-                result = None
-                status = "running"
+        payload = await self._redis.get(self._result_key(task_id))
+        if payload is not None:
+            data = json.loads(payload)
             return {
                 "task_id": task_id,
-                "status": status,
-                "result": result
+                "status": data["status"],
+                "result": data["result"],
+                "progress": None
             }
+        status, progress = await self._redis.hmget(self._job_key(task_id), 'status', 'progress')
         return {
             "task_id": task_id,
-            "status": "not_found",
-            "result": None
+            "status": status or "not_found",
+            "result": None,
+            "progress": json.loads(progress) if progress else None
         }
 
-task_manager = BackgroundTaskManager()
+task_manager = BackgroundTaskManager(
+    concurrency=settings.TASK_CONCURRENCY,
+    max_queue_length=settings.TASK_QUEUE_MAX_LENGTH,
+    result_ttl=settings.TASK_RESULT_TTL,
+    visibility_timeout=settings.TASK_VISIBILITY_TIMEOUT,
+    default_max_retries=settings.TASK_MAX_RETRIES
+)
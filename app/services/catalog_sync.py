@@ -0,0 +1,127 @@
+from typing import Any, Dict, List, Optional
+import logging
+from sqlalchemy import insert, select, update
+from app.core.config import get_settings
+from app.db.base import primary_session
+from app.db.models import Product
+from app.services.cache_service import cache_service
+from app.services.tiered_cache import tiered_cache
+from app.services.whmcs_client import whmcs_client
+from whmcs import WHMCSClient
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_KEY = "catalog:version"
+# 产品列表缓存的命名空间，目录变化时整体失效
+PRODUCT_CACHE_NAMESPACE = "products"
+
+# 同步时比较的字段
+SYNCED_FIELDS = ("name", "description", "price", "is_active")
+
+class CatalogSync:
+    """从WHMCS拉取产品目录，只写入有变化的行；由周期任务调度器按 interval 调用"""
+
+    def __init__(
+        self,
+        whmcs_client: WHMCSClient,
+        interval: float = 600,
+        billing_cycle: str = "monthly",
+        currency: Optional[str] = None
+    ):
+        self.whmcs_client = whmcs_client
+        self.interval = interval
+        self.billing_cycle = billing_cycle
+        self.currency = currency
+
+    @property
+    def enabled(self) -> bool:
+        """WHMCS客户端配置了地址和API凭据时才能同步"""
+        client = self.whmcs_client
+        return bool(client.api_url and client.identifier and client.secret)
+
+    async def get_version(self) -> int:
+        """获取当前目录版本，产品缓存可将其作为键的一部分"""
+        version = await cache_service.get(CATALOG_VERSION_KEY)
+        return int(version) if version else 0
+
+    def _parse_price(self, pricing: Dict[str, Any]) -> Optional[float]:
+        if not pricing:
+            return None
+        currency = self.currency if self.currency in pricing else next(iter(pricing))
+        try:
+            return float(pricing[currency][self.billing_cycle])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def _parse_products(self, response: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+        products = (response.get("products") or {}).get("product") or []
+        parsed = {}
+        for item in products:
+            parsed[int(item["pid"])] = {
+                "name": item.get("name"),
+                "description": item.get("description"),
+                "price": self._parse_price(item.get("pricing")),
+                "is_active": not item.get("retired", False) and not item.get("hidden", False),
+            }
+        return parsed
+
+    async def sync(self) -> Dict[str, int]:
+        """同步一次产品目录，返回新增、更新的行数"""
+        response = await self.whmcs_client.get_products()
+        if response.get("result") != "success":
+            raise RuntimeError(f"GetProducts failed: {response.get('message')}")
+        remote = self._parse_products(response)
+
+        # 先读后写，读副本可能因复制延迟重复插入
+        async with primary_session() as db:
+            rows = (await db.execute(
+                select(
+                    Product.id,
+                    Product.whmcs_product_id,
+                    *[getattr(Product, field) for field in SYNCED_FIELDS]
+                ).where(Product.whmcs_product_id.isnot(None))
+            )).all()
+            local = {row.whmcs_product_id: row for row in rows}
+
+            inserts: List[Dict[str, Any]] = []
+            updates: List[Dict[str, Any]] = []
+            for whmcs_id, values in remote.items():
+                row = local.get(whmcs_id)
+                if row is None:
+                    inserts.append({"whmcs_product_id": whmcs_id, **values})
+                elif any(getattr(row, field) != values[field] for field in SYNCED_FIELDS):
+                    updates.append({"id": row.id, **values})
+            # WHMCS中已不存在的产品下架
+            for whmcs_id, row in local.items():
+                if whmcs_id not in remote and row.is_active:
+                    updates.append({"id": row.id, "is_active": False})
+
+            if not inserts and not updates:
+                logger.info("Catalog sync: no changes")
+                return {"inserted": 0, "updated": 0}
+
+            # 新增行批量插入，变化行按主键批量更新，在同一事务内提交
+            if inserts:
+                await db.execute(insert(Product), inserts)
+            if updates:
+                await db.execute(update(Product), updates)
+            await db.commit()
+
+        await self._bump_version()
+        logger.info(f"Catalog sync: {len(inserts)} inserted, {len(updates)} updated")
+        return {"inserted": len(inserts), "updated": len(updates)}
+
+    async def _bump_version(self) -> None:
+        try:
+            await cache_service.increment(CATALOG_VERSION_KEY)
+        except Exception as e:
+            logger.error(f"Failed to bump catalog version: {str(e)}")
+        await tiered_cache.invalidate_prefix(PRODUCT_CACHE_NAMESPACE)
+
+catalog_sync = CatalogSync(
+    whmcs_client,
+    interval=settings.CATALOG_SYNC_INTERVAL,
+    billing_cycle=settings.CATALOG_BILLING_CYCLE,
+    currency=settings.CATALOG_CURRENCY
+)
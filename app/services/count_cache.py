@@ -0,0 +1,115 @@
+from typing import Any, Awaitable, Callable, Iterable, List, Set
+from itertools import chain
+import asyncio
+import hashlib
+import json
+import logging
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.util import find_tables
+from app.core.config import get_settings
+from app.services.tiered_cache import TieredCache, tiered_cache
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY_PREFIX = "count:gen:"
+SESSION_TABLES_KEY = "count_cache_tables"
+
+def query_tables(query: Select) -> List[str]:
+    """查询涉及的所有表名"""
+    return sorted({
+        table.name
+        for from_ in query.get_final_froms()
+        for table in find_tables(from_, include_joins=True)
+        if hasattr(table, "name")
+    })
+
+class CountCache:
+    """按过滤条件缓存精确计数；每张表有一个代数，写入后代数加一，旧计数随之失效"""
+
+    def __init__(self, cache: TieredCache, ttl: int = 60):
+        self.cache = cache
+        self.ttl = ttl
+        self._background: Set[asyncio.Task] = set()
+
+    async def get_or_count(
+        self,
+        query: Select,
+        signature: str,
+        counter: Callable[[], Awaitable[int]]
+    ) -> int:
+        tables = query_tables(query)
+        generations = await self._generations(tables)
+        digest = hashlib.sha1(signature.encode()).hexdigest()
+        key = f"count:{','.join(tables)}:{'.'.join(generations)}:{digest}"
+        return await self.cache.get_or_load(key, counter, ttl=self.ttl, stale_ttl=0)
+
+    async def bump(self, tables: Iterable[str]) -> None:
+        """表数据变更后调用，使该表上的所有缓存计数失效"""
+        try:
+            pipe = self.cache.l2.redis_client.pipeline()
+            for table in tables:
+                pipe.incr(f"{GENERATION_KEY_PREFIX}{table}")
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to bump count generation: {str(e)}")
+
+    def bump_later(self, tables: Iterable[str]) -> None:
+        """在同步的会话事件中调度失效"""
+        tables = list(tables)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self.bump(tables))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _generations(self, tables: List[str]) -> List[str]:
+        try:
+            values = await self.cache.l2.redis_client.mget(
+                [f"{GENERATION_KEY_PREFIX}{table}" for table in tables]
+            )
+        except Exception as e:
+            logger.error(f"Failed to read count generation: {str(e)}")
+            values = [None] * len(tables)
+        return [value or "0" for value in values]
+
+def query_signature(query: Select, dialect: Any) -> str:
+    """SQL文本加绑定参数，作为过滤条件的签名"""
+    compiled = query.compile(dialect=dialect)
+    return str(compiled) + json.dumps(compiled.params, default=str, sort_keys=True)
+
+count_cache = CountCache(tiered_cache, ttl=settings.COUNT_CACHE_TTL)
+
+# 在会话层记录写过的表，提交后统一失效，两套模型的所有写入路径都会经过这里
+
+def _written_tables(session: Session) -> Set[str]:
+    return session.info.setdefault(SESSION_TABLES_KEY, set())
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    tables = _written_tables(session)
+    for obj in chain(session.new, session.dirty, session.deleted):
+        table = getattr(type(obj), "__tablename__", None)
+        if table:
+            tables.add(table)
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            _written_tables(orm_execute_state.session).add(table.name)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    tables = session.info.pop(SESSION_TABLES_KEY, None)
+    if tables:
+        count_cache.bump_later(tables)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop(SESSION_TABLES_KEY, None)
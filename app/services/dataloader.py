@@ -0,0 +1,90 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+import asyncio
+import logging
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import MANYTOONE, RelationshipProperty
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+logger = logging.getLogger(__name__)
+
+class DataLoader:
+    """请求级批量加载器：同一轮事件循环中按主键的查找合并为每个模型一条 IN 查询"""
+
+    def __init__(self, db: AsyncSession, batch_size: int = 500):
+        self.db = db
+        self.batch_size = batch_size
+        self._futures: Dict[Tuple[Type[Any], Any], asyncio.Future] = {}
+        self._pending: Dict[Type[Any], Dict[Any, asyncio.Future]] = {}
+        self._dispatch: Optional[asyncio.Task] = None
+        # AsyncSession 不支持并发查询
+        self._lock = asyncio.Lock()
+
+    async def load(self, model: Type[Any], pk: Any) -> Optional[Any]:
+        """按主键加载一行，不存在时返回 None"""
+        if pk is None:
+            return None
+        future = self._futures.get((model, pk))
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._futures[(model, pk)] = future
+            instance = self.db.identity_map.get(identity_key(model, pk))
+            if instance is not None:
+                future.set_result(instance)
+            else:
+                self._pending.setdefault(model, {})[pk] = future
+                self._schedule()
+        return await future
+
+    async def load_many(self, model: Type[Any], pks: Iterable[Any]) -> List[Optional[Any]]:
+        return list(await asyncio.gather(*(self.load(model, pk) for pk in pks)))
+
+    async def attach(self, instances: List[Any], relation: str) -> None:
+        """批量填充多对一关系，之后访问 instance.<relation> 不再触发查询"""
+        if not instances:
+            return
+        prop = getattr(type(instances[0]), relation).property
+        if not isinstance(prop, RelationshipProperty) or prop.direction is not MANYTOONE:
+            raise ValueError(f"{relation} is not a many-to-one relationship")
+        local_column = prop.local_remote_pairs[0][0]
+        fk_attr = prop.parent.get_property_by_column(local_column).key
+        related = await self.load_many(
+            prop.mapper.class_,
+            [getattr(instance, fk_attr) for instance in instances]
+        )
+        for instance, value in zip(instances, related):
+            set_committed_value(instance, relation, value)
+
+    def _schedule(self) -> None:
+        if self._dispatch is None or self._dispatch.done():
+            self._dispatch = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        # 让出一次事件循环，收集同一轮中的所有查找
+        await asyncio.sleep(0)
+        while self._pending:
+            pending, self._pending = self._pending, {}
+            for model, futures in pending.items():
+                await self._fetch(model, futures)
+
+    async def _fetch(self, model: Type[Any], futures: Dict[Any, asyncio.Future]) -> None:
+        pks = list(futures)
+        try:
+            found: Dict[Any, Any] = {}
+            async with self._lock:
+                for i in range(0, len(pks), self.batch_size):
+                    rows = (await self.db.scalars(
+                        select(model).where(model.id.in_(pks[i:i + self.batch_size]))
+                    )).all()
+                    found.update((row.id, row) for row in rows)
+        except Exception as e:
+            logger.error(f"Batch load of {model.__name__} failed: {str(e)}")
+            for pk, future in futures.items():
+                self._futures.pop((model, pk), None)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for pk, future in futures.items():
+            if not future.done():
+                future.set_result(found.get(pk))
@@ -0,0 +1,390 @@
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import time
+from uuid import uuid4
+from sqlalchemy import and_, case, delete, func, or_, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.core.config import get_settings
+from app.db.base import primary_session
+from app.db.models import Order, Product, TrafficRollup, UsageInvoice, User
+from app.services.metering import DAY, to_epoch
+from app.services.whmcs_client import whmcs_client
+from whmcs import WHMCSClient, WHMCSUnavailableError
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# 按 Order.amount 计费的订单状态
+BILLABLE_STATUSES = ("active", "suspending", "suspended", "unsuspending")
+
+GB = 1024 ** 3
+
+def previous_period(now: datetime) -> str:
+    """上一个自然月，格式 YYYY-MM"""
+    return (now.replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+
+def period_bounds(period: str) -> Tuple[datetime, datetime]:
+    """账期的 [start, end)，UTC"""
+    start = datetime.strptime(period, "%Y-%m")
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+class UsageInvoicer:
+    """按WHMCS客户汇总订单金额和流量用量，为每个账期创建一张发票
+
+    按 whmcs_client_id 键集分页扫描未开票的客户，每批先在 usage_invoices 中
+    写入 pending 记录并提交，再以有限并发和限速调用 CreateInvoice。
+    重跑时已有记录的客户直接跳过；请求结果不确定的记录标记为 needs_review，
+    需人工核对，不会自动重开。被WHMCS明确拒绝的记录标记为 failed，
+    后续运行重试，发送满 max_attempts 次后不再重试。
+    """
+
+    def __init__(
+        self,
+        whmcs_client: WHMCSClient,
+        batch_size: int = 500,
+        concurrency: int = 5,
+        max_per_second: float = 5,
+        max_runtime: float = 3600,
+        due_days: int = 7,
+        traffic_price_per_gb: float = 0.0,
+        max_attempts: int = 3
+    ):
+        self.whmcs_client = whmcs_client
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_per_second = max_per_second
+        self.max_runtime = max_runtime
+        self.due_days = due_days
+        self.traffic_price_per_gb = traffic_price_per_gb
+        self.max_attempts = max_attempts
+        self._pace_lock: Optional[asyncio.Lock] = None
+        self._next_slot = 0.0
+
+    async def run(self, period: Optional[str] = None) -> Dict[str, int]:
+        """为账期开票（默认上个月）；超过 max_runtime 时停止，下次运行从剩余客户继续"""
+        period = period or previous_period(datetime.utcnow())
+        start, end = period_bounds(period)
+        deadline = time.monotonic() + self.max_runtime
+        self._pace_lock = asyncio.Lock()
+        self._next_slot = 0.0
+        stats = {"invoiced": 0, "empty": 0, "failed": 0}
+        await self._warn_unresolved(period)
+
+        cursor = None
+        while True:
+            if time.monotonic() >= deadline:
+                logger.warning(f"Invoicing {period}: runtime limit reached, remaining clients deferred")
+                break
+            client_ids = await self._next_clients(period, cursor)
+            if not client_ids:
+                break
+            cursor = client_ids[-1]
+
+            invoices = await self._build_invoices(client_ids, start, end, period)
+            claims = await self._claim(period, client_ids, invoices)
+            stats["empty"] += len(client_ids) - len(invoices)
+            invoiced, failed, aborted = await self._dispatch(period, end, invoices, claims, deadline)
+            stats["invoiced"] += invoiced
+            stats["failed"] += failed
+            if aborted:
+                logger.warning(f"Invoicing {period}: WHMCS unavailable, stopping run")
+                break
+
+        logger.info(
+            f"Invoicing {period}: {stats['invoiced']} invoiced, "
+            f"{stats['empty']} without charges, {stats['failed']} failed"
+        )
+        return stats
+
+    async def _warn_unresolved(self, period: str) -> None:
+        async with primary_session() as db:
+            unresolved = await db.scalar(
+                select(func.count()).select_from(UsageInvoice).where(
+                    UsageInvoice.period == period,
+                    or_(
+                        UsageInvoice.status.in_(("pending", "needs_review")),
+                        self._exhausted()
+                    )
+                )
+            )
+        if unresolved:
+            logger.warning(f"Invoicing {period}: {unresolved} invoices need manual review")
+
+    def _exhausted(self):
+        """被拒绝且已用完重试次数的记录"""
+        return and_(UsageInvoice.status == "failed", UsageInvoice.attempts >= self.max_attempts)
+
+    def _retryable(self):
+        return and_(UsageInvoice.status == "failed", UsageInvoice.attempts < self.max_attempts)
+
+    async def _next_clients(self, period: str, cursor: Optional[int]) -> List[int]:
+        # 开票记录写在主库，读副本可能看不到刚写入的记录
+        settled = select(UsageInvoice.id).where(
+            UsageInvoice.whmcs_client_id == User.whmcs_client_id,
+            UsageInvoice.period == period,
+            ~self._retryable()
+        )
+        query = (
+            select(User.whmcs_client_id)
+            .where(User.whmcs_client_id.isnot(None), ~settled.exists())
+            .distinct()
+            .order_by(User.whmcs_client_id)
+            .limit(self.batch_size)
+        )
+        if cursor is not None:
+            query = query.where(User.whmcs_client_id > cursor)
+        async with primary_session() as db:
+            return list((await db.scalars(query)).all())
+
+    async def _build_invoices(
+        self,
+        client_ids: List[int],
+        start: datetime,
+        end: datetime,
+        period: str
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """生成每个客户的发票行，没有费用的客户不出现在结果中"""
+        async with primary_session() as db:
+            orders = (await db.execute(
+                select(Order.id, Order.amount, Order.status, User.whmcs_client_id, Product.name)
+                .join(User, Order.user_id == User.id)
+                .outerjoin(Product, Order.product_id == Product.id)
+                .where(User.whmcs_client_id.in_(client_ids), Order.created_at < end)
+                .order_by(User.whmcs_client_id, Order.id)
+            )).all()
+
+            # 用量读取天汇总，账期边界与UTC日边界对齐
+            usage: Dict[int, int] = {}
+            if self.traffic_price_per_gb > 0:
+                order_ids = [order.id for order in orders]
+                for i in range(0, len(order_ids), self.batch_size):
+                    rows = (await db.execute(
+                        select(
+                            TrafficRollup.order_id,
+                            func.sum(TrafficRollup.bytes_in + TrafficRollup.bytes_out)
+                        ).where(
+                            TrafficRollup.order_id.in_(order_ids[i:i + self.batch_size]),
+                            TrafficRollup.resolution == DAY,
+                            TrafficRollup.bucket >= to_epoch(start),
+                            TrafficRollup.bucket < to_epoch(end)
+                        ).group_by(TrafficRollup.order_id)
+                    )).all()
+                    usage.update((order_id, int(total or 0)) for order_id, total in rows)
+
+        invoices: Dict[int, List[Dict[str, Any]]] = {}
+        for order in orders:
+            items = []
+            if order.status in BILLABLE_STATUSES and order.amount:
+                items.append({
+                    "description": f"{order.name or 'Order'} #{order.id} ({period})",
+                    "amount": round(order.amount, 2),
+                })
+            traffic = usage.get(order.id, 0) / GB
+            charge = round(traffic * self.traffic_price_per_gb, 2)
+            if charge > 0:
+                items.append({
+                    "description": f"Traffic for order #{order.id} ({period}): {traffic:.2f} GB",
+                    "amount": charge,
+                })
+            if items:
+                invoices.setdefault(order.whmcs_client_id, []).extend(items)
+        return invoices
+
+    async def _claim(
+        self,
+        period: str,
+        client_ids: List[int],
+        invoices: Dict[int, List[Dict[str, Any]]]
+    ) -> Dict[int, int]:
+        """调用WHMCS前先提交开票记录，返回本次认领的 {whmcs_client_id: 记录ID}
+
+        多个实例同时运行时，插入冲突的客户已被其他实例认领，跳过；
+        可重试的 failed 记录在同一事务内改回 pending。只返回带本次 claim_token 的记录。
+        """
+        token = uuid4().hex
+        amounts = {
+            client_id: round(sum(item["amount"] for item in items), 2)
+            for client_id, items in invoices.items()
+        }
+        rows = [
+            {
+                "whmcs_client_id": client_id,
+                "period": period,
+                "status": "pending" if client_id in amounts else "empty",
+                "amount": amounts.get(client_id, 0),
+                "claim_token": token,
+            }
+            for client_id in client_ids
+        ]
+        async with primary_session() as db:
+            await db.execute(self._insert_ignore(db.get_bind().dialect.name), rows)
+            if amounts:
+                await db.execute(
+                    update(UsageInvoice)
+                    .where(
+                        UsageInvoice.period == period,
+                        UsageInvoice.whmcs_client_id.in_(list(amounts)),
+                        self._retryable()
+                    )
+                    .values(
+                        status="pending",
+                        claim_token=token,
+                        amount=case(amounts, value=UsageInvoice.whmcs_client_id)
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            # 重试前费用已被撤销的客户不再开票
+            await db.execute(
+                update(UsageInvoice)
+                .where(
+                    UsageInvoice.period == period,
+                    UsageInvoice.whmcs_client_id.in_(client_ids),
+                    UsageInvoice.whmcs_client_id.notin_(list(amounts)),
+                    self._retryable()
+                )
+                .values(status="empty", amount=0, claim_token=token)
+                .execution_options(synchronize_session=False)
+            )
+            claimed = (await db.execute(
+                select(UsageInvoice.whmcs_client_id, UsageInvoice.id).where(
+                    UsageInvoice.claim_token == token,
+                    UsageInvoice.status == "pending",
+                )
+            )).all()
+            await db.commit()
+        return {client_id: invoice_id for client_id, invoice_id in claimed}
+
+    @staticmethod
+    def _insert_ignore(dialect: str):
+        """(whmcs_client_id, period) 冲突时不插入"""
+        if dialect == "mysql":
+            return mysql_insert(UsageInvoice).prefix_with("IGNORE")
+        if dialect == "postgresql":
+            statement = pg_insert(UsageInvoice)
+        elif dialect == "sqlite":
+            statement = sqlite_insert(UsageInvoice)
+        else:
+            raise NotImplementedError(f"Usage invoicing does not support {dialect}")
+        return statement.on_conflict_do_nothing(index_elements=["whmcs_client_id", "period"])
+
+    async def _pace(self) -> None:
+        """限制CreateInvoice的发送速率"""
+        async with self._pace_lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + 1 / self.max_per_second
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _dispatch(
+        self,
+        period: str,
+        end: datetime,
+        invoices: Dict[int, List[Dict[str, Any]]],
+        claims: Dict[int, int],
+        deadline: float
+    ) -> Tuple[int, int, bool]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        stop = asyncio.Event()
+        due_date = (end + timedelta(days=self.due_days)).strftime("%Y-%m-%d")
+        updates: List[Dict[str, Any]] = []
+        released: List[int] = []
+        sent: List[int] = []
+
+        async def call(client_id: int, items: List[Dict[str, Any]]) -> None:
+            invoice_id = claims[client_id]
+            async with semaphore:
+                # 未发送的请求释放记录，下次运行重新开票
+                if stop.is_set() or time.monotonic() >= deadline:
+                    released.append(invoice_id)
+                    return
+                await self._pace()
+                try:
+                    response = await self.whmcs_client.create_invoice(client_id, items, due_date=due_date)
+                except WHMCSUnavailableError:
+                    # 熔断器打开时请求没有发出
+                    stop.set()
+                    released.append(invoice_id)
+                    return
+                except Exception as e:
+                    sent.append(invoice_id)
+                    # CreateInvoice 不幂等，超时、响应无法解析等情况下无法确定是否已创建
+                    logger.error(f"CreateInvoice for client {client_id} ({period}) uncertain: {str(e)}")
+                    updates.append({"id": invoice_id, "status": "needs_review", "last_error": str(e)})
+                    return
+            sent.append(invoice_id)
+            if response.get("result") != "success":
+                logger.error(
+                    f"CreateInvoice rejected for client {client_id} ({period}): {response.get('message')}"
+                )
+                updates.append({
+                    "id": invoice_id,
+                    "status": "failed",
+                    "last_error": response.get("message") or "rejected",
+                })
+                return
+            updates.append({
+                "id": invoice_id,
+                "status": "invoiced",
+                "whmcs_invoice_id": int(response["invoiceid"]) if response.get("invoiceid") else None,
+                "invoiced_at": datetime.utcnow(),
+            })
+
+        try:
+            results = await asyncio.gather(
+                *(call(client_id, items) for client_id, items in invoices.items()),
+                return_exceptions=True
+            )
+            for client_id, error in zip(invoices, results):
+                if isinstance(error, Exception):
+                    # 请求可能已发出，按结果不确定处理
+                    logger.error(f"Invoicing client {client_id} ({period}) failed: {str(error)}")
+                    updates.append({"id": claims[client_id], "status": "needs_review", "last_error": str(error)})
+        finally:
+            # 已创建的发票必须记录下来，即使本批中途出错或任务被取消
+            async with primary_session() as db:
+                if updates:
+                    for status in ("invoiced", "needs_review", "failed"):
+                        rows = [row for row in updates if row["status"] == status]
+                        if rows:
+                            await db.execute(update(UsageInvoice), rows)
+                if sent:
+                    await db.execute(
+                        update(UsageInvoice)
+                        .where(UsageInvoice.id.in_(sent))
+                        .values(attempts=UsageInvoice.attempts + 1)
+                        .execution_options(synchronize_session=False)
+                    )
+                if released:
+                    # 未发送的记录恢复原状：新记录删除，重试中的记录保持 failed
+                    await db.execute(delete(UsageInvoice).where(
+                        UsageInvoice.id.in_(released), UsageInvoice.attempts == 0
+                    ))
+                    await db.execute(
+                        update(UsageInvoice)
+                        .where(UsageInvoice.id.in_(released), UsageInvoice.attempts > 0)
+                        .values(status="failed")
+                        .execution_options(synchronize_session=False)
+                    )
+                await db.commit()
+
+        invoiced = sum(1 for row in updates if row["status"] == "invoiced")
+        failed = len(invoices) - invoiced
+        logger.info(f"Invoicing {period}: {invoiced}/{len(invoices)} invoices created")
+        return invoiced, failed, stop.is_set()
+
+usage_invoicer = UsageInvoicer(
+    whmcs_client,
+    batch_size=settings.INVOICE_BATCH_SIZE,
+    concurrency=settings.INVOICE_CONCURRENCY,
+    max_per_second=settings.INVOICE_MAX_PER_SECOND,
+    max_runtime=settings.INVOICE_MAX_RUNTIME,
+    due_days=settings.INVOICE_DUE_DAYS,
+    traffic_price_per_gb=settings.INVOICE_TRAFFIC_PRICE_PER_GB,
+    max_attempts=settings.INVOICE_MAX_ATTEMPTS
+)
@@ -0,0 +1,128 @@
+from typing import Optional
+from uuid import uuid4
+import asyncio
+import logging
+import socket
+from app.core.config import get_settings
+from app.services.cache_service import cache_service
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# 租约不存在时获取租约，并递增fencing token
+# KEYS: 租约键, fencing计数键  ARGV: 节点ID, 租约毫秒数
+ACQUIRE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local token = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], ARGV[1] .. ':' .. token, 'PX', ARGV[2])
+return token
+"""
+
+# 仍持有租约时续期  KEYS: 租约键  ARGV: 租约值, 租约毫秒数
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# 仍持有租约时释放  KEYS: 租约键  ARGV: 租约值
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class LeaderElector:
+    """基于Redis租约的主节点选举
+
+    每个worker周期性尝试获取租约，主节点按 lease/3 的间隔续期；
+    续期失败立即退位，其他worker最迟在一个租约周期内接管。
+    每次获得租约时分配单调递增的fencing token，下游可据此拒绝过期主节点的写入。
+    """
+
+    def __init__(self, name: str = "default", lease_seconds: float = 15):
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.node_id = f"{socket.gethostname()}-{uuid4().hex[:8]}"
+        self.fencing_token: Optional[int] = None
+        self._redis = cache_service.redis_client
+        self._acquire = self._redis.register_script(ACQUIRE_SCRIPT)
+        self._renew = self._redis.register_script(RENEW_SCRIPT)
+        self._release = self._redis.register_script(RELEASE_SCRIPT)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def lease_key(self) -> str:
+        return f"leader:{self.name}"
+
+    @property
+    def is_leader(self) -> bool:
+        return self.fencing_token is not None
+
+    @property
+    def lease_value(self) -> str:
+        return f"{self.node_id}:{self.fencing_token}"
+
+    async def start(self) -> None:
+        """启动选举循环"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止选举并释放租约"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.is_leader:
+            try:
+                await self._release(keys=[self.lease_key], args=[self.lease_value])
+            except Exception as e:
+                logger.error(f"Failed to release leadership: {str(e)}")
+            self.fencing_token = None
+
+    async def _run(self) -> None:
+        lease_ms = int(self.lease_seconds * 1000)
+        while True:
+            try:
+                if self.is_leader:
+                    renewed = await self._renew(
+                        keys=[self.lease_key],
+                        args=[self.lease_value, lease_ms]
+                    )
+                    if not renewed:
+                        logger.warning(f"Lost leadership of {self.name}")
+                        self.fencing_token = None
+                else:
+                    token = await self._acquire(
+                        keys=[self.lease_key, f"{self.lease_key}:fencing"],
+                        args=[self.node_id, lease_ms]
+                    )
+                    if token:
+                        self.fencing_token = int(token)
+                        logger.info(f"Became leader of {self.name} with token {token}")
+            except Exception as e:
+                # 无法确认租约状态时按失去主节点处理
+                if self.is_leader:
+                    logger.error(f"Leadership renewal failed, stepping down: {str(e)}")
+                self.fencing_token = None
+            await asyncio.sleep(self.lease_seconds / 3)
+
+    async def validate(self, token: Optional[int]) -> bool:
+        """检查fencing token是否仍对应当前租约"""
+        if token is None:
+            return False
+        value = await self._redis.get(self.lease_key)
+        return value == f"{self.node_id}:{token}"
+
+leader_elector = LeaderElector(
+    name="scheduler",
+    lease_seconds=settings.LEADER_LEASE_SECONDS
+)
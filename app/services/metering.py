@@ -0,0 +1,299 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+import calendar
+import logging
+import re
+import time
+import aiohttp
+from sqlalchemy import and_, delete, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from yarl import URL
+from app.core.config import get_settings
+from app.db.base import primary_session
+from app.db.models import TrafficRollup, TrafficSample
+from app.services.cache_service import CacheService, cache_service
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# 上次采集到的累计计数，field 为 "<来源序号>|<代理名>"，value 为 "<in>:<out>"
+COUNTERS_KEY = "metering:counters"
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+RESOLUTIONS = {"minute": MINUTE, "hour": HOUR, "day": DAY}
+
+# 旧数据清理的最小间隔（秒）
+PRUNE_INTERVAL = 3600
+
+def to_epoch(value: datetime) -> int:
+    """无时区的时间按UTC处理，与 datetime.utcnow 保持一致"""
+    return calendar.timegm(value.utctimetuple())
+
+class TrafficMeter:
+    """从 frps dashboard 的 /api/proxy/<type> 拉取每个代理的累计流量，
+    计算增量后批量写入原始样本，并增量累加分钟/小时/天汇总；用量查询只读汇总表"""
+
+    def __init__(
+        self,
+        cache: CacheService,
+        sources: List[str],
+        proxy_types: List[str],
+        proxy_pattern: str = r"^order[_-](\d+)",
+        interval: float = 60,
+        batch_size: int = 5000,
+        sample_retention: int = 2 * DAY,
+        minute_retention: int = 7 * DAY,
+        timeout: float = 10
+    ):
+        self.cache = cache
+        self.sources = [self._parse_source(source) for source in sources]
+        self.proxy_types = proxy_types
+        self.proxy_pattern = re.compile(proxy_pattern)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.sample_retention = sample_retention
+        self.minute_retention = minute_retention
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._last_prune = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sources)
+
+    @staticmethod
+    def _parse_source(source: str) -> Tuple[URL, Optional[aiohttp.BasicAuth]]:
+        """dashboard 地址中的 user:password 转为 Basic 认证"""
+        url = URL(source.rstrip("/"))
+        auth = None
+        if url.user:
+            auth = aiohttp.BasicAuth(url.user, url.password or "")
+            url = url.with_user(None)
+        return url, auth
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=max(len(self.sources) * len(self.proxy_types), 1),
+                keepalive_timeout=max(self.interval * 2, 60),
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _fetch(self, index: int, proxy_type: str) -> List[Dict[str, Any]]:
+        url, auth = self.sources[index]
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with self._get_session().get(
+            url / "api" / "proxy" / proxy_type, auth=auth, timeout=timeout
+        ) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+        return data.get("proxies") or []
+
+    async def collect(self) -> Tuple[Dict[str, Tuple[int, int]], List[int]]:
+        """并发拉取所有来源，返回 {field: (in, out)} 以及拉取失败的来源序号"""
+        jobs = [
+            (index, proxy_type)
+            for index in range(len(self.sources))
+            for proxy_type in self.proxy_types
+        ]
+        results = await asyncio.gather(
+            *(self._fetch(index, proxy_type) for index, proxy_type in jobs),
+            return_exceptions=True
+        )
+        counters: Dict[str, Tuple[int, int]] = {}
+        failed = set()
+        for (index, proxy_type), result in zip(jobs, results):
+            if isinstance(result, BaseException):
+                logger.error(
+                    f"Failed to fetch {proxy_type} proxies from {self.sources[index][0]}: {str(result)}"
+                )
+                failed.add(index)
+                continue
+            for proxy in result:
+                name = proxy.get("name")
+                if not name:
+                    continue
+                counters[f"{index}|{name}"] = (
+                    int(proxy.get("todayTrafficIn") or 0),
+                    int(proxy.get("todayTrafficOut") or 0),
+                )
+        # 某个来源部分类型失败时整体丢弃，避免其代理被当作消失
+        counters = {
+            field: value for field, value in counters.items()
+            if int(field.split("|", 1)[0]) not in failed
+        }
+        return counters, sorted(failed)
+
+    def _order_id(self, field: str) -> Optional[int]:
+        match = self.proxy_pattern.match(field.split("|", 1)[1])
+        return int(match.group(1)) if match else None
+
+    def compute_deltas(
+        self,
+        previous: Dict[str, str],
+        current: Dict[str, Tuple[int, int]]
+    ) -> Dict[int, Tuple[int, int]]:
+        """按订单汇总本次增量；计数变小说明 frps 重启或跨天清零，此时增量为当前值；
+        首次出现的代理只记录基线"""
+        deltas: Dict[int, List[int]] = {}
+        for field, (bytes_in, bytes_out) in current.items():
+            order_id = self._order_id(field)
+            if order_id is None:
+                continue
+            prev = previous.get(field)
+            if prev is None:
+                continue
+            prev_in, prev_out = (int(part) for part in prev.split(":", 1))
+            delta_in = bytes_in - prev_in if bytes_in >= prev_in else bytes_in
+            delta_out = bytes_out - prev_out if bytes_out >= prev_out else bytes_out
+            if delta_in or delta_out:
+                total = deltas.setdefault(order_id, [0, 0])
+                total[0] += delta_in
+                total[1] += delta_out
+        return {order_id: (total[0], total[1]) for order_id, total in deltas.items()}
+
+    async def ingest(self) -> Dict[str, int]:
+        """采集一次：拉取计数、写入样本和汇总，提交后再保存计数基线"""
+        if not self.enabled:
+            return {"proxies": 0, "orders": 0, "failed_sources": 0}
+        now = int(time.time())
+        current, failed = await self.collect()
+        previous = await self.cache.redis_client.hgetall(COUNTERS_KEY)
+        deltas = self.compute_deltas(previous, current)
+
+        if deltas:
+            await self._write(now, deltas)
+
+        # 基线替换为本次结果，拉取失败的来源保留旧值，已删除的代理随之清除
+        failed_prefixes = tuple(f"{index}|" for index in failed)
+        state = {
+            field: value for field, value in previous.items()
+            if failed_prefixes and field.startswith(failed_prefixes)
+        }
+        state.update({field: f"{value[0]}:{value[1]}" for field, value in current.items()})
+        async with self.cache.redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(COUNTERS_KEY)
+            if state:
+                pipe.hset(COUNTERS_KEY, mapping=state)
+            await pipe.execute()
+
+        if now - self._last_prune >= PRUNE_INTERVAL:
+            await self.prune(now)
+            self._last_prune = now
+
+        logger.info(
+            f"Traffic ingest: {len(current)} proxies, {len(deltas)} orders, "
+            f"{len(failed)} failed sources"
+        )
+        return {"proxies": len(current), "orders": len(deltas), "failed_sources": len(failed)}
+
+    async def _write(self, now: int, deltas: Dict[int, Tuple[int, int]]) -> None:
+        samples = [
+            {"order_id": order_id, "ts": now, "bytes_in": bytes_in, "bytes_out": bytes_out}
+            for order_id, (bytes_in, bytes_out) in deltas.items()
+        ]
+        rollups = [
+            {
+                "order_id": order_id,
+                "resolution": resolution,
+                "bucket": now - now % resolution,
+                "bytes_in": bytes_in,
+                "bytes_out": bytes_out,
+            }
+            for order_id, (bytes_in, bytes_out) in deltas.items()
+            for resolution in RESOLUTIONS.values()
+        ]
+        # 样本和汇总在同一事务提交，失败时基线不更新，下次采集会补上这段增量
+        async with primary_session() as db:
+            dialect = db.get_bind().dialect.name
+            for model, rows, keys in (
+                (TrafficSample, samples, ("order_id", "ts")),
+                (TrafficRollup, rollups, ("order_id", "resolution", "bucket")),
+            ):
+                statement = self._accumulate(dialect, model, keys)
+                for chunk in self._chunks(rows):
+                    await db.execute(statement, chunk)
+            await db.commit()
+
+    @staticmethod
+    def _accumulate(dialect: str, model: Any, keys: Iterable[str]):
+        """主键冲突时把字节数累加到已有行"""
+        if dialect == "mysql":
+            statement = mysql_insert(model)
+            return statement.on_duplicate_key_update(
+                bytes_in=model.bytes_in + statement.inserted.bytes_in,
+                bytes_out=model.bytes_out + statement.inserted.bytes_out,
+            )
+        if dialect == "postgresql":
+            statement = pg_insert(model)
+        elif dialect == "sqlite":
+            statement = sqlite_insert(model)
+        else:
+            raise NotImplementedError(f"Traffic metering does not support {dialect}")
+        return statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={
+                "bytes_in": model.bytes_in + statement.excluded.bytes_in,
+                "bytes_out": model.bytes_out + statement.excluded.bytes_out,
+            }
+        )
+
+    def _chunks(self, rows: List[Dict[str, Any]]) -> Iterable[List[Dict[str, Any]]]:
+        for i in range(0, len(rows), self.batch_size):
+            yield rows[i:i + self.batch_size]
+
+    async def prune(self, now: Optional[int] = None) -> None:
+        """删除超过保留期的原始样本和分钟汇总，小时和天汇总长期保留"""
+        now = now or int(time.time())
+        async with primary_session() as db:
+            await db.execute(
+                delete(TrafficSample).where(TrafficSample.ts < now - self.sample_retention)
+            )
+            await db.execute(
+                delete(TrafficRollup).where(and_(
+                    TrafficRollup.resolution == MINUTE,
+                    TrafficRollup.bucket < now - self.minute_retention
+                ))
+            )
+            await db.commit()
+
+    @staticmethod
+    async def get_usage(
+        db: AsyncSession,
+        order_id: int,
+        resolution: int,
+        start: datetime,
+        end: datetime
+    ) -> List[TrafficRollup]:
+        """读取订单在 [start, end) 内指定粒度的汇总"""
+        return (await db.scalars(
+            select(TrafficRollup).where(
+                TrafficRollup.order_id == order_id,
+                TrafficRollup.resolution == resolution,
+                TrafficRollup.bucket >= to_epoch(start),
+                TrafficRollup.bucket < to_epoch(end)
+            ).order_by(TrafficRollup.bucket)
+        )).all()
+
+traffic_meter = TrafficMeter(
+    cache_service,
+    settings.METERING_FRPS_URLS,
+    settings.METERING_PROXY_TYPES,
+    proxy_pattern=settings.METERING_PROXY_PATTERN,
+    interval=settings.METERING_INTERVAL,
+    batch_size=settings.METERING_BATCH_SIZE,
+    sample_retention=settings.METERING_SAMPLE_RETENTION,
+    minute_retention=settings.METERING_MINUTE_RETENTION
+)
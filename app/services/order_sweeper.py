@@ -0,0 +1,233 @@
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import json
+import logging
+from sqlalchemy import and_, or_, select, update
+from app.core.config import get_settings
+from app.db.base import primary_session
+from app.db.models import Order
+from app.services.cache_service import cache_service
+from app.services.whmcs_client import whmcs_client
+from whmcs import WHMCSClient, WHMCSError
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# 每种处理方向：(扫描的状态, 处理中状态, 完成状态, 是否扫描已到期订单)
+SUSPEND = ("active", "suspending", "suspended", True)
+UNSUSPEND = ("suspended", "unsuspending", "active", False)
+
+class OrderSweeper:
+    """暂停已到期的订单，恢复已续期的订单
+
+    按 (expires_at, id) 键集分页扫描，每批先批量把状态改为处理中并提交，
+    再以有限并发调用WHMCS，最后批量写入结果并记录检查点。
+    进程中途退出或调用失败时，处理中状态的订单会在下次运行时继续处理；
+    失败按指数退避重试，达到 max_attempts 次后转为 needs_review 等待人工处理。
+    """
+
+    def __init__(
+        self,
+        whmcs_client: WHMCSClient,
+        batch_size: int = 500,
+        concurrency: int = 10,
+        interval: float = 300,
+        max_attempts: int = 5
+    ):
+        self.whmcs_client = whmcs_client
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.interval = interval
+        self.max_attempts = max_attempts
+
+    def _checkpoint_key(self, status: str) -> str:
+        return f"sweeper:checkpoint:{status}"
+
+    async def sweep(self) -> Dict[str, int]:
+        """执行一次完整扫描"""
+        now = datetime.utcnow()
+        suspended = await self._process(SUSPEND, now)
+        unsuspended = await self._process(UNSUSPEND, now)
+        return {"suspended": suspended, "unsuspended": unsuspended}
+
+    async def _process(self, direction: Tuple[str, str, str, bool], now: datetime) -> int:
+        source, pending, target, expired = direction
+        # 先处理上次中断时遗留的处理中订单
+        done = await self._resume_pending(direction, now)
+
+        cursor = await self._load_checkpoint(source)
+        while True:
+            batch = await self._next_batch(source, now, expired, cursor)
+            if not batch:
+                break
+            claimed = await self._claim(direction, batch, now)
+            if claimed:
+                done += await self._dispatch(direction, claimed)
+            last_id, _, last_expires_at = batch[-1]
+            cursor = (last_expires_at, last_id)
+            await self._save_checkpoint(source, cursor)
+
+        await cache_service.delete(self._checkpoint_key(source))
+        return done
+
+    async def _claim(
+        self,
+        direction: Tuple[str, str, str, bool],
+        batch: List[Tuple[int, Optional[int], datetime]],
+        now: datetime
+    ) -> List[Tuple[int, Optional[int], datetime]]:
+        """把仍满足条件的订单改为处理中，返回实际改动的订单
+
+        查询和更新之间订单可能被续期或修改，更新时重新检查状态和到期条件，
+        只有确实转为处理中的订单才调用WHMCS。
+        """
+        source, pending, _, expired = direction
+        ids = [order_id for order_id, _, _ in batch]
+        async with primary_session() as db:
+            await db.execute(
+                update(Order)
+                .where(Order.id.in_(ids), Order.status == source, *self._due(expired, now))
+                .values(status=pending, sweep_attempts=0, sweep_next_attempt_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            claimed = (await db.execute(
+                select(Order.id, Order.whmcs_service_id, Order.expires_at)
+                .where(Order.id.in_(ids), Order.status == pending)
+                .order_by(Order.expires_at, Order.id)
+            )).all()
+            await db.commit()
+        return [tuple(row) for row in claimed]
+
+    @staticmethod
+    def _due(expired: Optional[bool], now: datetime) -> list:
+        """按处理方向筛选到期条件，expired 为 None 时（处理中订单）只取已到重试时间的"""
+        if expired is True:
+            return [Order.expires_at <= now]
+        if expired is False:
+            # 只恢复续期过的订单，不影响人工暂停的订单
+            return [Order.expires_at > now, Order.last_renewed_at.isnot(None)]
+        return [or_(Order.sweep_next_attempt_at.is_(None), Order.sweep_next_attempt_at <= now)]
+
+    async def _resume_pending(self, direction: Tuple[str, str, str, bool], now: datetime) -> int:
+        _, pending, _, _ = direction
+        done = 0
+        cursor = None
+        while True:
+            batch = await self._next_batch(pending, now, None, cursor)
+            if not batch:
+                return done
+            done += await self._dispatch(direction, batch)
+            last_id, _, last_expires_at = batch[-1]
+            cursor = (last_expires_at, last_id)
+
+    async def _next_batch(
+        self,
+        status: str,
+        now: datetime,
+        expired: Optional[bool],
+        cursor: Optional[Tuple[datetime, int]]
+    ) -> List[Tuple[int, Optional[int], datetime]]:
+        # 走 idx_order_status_expires (status, expires_at, id) 索引
+        query = (
+            select(Order.id, Order.whmcs_service_id, Order.expires_at)
+            .where(Order.status == status, Order.expires_at.isnot(None), *self._due(expired, now))
+            .order_by(Order.expires_at, Order.id)
+            .limit(self.batch_size)
+        )
+        if cursor is not None:
+            last_expires_at, last_id = cursor
+            query = query.where(or_(
+                Order.expires_at > last_expires_at,
+                and_(Order.expires_at == last_expires_at, Order.id > last_id)
+            ))
+        async with primary_session() as db:
+            return [tuple(row) for row in (await db.execute(query)).all()]
+
+    async def _dispatch(
+        self,
+        direction: Tuple[str, str, str, bool],
+        batch: List[Tuple[int, Optional[int], datetime]]
+    ) -> int:
+        source, pending, target, _ = direction
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def call(order_id: int, service_id: Optional[int]) -> Tuple[int, Optional[str]]:
+            """返回 (订单ID, 错误信息)，成功时错误信息为 None"""
+            if service_id is None:
+                # 没有WHMCS服务的订单只更新本地状态
+                return order_id, None
+            async with semaphore:
+                try:
+                    if target == "suspended":
+                        response = await self.whmcs_client.suspend_product(service_id, "Expired")
+                    else:
+                        response = await self.whmcs_client.unsuspend_product(service_id)
+                except WHMCSError as e:
+                    logger.error(f"WHMCS {target} failed for order {order_id}: {str(e)}")
+                    return order_id, str(e)
+            if response.get("result") != "success":
+                logger.error(f"WHMCS {target} rejected for order {order_id}: {response.get('message')}")
+                return order_id, response.get("message") or "rejected"
+            return order_id, None
+
+        results = await asyncio.gather(*(
+            call(order_id, service_id) for order_id, service_id, _ in batch
+        ))
+        succeeded = [order_id for order_id, error in results if error is None]
+        failed = [order_id for order_id, error in results if error is not None]
+        if succeeded:
+            async with primary_session() as db:
+                await db.execute(
+                    update(Order)
+                    .where(Order.id.in_(succeeded), Order.status == pending)
+                    .values(status=target, sweep_attempts=0, sweep_next_attempt_at=None)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+        if failed:
+            await self._record_failures(pending, failed)
+        logger.info(f"Order sweep: {len(succeeded)}/{len(batch)} orders {target}")
+        return len(succeeded)
+
+    async def _record_failures(self, pending: str, order_ids: List[int]) -> None:
+        """累计失败次数并推迟下次重试，达到上限的订单转为 needs_review"""
+        now = datetime.utcnow()
+        async with primary_session() as db:
+            orders = (await db.scalars(
+                select(Order).where(Order.id.in_(order_ids), Order.status == pending)
+            )).all()
+            for order in orders:
+                order.sweep_attempts = (order.sweep_attempts or 0) + 1
+                if order.sweep_attempts >= self.max_attempts:
+                    logger.error(f"Order {order.id} gave up {pending} after {order.sweep_attempts} attempts")
+                    order.status = "needs_review"
+                    order.sweep_next_attempt_at = None
+                else:
+                    order.sweep_next_attempt_at = now + timedelta(
+                        seconds=min(3600, self.interval * 2 ** (order.sweep_attempts - 1))
+                    )
+            await db.commit()
+
+    async def _load_checkpoint(self, status: str) -> Optional[Tuple[datetime, int]]:
+        raw = await cache_service.get(self._checkpoint_key(status))
+        if not raw:
+            return None
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["expires_at"]), data["id"]
+
+    async def _save_checkpoint(self, status: str, cursor: Tuple[datetime, int]) -> None:
+        expires_at, order_id = cursor
+        await cache_service.set(
+            self._checkpoint_key(status),
+            json.dumps({"expires_at": expires_at.isoformat(), "id": order_id}),
+            ttl=86400
+        )
+
+order_sweeper = OrderSweeper(
+    whmcs_client,
+    batch_size=settings.ORDER_SWEEP_BATCH_SIZE,
+    concurrency=settings.ORDER_SWEEP_CONCURRENCY,
+    interval=settings.ORDER_SWEEP_INTERVAL,
+    max_attempts=settings.ORDER_SWEEP_MAX_ATTEMPTS
+)
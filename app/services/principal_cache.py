@@ -0,0 +1,82 @@
+from typing import Any, Dict, Optional, Set
+from collections import OrderedDict
+import time
+import logging
+from app.core.config import get_settings
+from app.services.tiered_cache import tiered_cache
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+class PrincipalCache:
+    """已验证令牌到用户对象的进程内缓存"""
+
+    def __init__(self, maxsize: int = 10000, ttl: int = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self.tokens_by_user: Dict[int, Set[str]] = {}
+
+    def get(self, token: str) -> Optional[Any]:
+        """按令牌获取用户"""
+        entry = self.entries.get(token)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if time.time() >= expires_at:
+            self._remove(token)
+            return None
+        self.entries.move_to_end(token)
+        return user
+
+    def set(self, token: str, user: Any, token_exp: Optional[float] = None) -> None:
+        """缓存用户，过期时间不超过令牌的exp"""
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+
+        if token in self.entries:
+            self._remove(token)
+        elif len(self.entries) >= self.maxsize:
+            # 移除最久未使用的项
+            self._remove(next(iter(self.entries)))
+
+        self.entries[token] = (expires_at, user)
+        self.tokens_by_user.setdefault(user.id, set()).add(token)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """用户被修改或删除时清除其所有令牌"""
+        for token in self.tokens_by_user.pop(user_id, set()):
+            self.entries.pop(token, None)
+        logger.debug(f"Invalidated cached principals for user {user_id}")
+
+    def clear(self) -> None:
+        """清除所有缓存"""
+        self.entries.clear()
+        self.tokens_by_user.clear()
+
+    def _remove(self, token: str) -> None:
+        _, user = self.entries.pop(token)
+        tokens = self.tokens_by_user.get(user.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self.tokens_by_user[user.id]
+
+principal_cache = PrincipalCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAXSIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL
+)
+
+PRINCIPAL_KEY_PREFIX = "principal:"
+
+def principal_key(user_id: int) -> str:
+    """用户失效消息使用的缓存键"""
+    return f"{PRINCIPAL_KEY_PREFIX}{user_id}"
+
+def _on_invalidate(name: str) -> None:
+    if name.startswith(PRINCIPAL_KEY_PREFIX):
+        principal_cache.invalidate_user(int(name[len(PRINCIPAL_KEY_PREFIX):]))
+
+# 其他worker修改或删除用户时，通过失效广播清除本进程的缓存
+tiered_cache.add_listener(_on_invalidate)
@@ -1,10 +1,24 @@
-from typing import Any, List, Optional, Type, TypeVar
-from sqlalchemy import select, func
-from sqlalchemy.orm import Session, joinedload
+from typing import Any, List, Optional, Tuple, Type, TypeVar
+from datetime import datetime
+from enum import Enum
+import base64
+import json
+import logging
+from sqlalchemy import and_, or_, select, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, raiseload, selectinload
 from sqlalchemy.sql import Select
 from app.db.base import Base
+from app.services.count_cache import count_cache, query_signature
 
 ModelType = TypeVar("ModelType", bound=Base)
+logger = logging.getLogger(__name__)
+
+class CountStrategy(str, Enum):
+    EXACT = "exact"        # 每次执行 count(*)
+    CACHED = "cached"      # 精确计数按过滤条件缓存，表写入后失效
+    ESTIMATE = "estimate"  # PostgreSQL/MySQL 使用执行计划估算，其他数据库回退到 cached
+    NONE = "none"          # 不计数，只返回是否还有下一页
 
 class QueryOptimizer:
     @staticmethod
@@ -17,26 +31,142 @@ class QueryOptimizer:
         return query.offset((page - 1) * per_page).limit(per_page)
 
     @staticmethod
-    def with_count(db: Session, query: Select) -> tuple[List[Any], int]:
-        """获取查询结果及总数"""
-        count = db.scalar(
-            select(func.count()).select_from(query.subquery())
+    def encode_cursor(created_at: datetime, row_id: int) -> str:
+        """将排序键编码为不透明游标"""
+        payload = json.dumps({"c": created_at.isoformat(), "i": row_id})
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        """解析游标，格式错误时抛出 ValueError"""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return datetime.fromisoformat(payload["c"]), int(payload["i"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError("Invalid cursor") from e
+
+    @staticmethod
+    def keyset_paginate(
+        query: Select,
+        model: Type[ModelType],
+        cursor: Optional[str] = None,
+        limit: int = 50
+    ) -> Select:
+        """按 (created_at, id) 倒序的键集分页，多取一行用于判断是否有下一页"""
+        if cursor:
+            created_at, row_id = QueryOptimizer.decode_cursor(cursor)
+            query = query.where(or_(
+                model.created_at < created_at,
+                and_(model.created_at == created_at, model.id < row_id)
+            ))
+        return query.order_by(
+            model.created_at.desc(),
+            model.id.desc()
+        ).limit(limit + 1)
+
+    @staticmethod
+    async def fetch_page(
+        db: AsyncSession,
+        query: Select,
+        model: Type[ModelType],
+        cursor: Optional[str] = None,
+        limit: int = 50
+    ) -> Tuple[List[Any], Optional[str]]:
+        """获取一页结果及下一页游标，深分页与第一页开销相同"""
+        rows = (await db.scalars(
+            QueryOptimizer.keyset_paginate(query, model, cursor, limit)
+        )).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = QueryOptimizer.encode_cursor(last.created_at, last.id)
+        return rows, next_cursor
+
+    @staticmethod
+    async def count(
+        db: AsyncSession,
+        query: Select,
+        strategy: CountStrategy = CountStrategy.EXACT
+    ) -> Optional[int]:
+        """按指定策略统计查询总数，NONE 策略返回 None"""
+        if strategy == CountStrategy.NONE:
+            return None
+        query = query.order_by(None)
+
+        async def exact() -> int:
+            return await db.scalar(
+                select(func.count()).select_from(query.subquery())
+            )
+
+        if strategy == CountStrategy.EXACT:
+            return await exact()
+        dialect = db.get_bind().dialect
+        if strategy == CountStrategy.ESTIMATE:
+            try:
+                estimate = await QueryOptimizer._estimate_count(db, query)
+            except Exception as e:
+                logger.warning(f"Count estimate failed, falling back to cached count: {str(e)}")
+                estimate = None
+            if estimate is not None:
+                return estimate
+        return await count_cache.get_or_count(
+            query, query_signature(query, dialect), exact
         )
-        results = db.scalars(query).all()
-        return results, count
+
+    @staticmethod
+    async def _estimate_count(db: AsyncSession, query: Select) -> Optional[int]:
+        """读取查询计划中的估算行数，不支持的数据库返回 None"""
+        dialect = db.get_bind().dialect
+        if dialect.name not in ("postgresql", "mysql", "mariadb"):
+            return None
+        sql = str(query.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+        if dialect.name == "postgresql":
+            plan = await db.scalar(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+        row = (await db.execute(text(f"EXPLAIN {sql}"))).mappings().first()
+        if row is None or row["rows"] is None:
+            return None
+        return int(row["rows"] * float(row.get("filtered") or 100) / 100)
+
+    @staticmethod
+    async def with_count(
+        db: AsyncSession,
+        query: Select,
+        page: int = 1,
+        per_page: int = 10,
+        strategy: CountStrategy = CountStrategy.EXACT
+    ) -> Tuple[List[Any], Optional[int], bool]:
+        """获取一页结果、总数及是否还有下一页"""
+        results = (await db.scalars(
+            query.offset((page - 1) * per_page).limit(per_page + 1)
+        )).all()
+        has_more = len(results) > per_page
+        total = await QueryOptimizer.count(db, query, strategy)
+        return results[:per_page], total, has_more
 
     @staticmethod
     def optimize_query(
         model: Type[ModelType],
         *relations: str,
+        load_strategy: str = "joined",
+        raise_on_lazy: bool = False,
         **filters: Any
     ) -> Select:
-        """优化查询，自动加载关系"""
+        """优化查询，自动加载关系；load_strategy 为 joined 或 selectin"""
         query = select(model)
+        loader = {"joined": joinedload, "selectin": selectinload}[load_strategy]
         
         # 添加关系预加载
         for relation in relations:
-            query = query.options(joinedload(getattr(model, relation)))
+            query = query.options(loader(getattr(model, relation)))
+        
+        # 未声明的关系一旦被访问直接报错，而不是逐行懒加载
+        if raise_on_lazy:
+            query = query.options(raiseload("*"))
         
         # 添加过滤条件
         for key, value in filters.items():
@@ -46,8 +176,23 @@ class QueryOptimizer:
         return query
 
     @staticmethod
-    def batch_query(
-        db: Session,
+    def bulk_query(
+        model: Type[ModelType],
+        *relations: str,
+        **filters: Any
+    ) -> Select:
+        """列表类查询：关系用 selectin 加载，不会重复父行，其余关系禁止懒加载"""
+        return QueryOptimizer.optimize_query(
+            model,
+            *relations,
+            load_strategy="selectin",
+            raise_on_lazy=True,
+            **filters
+        )
+
+    @staticmethod
+    async def batch_query(
+        db: AsyncSession,
         model: Type[ModelType],
         ids: List[int],
         batch_size: int = 100
@@ -56,9 +201,9 @@ class QueryOptimizer:
         results = []
         for i in range(0, len(ids), batch_size):
             batch_ids = ids[i:i + batch_size]
-            batch_results = db.scalars(
+            batch_results = (await db.scalars(
                 select(model).filter(model.id.in_(batch_ids))
-            ).all()
+            )).all()
             results.extend(batch_results)
         return results
 
@@ -85,7 +230,5 @@ class QueryOptimizer:
                     conditions.append(
                         column.contains(search_term)
                     )
-            query = query.filter(
-                func.or_(*conditions)
-            )
+            query = query.filter(or_(*conditions))
         return query
@@ -0,0 +1,245 @@
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# 一次调用内检查并累加所有时间窗口
+# KEYS: 每个窗口一个计数键
+# ARGV: carry, cost, 然后依次为每个窗口的 limit, window_ms
+# carry 是本地快速路径已放行、需要无条件补记的请求数
+RATE_LIMIT_SCRIPT = """
+local carry = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+if carry > 0 then
+    for i = 1, #KEYS do
+        local current = redis.call('INCRBY', KEYS[i], carry)
+        if current == carry then
+            redis.call('PEXPIRE', KEYS[i], tonumber(ARGV[2 * i + 2]))
+        end
+    end
+end
+for i = 1, #KEYS do
+    local limit = tonumber(ARGV[2 * i + 1])
+    local current = tonumber(redis.call('GET', KEYS[i]) or '0')
+    if current + cost > limit then
+        local ttl = redis.call('PTTL', KEYS[i])
+        if ttl < 0 then
+            ttl = tonumber(ARGV[2 * i + 2])
+        end
+        return {0, ttl, 0}
+    end
+end
+local remaining = -1
+for i = 1, #KEYS do
+    local limit = tonumber(ARGV[2 * i + 1])
+    local current = redis.call('INCRBY', KEYS[i], cost)
+    if current == cost then
+        redis.call('PEXPIRE', KEYS[i], tonumber(ARGV[2 * i + 2]))
+    end
+    if remaining < 0 or limit - current < remaining then
+        remaining = limit - current
+    end
+end
+return {1, 0, remaining}
+"""
+
+TIME_UNITS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+}
+
+Rule = Tuple[int, int]  # (次数, 窗口秒数)
+
+def parse_rules(spec: str) -> List[Rule]:
+    """解析限速规则，例如 60/minute,1000/hour 或 5/300"""
+    rules = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        times, period = part.split("/", 1)
+        period = period.strip()
+        seconds = TIME_UNITS.get(period.rstrip("s")) or int(period)
+        rules.append((int(times), seconds))
+    return rules
+
+class LocalBucket:
+    """Redis预授权的本地令牌，批量回写到Redis"""
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        self.tokens = 0
+        self.pending = 0
+        self.expires_at = 0.0
+
+class RateLimitEngine:
+    def __init__(
+        self,
+        redis_client,
+        default_rules: List[Rule],
+        route_rules: Optional[Dict[str, List[Rule]]] = None,
+        local_batch: int = 0,
+        sync_interval: float = 1.0,
+        headroom_ratio: float = 0.5,
+        prefix: str = "ratelimit",
+        max_buckets: int = 10000
+    ):
+        self.redis = redis_client
+        self.default_rules = default_rules
+        # 按前缀长度倒序，优先匹配最具体的路由
+        self.route_rules = sorted(
+            (route_rules or {}).items(),
+            key=lambda item: len(item[0]),
+            reverse=True
+        )
+        self.local_batch = local_batch
+        self.sync_interval = sync_interval
+        self.headroom_ratio = headroom_ratio
+        self.prefix = prefix
+        self.script = redis_client.register_script(RATE_LIMIT_SCRIPT)
+        self.max_buckets = max_buckets
+        self.buckets: Dict[str, LocalBucket] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """启用本地令牌时，定期回写已过期令牌的计数"""
+        if self.local_batch > 0 and self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """停止回写任务，并把所有未回写的计数写入Redis"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(expired_only=False)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Rate limit flush failed: {str(e)}")
+
+    async def flush(self, expired_only: bool = True) -> None:
+        """把本地已放行的请求数补记到Redis并移除令牌
+
+        客户端不再请求时，过期令牌上的计数不会随下一次请求回写，需要在这里补上
+        """
+        now = time.monotonic()
+        for key, bucket in list(self.buckets.items()):
+            if expired_only and bucket.expires_at > now:
+                continue
+            carry, bucket.pending = bucket.pending, 0
+            if carry > 0:
+                try:
+                    await self._call(key, bucket.rules, carry, 0)
+                except Exception as e:
+                    # 保留计数，下次回写时重试
+                    bucket.pending += carry
+                    logger.error(f"Rate limit flush for {key} failed: {str(e)}")
+                    continue
+            # 回写期间同一键可能已重新发放令牌
+            if (
+                self.buckets.get(key) is bucket
+                and bucket.pending == 0
+                and (not expired_only or bucket.expires_at <= now)
+            ):
+                del self.buckets[key]
+
+    async def _call(self, key: str, rules: List[Rule], carry: int, cost: int):
+        keys = [f"{key}:{window}" for _, window in rules]
+        args = [carry, cost]
+        for times, window in rules:
+            args.extend([times, window * 1000])
+        return await self.script(keys=keys, args=args)
+
+    def match_route(self, path: str) -> Tuple[str, List[Rule]]:
+        """返回路径对应的规则组名称和规则"""
+        for route, rules in self.route_rules:
+            if path.startswith(route):
+                return route, rules
+        return "default", self.default_rules
+
+    async def hit(self, identifier: str, path: str) -> Tuple[bool, int]:
+        """记录一次请求，返回 (是否放行, 重试等待秒数)"""
+        route, rules = self.match_route(path)
+        if not rules:
+            return True, 0
+        # 未单独配置的路由按路径分别计数，配置了前缀的路由整组共用一个计数
+        key = f"{self.prefix}:{identifier}:{path if route == 'default' else route}"
+
+        # 本地快速路径：距离上限很远的客户端直接消耗本地令牌
+        bucket = self.buckets.get(key)
+        now = time.monotonic()
+        if bucket is not None and bucket.tokens > 0 and now < bucket.expires_at:
+            bucket.tokens -= 1
+            bucket.pending += 1
+            return True, 0
+
+        # 先取走待回写计数，避免与 flush 并发时重复补记
+        carry = 0
+        if bucket is not None:
+            carry, bucket.pending, bucket.tokens = bucket.pending, 0, 0
+        try:
+            allowed, retry_after_ms, remaining = await self._call(key, rules, carry, 1)
+        except Exception as e:
+            if bucket is not None:
+                bucket.pending += carry
+            # Redis不可用时放行，避免限速器拖垮整个服务
+            logger.error(f"Rate limit check failed: {str(e)}")
+            return True, 0
+
+        if not allowed:
+            return False, max(1, int(retry_after_ms) // 1000)
+
+        if self.local_batch > 0:
+            headroom = int(min(times for times, _ in rules) * self.headroom_ratio)
+            tokens = min(self.local_batch, int(remaining) - headroom)
+            bucket = self.buckets.get(key)
+            if tokens > 0:
+                if bucket is None:
+                    if len(self.buckets) >= self.max_buckets:
+                        self._prune(now)
+                    bucket = self.buckets[key] = LocalBucket(rules)
+                bucket.tokens = tokens
+                bucket.expires_at = now + self.sync_interval
+            elif bucket is not None and bucket.pending == 0:
+                del self.buckets[key]
+        return True, 0
+
+    def _prune(self, now: float) -> None:
+        """清理已过期且没有待回写计数的本地令牌"""
+        for key in [
+            key for key, bucket in self.buckets.items()
+            if bucket.expires_at <= now and bucket.pending == 0
+        ]:
+            del self.buckets[key]
+
+def create_rate_limit_engine(redis_client) -> RateLimitEngine:
+    """按配置创建限速引擎"""
+    default_rules = [
+        (settings.RATE_LIMIT_PER_MINUTE, 60),
+        (settings.RATE_LIMIT_PER_HOUR, 3600),
+    ]
+    route_rules = {
+        route: parse_rules(spec)
+        for route, spec in settings.RATE_LIMIT_ROUTES.items()
+    }
+    return RateLimitEngine(
+        redis_client,
+        default_rules,
+        route_rules,
+        local_batch=settings.RATE_LIMIT_LOCAL_BATCH,
+        sync_interval=settings.RATE_LIMIT_SYNC_INTERVAL,
+    )
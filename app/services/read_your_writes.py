@@ -0,0 +1,65 @@
+from typing import Set
+import asyncio
+import logging
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.config import get_settings
+from app.db.routing import WROTE_KEY, pin_to_primary
+from app.services.cache_service import CacheService, cache_service
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+MARKER_PREFIX = "ryw:"
+USER_KEY = "user_id"
+
+class ReadYourWrites:
+    """用户写入后在短时间内把他的请求固定到主库，避免从落后的副本读到旧数据"""
+
+    def __init__(self, cache: CacheService, ttl: int = 5, enabled: bool = True):
+        self.cache = cache
+        self.ttl = ttl
+        self.enabled = enabled
+        self._background: Set[asyncio.Task] = set()
+
+    async def apply(self, db: AsyncSession, user_id: int) -> None:
+        """在请求开始时调用：记录用户，最近写过数据则该请求使用主库"""
+        if not self.enabled:
+            return
+        db.info[USER_KEY] = user_id
+        try:
+            if await self.cache.exists(f"{MARKER_PREFIX}{user_id}"):
+                pin_to_primary(db.sync_session)
+        except Exception as e:
+            # Redis不可用时宁可读主库
+            logger.error(f"Failed to read write marker: {str(e)}")
+            pin_to_primary(db.sync_session)
+
+    async def mark(self, user_id: int) -> None:
+        try:
+            await self.cache.set(f"{MARKER_PREFIX}{user_id}", "1", ttl=self.ttl)
+        except Exception as e:
+            logger.error(f"Failed to set write marker: {str(e)}")
+
+    def mark_later(self, user_id: int) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self.mark(user_id))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+read_your_writes = ReadYourWrites(
+    cache_service,
+    ttl=settings.READ_YOUR_WRITES_TTL,
+    enabled=bool(settings.DATABASE_REPLICA_URLS)
+)
+
+@event.listens_for(Session, "after_commit")
+def _mark_after_commit(session):
+    if session.info.pop(WROTE_KEY, False):
+        user_id = session.info.get(USER_KEY)
+        if user_id is not None and read_your_writes.enabled:
+            read_your_writes.mark_later(user_id)
@@ -0,0 +1,201 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from datetime import datetime, timedelta
+import asyncio
+import logging
+from app.services.cache_service import cache_service
+from app.services.leader_election import LeaderElector, leader_elector
+
+logger = logging.getLogger(__name__)
+
+# cron各字段的取值范围：分 时 日 月 周
+CRON_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+def parse_cron_field(field: str, low: int, high: int) -> Set[int]:
+    """解析单个cron字段，支持 *、*/n、a-b、a-b/n 和逗号列表"""
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(value) for value in part.split("-", 1))
+        else:
+            start = end = int(part)
+        if start < low or end > high:
+            raise ValueError(f"Cron value out of range: {part}")
+        values.update(range(start, end + 1, step))
+    return values
+
+class CronSchedule:
+    """标准5字段cron表达式
+
+    与cron相同，日和周都被限制（都不以 * 开头）时满足其一即可，否则两者都需满足
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Invalid cron expression: {expression}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = [
+            parse_cron_field(field, low, high)
+            for field, (low, high) in zip(fields, CRON_RANGES)
+        ]
+        self.day_or_weekday = not fields[2].startswith("*") and not fields[4].startswith("*")
+
+    def _day_matches(self, candidate: datetime) -> bool:
+        day = candidate.day in self.days
+        weekday = candidate.isoweekday() % 7 in self.weekdays
+        if self.day_or_weekday:
+            return day or weekday
+        return day and weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        """返回 moment 之后第一个匹配的时间点"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # 最多向后查找一年
+        for _ in range(366 * 24 * 60):
+            if (
+                candidate.month in self.months
+                and self._day_matches(candidate)
+                and candidate.hour in self.hours
+                and candidate.minute in self.minutes
+            ):
+                return candidate
+            candidate += timedelta(minutes=1)
+        raise ValueError(f"Cron expression never matches: {self.expression}")
+
+class PeriodicJob:
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        cron: Optional[str] = None,
+        interval: Optional[float] = None
+    ):
+        if (cron is None) == (interval is None):
+            raise ValueError("Exactly one of cron or interval is required")
+        self.name = name
+        self.func = func
+        self.schedule = CronSchedule(cron) if cron else None
+        self.interval = interval
+        self.next_run: Optional[datetime] = None
+        self.task: Optional[asyncio.Task] = None
+        # 启动本次运行时的fencing token
+        self.token: Optional[int] = None
+
+    def next_after(self, moment: datetime) -> datetime:
+        if self.schedule is not None:
+            return self.schedule.next_after(moment)
+        return moment + timedelta(seconds=self.interval)
+
+class PeriodicScheduler:
+    """只在主节点上运行的周期任务调度器"""
+
+    def __init__(self, elector: LeaderElector, tick: float = 1):
+        self.elector = elector
+        self.tick = tick
+        self.jobs: Dict[str, PeriodicJob] = {}
+        self._was_leader = False
+        self._task: Optional[asyncio.Task] = None
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        cron: Optional[str] = None,
+        interval: Optional[float] = None
+    ) -> None:
+        """注册周期任务，cron 与 interval（秒）二选一"""
+        self.jobs[name] = PeriodicJob(name, func, cron=cron, interval=interval)
+
+    async def start(self) -> None:
+        """启动选举和调度循环"""
+        await self.elector.start()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止调度并等待运行中的任务结束"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        running = [job.task for job in self.jobs.values() if job.task is not None]
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+        await self.elector.stop()
+
+    def _last_run_key(self, name: str) -> str:
+        return f"scheduler:last_run:{name}"
+
+    async def _load_schedule(self) -> None:
+        # 新主节点从Redis恢复上次运行时间，避免故障切换后重复执行
+        now = datetime.utcnow()
+        for job in self.jobs.values():
+            last_run = await cache_service.redis_client.get(self._last_run_key(job.name))
+            if last_run:
+                job.next_run = job.next_after(datetime.fromisoformat(last_run))
+            else:
+                job.next_run = job.next_after(now) if job.schedule else now
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._tick()
+            except Exception as e:
+                logger.error(f"Scheduler tick failed: {str(e)}")
+            await asyncio.sleep(self.tick)
+
+    async def _tick(self) -> None:
+        self._cancel_stale()
+        if not self.elector.is_leader:
+            self._was_leader = False
+            return
+        if not self._was_leader:
+            await self._load_schedule()
+            self._was_leader = True
+
+        now = datetime.utcnow()
+        for job in self.jobs.values():
+            # 上一次执行尚未结束时跳过
+            if job.next_run > now or (job.task is not None and not job.task.done()):
+                continue
+            job.next_run = job.next_after(now)
+            await cache_service.redis_client.set(
+                self._last_run_key(job.name),
+                now.isoformat()
+            )
+            job.token = self.elector.fencing_token
+            job.task = asyncio.create_task(self._execute(job, job.token))
+
+    def _cancel_stale(self) -> None:
+        """取消在已失去的任期内启动的任务，避免与新主节点同时处理同一批数据"""
+        for job in self.jobs.values():
+            if job.task is None or job.task.done():
+                continue
+            if job.token != self.elector.fencing_token:
+                logger.warning(f"Cancelling job {job.name}: leadership lost")
+                job.task.cancel()
+
+    async def _execute(self, job: PeriodicJob, token: Optional[int]) -> None:
+        # 执行前确认租约仍然有效
+        if not await self.elector.validate(token):
+            logger.warning(f"Skipping job {job.name}: leadership lost")
+            return
+        try:
+            await job.func()
+            logger.info(f"Periodic job {job.name} completed")
+        except asyncio.CancelledError:
+            logger.warning(f"Periodic job {job.name} cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Periodic job {job.name} failed: {str(e)}")
+
+scheduler = PeriodicScheduler(leader_elector)
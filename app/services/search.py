@@ -0,0 +1,187 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+from dataclasses import dataclass
+import logging
+import re
+from sqlalchemy import column, func, inspect, literal_column, select, table, text
+from sqlalchemy.dialects.mysql import match as mysql_match
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+from app.services.query_optimizer import CountStrategy, QueryOptimizer
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+@dataclass(frozen=True)
+class SearchSpec:
+    """一张表的搜索配置；PostgreSQL 上 trigram 适合用户名/邮箱的子串匹配，tsvector 适合成段文本"""
+    table: str
+    fields: Tuple[str, ...]
+    pg_mode: str = "trigram"
+
+    @property
+    def fts_table(self) -> str:
+        return f"{self.table}_fts"
+
+    @property
+    def pg_document(self) -> str:
+        # 查询与表达式索引必须使用完全相同的表达式
+        parts = " || ' ' || ".join(
+            f"coalesce({self.table}.{field}, '')" for field in self.fields
+        )
+        if self.pg_mode == "tsvector":
+            return f"to_tsvector('simple', {parts})"
+        return f"({parts})"
+
+SEARCH_SPECS: Dict[str, SearchSpec] = {
+    "users": SearchSpec("users", ("username", "email")),
+    "products": SearchSpec("products", ("name", "description"), pg_mode="tsvector"),
+}
+
+def tokenize(term: str) -> List[str]:
+    return TOKEN_RE.findall(term.lower())
+
+def _install_sqlite(conn: Connection, spec: SearchSpec) -> None:
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": spec.fts_table}
+    ).first()
+    fields = ", ".join(spec.fields)
+    new_fields = ", ".join(f"new.{field}" for field in spec.fields)
+    old_fields = ", ".join(f"old.{field}" for field in spec.fields)
+    fts = spec.fts_table
+    # 外部内容表只存索引，触发器在每次写入 users/products 时同步更新
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{fields}, content='{spec.table}', content_rowid='id', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {spec.table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {fields}) VALUES (new.id, {new_fields}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {spec.table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {fields}) VALUES ('delete', old.id, {old_fields}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {fields} ON {spec.table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {fields}) VALUES ('delete', old.id, {old_fields}); "
+        f"INSERT INTO {fts}(rowid, {fields}) VALUES (new.id, {new_fields}); END",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+    if not exists:
+        # 首次创建时为已有数据建立索引
+        conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+def _install_postgresql(conn: Connection, spec: SearchSpec) -> None:
+    if spec.pg_mode == "tsvector":
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS idx_{spec.table}_search_tsv "
+            f"ON {spec.table} USING gin ({spec.pg_document})"
+        ))
+    else:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS idx_{spec.table}_search_trgm "
+            f"ON {spec.table} USING gin ({spec.pg_document} gin_trgm_ops)"
+        ))
+
+def _install_mysql(conn: Connection, spec: SearchSpec) -> None:
+    index_name = f"ft_{spec.table}_search"
+    exists = conn.execute(
+        text(
+            "SELECT 1 FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = :table AND index_name = :index"
+        ),
+        {"table": spec.table, "index": index_name}
+    ).first()
+    if not exists:
+        conn.execute(text(
+            f"ALTER TABLE {spec.table} ADD FULLTEXT INDEX {index_name} ({', '.join(spec.fields)})"
+        ))
+
+def install_search_indexes(conn: Connection) -> None:
+    """创建搜索索引（幂等），在建表之后调用；索引由数据库随写入自动维护
+
+    表尚未创建（全新数据库还未执行迁移）时跳过，由迁移 0003 负责创建
+    """
+    installers = {
+        "sqlite": _install_sqlite,
+        "postgresql": _install_postgresql,
+        "mysql": _install_mysql,
+        "mariadb": _install_mysql,
+    }
+    installer = installers.get(conn.dialect.name)
+    if installer is None:
+        logger.warning(f"No search index support for {conn.dialect.name}, falling back to LIKE")
+        return
+    tables = set(inspect(conn).get_table_names())
+    for spec in SEARCH_SPECS.values():
+        if spec.table not in tables:
+            logger.warning(f"Table {spec.table} does not exist yet, skipping search index")
+            continue
+        installer(conn, spec)
+
+class SearchService:
+    @staticmethod
+    def build_query(model: Type[Any], term: str, dialect_name: str) -> Optional[Select]:
+        """按相关度排序的搜索查询，没有可用词元时返回 None"""
+        spec = SEARCH_SPECS[model.__tablename__]
+        tokens = tokenize(term)
+        if not tokens:
+            return None
+
+        if dialect_name == "sqlite":
+            fts = table(spec.fts_table, column("rowid"), column("rank"), column(spec.fts_table))
+            match = " ".join(f'"{token}"*' for token in tokens)
+            return (
+                select(model)
+                .join(fts, fts.c.rowid == model.id)
+                .where(fts.c[spec.fts_table].op("MATCH")(match))
+                .order_by(fts.c.rank, model.id)
+            )
+
+        if dialect_name == "postgresql":
+            document = literal_column(spec.pg_document)
+            if spec.pg_mode == "tsvector":
+                tsquery = func.to_tsquery(
+                    "simple", " & ".join(f"{token}:*" for token in tokens)
+                )
+                return (
+                    select(model)
+                    .where(document.op("@@")(tsquery))
+                    .order_by(func.ts_rank(document, tsquery).desc(), model.id)
+                )
+            # 用户名/邮箱按原文做子串匹配，trigram GIN 索引同时支持 ILIKE
+            phrase = term.strip().lower()
+            pattern = phrase.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            return (
+                select(model)
+                .where(document.ilike(f"%{pattern}%", escape="\\"))
+                .order_by(func.similarity(document, phrase).desc(), model.id)
+            )
+
+        if dialect_name in ("mysql", "mariadb"):
+            score = mysql_match(
+                *[getattr(model, field) for field in spec.fields],
+                against=" ".join(f"+{token}*" for token in tokens)
+            ).in_boolean_mode()
+            return select(model).where(score > 0).order_by(score.desc(), model.id)
+
+        return QueryOptimizer.search_query(model, term, *spec.fields)
+
+    @staticmethod
+    async def search(
+        db: AsyncSession,
+        model: Type[Any],
+        term: str,
+        page: int = 1,
+        per_page: int = 20,
+        filters: Sequence[Any] = ()
+    ) -> Tuple[List[Any], bool]:
+        """返回一页按相关度排序的结果及是否还有下一页"""
+        query = SearchService.build_query(model, term, db.get_bind().dialect.name)
+        if query is None:
+            return [], False
+        if filters:
+            query = query.where(*filters)
+        results, _, has_more = await QueryOptimizer.with_count(
+            db, query, page, per_page, CountStrategy.NONE
+        )
+        return results, has_more
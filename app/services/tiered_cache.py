@@ -0,0 +1,291 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from collections import OrderedDict
+from datetime import date, datetime
+from enum import Enum
+from uuid import uuid4
+import asyncio
+import json
+import logging
+import time
+from prometheus_client import Counter
+from app.core.config import get_settings
+from app.services.cache_service import CacheService, cache_service
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+TIERED_CACHE_REQUESTS = Counter(
+    'tiered_cache_requests_total',
+    'Tiered cache lookups by tier and result',
+    ['tier', 'result']
+)
+
+Loader = Callable[[], Awaitable[Any]]
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+class TieredCache:
+    """进程内L1缓存 + Redis L2缓存，失效消息通过pub/sub广播到所有worker"""
+
+    def __init__(
+        self,
+        l2: CacheService,
+        maxsize: int = 1000,
+        ttl: int = 60,
+        stale_ttl: int = 30,
+        channel: str = "cache:invalidate"
+    ):
+        self.l2 = l2
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.channel = channel
+        self.node_id = uuid4().hex
+        # key -> (value, fresh_until, stale_until)
+        self.entries: "OrderedDict[str, tuple[Any, float, float]]" = OrderedDict()
+        self.listeners: List[Callable[[str], None]] = []
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # 加载期间被失效的键，加载结果不再写回
+        self._invalidated: Set[str] = set()
+        self._refreshing: Set[str] = set()
+        self._background: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def add_listener(self, callback: Callable[[str], None]) -> None:
+        """注册失效回调，参数为失效的键或前缀"""
+        self.listeners.append(callback)
+
+    async def start(self) -> None:
+        """订阅失效广播"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        """取消订阅"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Loader,
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None,
+        background: bool = True
+    ) -> Any:
+        """依次查询L1、L2，都未命中时调用loader；过期但仍在stale窗口内的值先返回，再后台刷新
+
+        loader 依赖请求作用域的资源（如数据库会话）时传 background=False，
+        请求结束后这些资源已关闭，过期值不在后台刷新而是按未命中同步加载。
+        """
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, fresh_until, stale_until = entry
+            if now < fresh_until:
+                self.entries.move_to_end(key)
+                TIERED_CACHE_REQUESTS.labels(tier="l1", result="hit").inc()
+                return value
+            if now < stale_until and background:
+                TIERED_CACHE_REQUESTS.labels(tier="l1", result="stale").inc()
+                self._revalidate(key, loader, ttl, stale_ttl)
+                return value
+            self.entries.pop(key, None)
+
+        try:
+            raw = await self.l2.get(key)
+        except Exception as e:
+            logger.error(f"L2 cache get failed for {key}: {str(e)}")
+            raw = None
+        if raw is not None:
+            data = json.loads(raw)
+            if now >= data["fresh_until"] and not background:
+                TIERED_CACHE_REQUESTS.labels(tier="l2", result="stale").inc()
+                return await self._load(key, loader, ttl, stale_ttl)
+            stale_until = data["fresh_until"] + (
+                self.stale_ttl if stale_ttl is None else stale_ttl
+            )
+            self._set_l1(key, data["value"], data["fresh_until"], stale_until)
+            if now < data["fresh_until"]:
+                TIERED_CACHE_REQUESTS.labels(tier="l2", result="hit").inc()
+            else:
+                TIERED_CACHE_REQUESTS.labels(tier="l2", result="stale").inc()
+                self._revalidate(key, loader, ttl, stale_ttl)
+            return data["value"]
+
+        TIERED_CACHE_REQUESTS.labels(tier="l2", result="miss").inc()
+        return await self._load(key, loader, ttl, stale_ttl)
+
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None
+    ) -> None:
+        """写入L1和L2"""
+        ttl = self.ttl if ttl is None else ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        fresh_until = time.time() + ttl
+        self._set_l1(key, value, fresh_until, fresh_until + stale_ttl)
+        try:
+            await self.l2.set(
+                key,
+                json.dumps(
+                    {"value": value, "fresh_until": fresh_until},
+                    default=_json_default
+                ),
+                ttl=ttl + stale_ttl
+            )
+        except Exception as e:
+            logger.error(f"L2 cache set failed for {key}: {str(e)}")
+
+    async def invalidate(self, key: str) -> None:
+        """删除键并通知所有worker"""
+        self._apply_invalidation(key, prefix=False)
+        try:
+            await self.l2.delete(key)
+        except Exception as e:
+            logger.error(f"L2 cache delete failed for {key}: {str(e)}")
+        await self._publish({"keys": [key]})
+
+    async def invalidate_prefix(self, prefix: str) -> None:
+        """删除指定前缀的所有键并通知所有worker"""
+        self._apply_invalidation(prefix, prefix=True)
+        try:
+            await self.l2.clear_prefix(prefix)
+        except Exception as e:
+            logger.error(f"L2 cache clear failed for {prefix}: {str(e)}")
+        await self._publish({"prefixes": [prefix]})
+
+    def _set_l1(self, key: str, value: Any, fresh_until: float, stale_until: float) -> None:
+        if key in self.entries:
+            self.entries.move_to_end(key)
+        elif len(self.entries) >= self.maxsize:
+            # 移除最久未使用的项
+            self.entries.popitem(last=False)
+        self.entries[key] = (value, fresh_until, stale_until)
+
+    async def _load(
+        self,
+        key: str,
+        loader: Loader,
+        ttl: Optional[int],
+        stale_ttl: Optional[int]
+    ) -> Any:
+        # 相同键的并发未命中只执行一次loader
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+            if key in self._invalidated:
+                # 加载期间收到失效，结果可能基于旧数据，只返回给等待者而不写回缓存
+                logger.debug(f"Skipped caching {key}, invalidated while loading")
+            else:
+                await self.set(key, value, ttl, stale_ttl)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            self._invalidated.discard(key)
+
+    def _revalidate(
+        self,
+        key: str,
+        loader: Loader,
+        ttl: Optional[int],
+        stale_ttl: Optional[int]
+    ) -> None:
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        async def refresh():
+            try:
+                await self._load(key, loader, ttl, stale_ttl)
+            except Exception as e:
+                logger.error(f"Background refresh failed for {key}: {str(e)}")
+            finally:
+                self._refreshing.discard(key)
+
+        task = asyncio.create_task(refresh())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _apply_invalidation(self, name: str, prefix: bool) -> None:
+        if prefix:
+            # 与 CacheService.clear_prefix 一致，前缀按 "prefix:" 匹配
+            for key in [key for key in self.entries if key.startswith(f"{name}:")]:
+                del self.entries[key]
+            self._invalidated.update(
+                key for key in self._inflight if key.startswith(f"{name}:")
+            )
+        else:
+            self.entries.pop(name, None)
+            if name in self._inflight:
+                self._invalidated.add(name)
+        for callback in self.listeners:
+            try:
+                callback(name)
+            except Exception as e:
+                logger.error(f"Cache invalidation listener failed: {str(e)}")
+
+    async def _publish(self, message: dict) -> None:
+        message["origin"] = self.node_id
+        try:
+            await self.l2.redis_client.publish(self.channel, json.dumps(message))
+        except Exception as e:
+            logger.error(f"Failed to broadcast cache invalidation: {str(e)}")
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.l2.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    data = json.loads(message["data"])
+                    if data.get("origin") == self.node_id:
+                        continue
+                    for key in data.get("keys", []):
+                        self._apply_invalidation(key, prefix=False)
+                    for prefix in data.get("prefixes", []):
+                        self._apply_invalidation(prefix, prefix=True)
+            except asyncio.CancelledError:
+                await pubsub.close()
+                raise
+            except Exception as e:
+                # 订阅断开期间可能错过失效消息，清空L1以保证一致性
+                logger.error(f"Cache invalidation subscription failed: {str(e)}")
+                self.entries.clear()
+                await pubsub.close()
+                await asyncio.sleep(1)
+
+tiered_cache = TieredCache(
+    cache_service,
+    maxsize=settings.TIERED_CACHE_L1_SIZE,
+    ttl=settings.TIERED_CACHE_TTL,
+    stale_ttl=settings.TIERED_CACHE_STALE_TTL
+)
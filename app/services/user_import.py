@@ -0,0 +1,219 @@
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+from uuid import uuid4
+import asyncio
+import csv
+import json
+import logging
+import os
+from pydantic import BaseModel, EmailStr, ValidationError
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from app.core.config import get_settings
+from app.core.security import import_hasher, validate_password
+from app.db.base import primary_session
+from app.db.models import User, UserRole
+from app.services.background_tasks import task_manager
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Content-Type -> 导入格式
+IMPORT_FORMATS = {
+    "application/json": "json",
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+}
+
+# 结果中最多保留的错误行数，其余只计数
+MAX_REPORTED_ERRORS = 1000
+
+class ImportedUser(BaseModel):
+    username: str
+    email: EmailStr
+    password: str
+    role: UserRole = UserRole.CLIENT
+    whmcs_client_id: Optional[int] = None
+
+class ImportTooLarge(Exception):
+    pass
+
+class UserImporter:
+    """批量导入用户：按块校验、并行哈希、多行插入，冲突逐行报告"""
+
+    def __init__(self, import_dir: str, chunk_size: int = 500, max_bytes: int = 100 * 1024 * 1024):
+        self.import_dir = import_dir
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+
+    async def save_upload(self, stream: AsyncIterator[bytes], fmt: str) -> str:
+        """将请求体流式写入导入目录，返回文件路径"""
+        os.makedirs(self.import_dir, exist_ok=True)
+        path = os.path.join(self.import_dir, f"{uuid4().hex}.{fmt}")
+        size = 0
+        try:
+            with open(path, "wb") as f:
+                async for chunk in stream:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ImportTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+                    # 磁盘写入放到线程中，不阻塞事件循环
+                    await asyncio.to_thread(f.write, chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path
+
+    def _read_rows(self, path: str, fmt: str) -> Iterator[Tuple[int, Any]]:
+        """逐行产出 (行号, 原始记录)，CSV行号不含表头"""
+        if fmt == "json":
+            with open(path, "rb") as f:
+                records = json.load(f)
+            if not isinstance(records, list):
+                raise ValueError("JSON import must be an array of users")
+            yield from enumerate(records, 1)
+        elif fmt == "csv":
+            with open(path, newline="", encoding="utf-8") as f:
+                yield from enumerate(csv.DictReader(f), 1)
+        else:
+            with open(path, encoding="utf-8") as f:
+                for line_no, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        yield line_no, json.loads(line)
+                    except json.JSONDecodeError:
+                        yield line_no, None
+
+    def _chunks(self, path: str, fmt: str, skip: int) -> Iterator[List[Tuple[int, Any]]]:
+        chunk: List[Tuple[int, Any]] = []
+        for index, item in enumerate(self._read_rows(path, fmt)):
+            if index < skip:
+                continue
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    async def run(self, path: str, fmt: str) -> Dict[str, Any]:
+        """执行导入；任务重试时从上次提交的位置继续"""
+        progress = await task_manager.get_progress()
+        report = {
+            "processed": progress.get("processed", 0),
+            "created": progress.get("created", 0),
+            "failed": progress.get("failed", 0),
+            "errors": progress.get("errors", []),
+        }
+        seen: Set[str] = set()
+        for chunk in self._chunks(path, fmt, report["processed"]):
+            valid: List[Tuple[int, ImportedUser]] = []
+            for line, record in chunk:
+                error, user = self._validate(record, seen)
+                if error:
+                    self._record_error(report, line, error)
+                else:
+                    valid.append((line, user))
+
+            valid = await self._drop_existing(valid, report)
+            hashes = await import_hasher.hash_many([user.password for _, user in valid])
+            rows = [
+                (line, {
+                    "username": user.username,
+                    "email": user.email,
+                    "hashed_password": hashed,
+                    "role": user.role,
+                    "whmcs_client_id": user.whmcs_client_id,
+                })
+                for (line, user), hashed in zip(valid, hashes)
+            ]
+            report["created"] += await self._insert(rows, report)
+            report["processed"] += len(chunk)
+            await task_manager.report_progress(**report)
+
+        os.remove(path)
+        return report
+
+    def _validate(self, record: Any, seen: Set[str]) -> Tuple[Optional[str], Optional[ImportedUser]]:
+        if not isinstance(record, dict):
+            return "Malformed record", None
+        # CSV 中的空字段视为未填写
+        record = {key: value for key, value in record.items() if value not in ("", None)}
+        try:
+            user = ImportedUser(**record)
+        except ValidationError as e:
+            return "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                for error in e.errors()
+            ), None
+        if not validate_password(user.password):
+            return "Password does not meet security requirements", None
+        keys = (f"u:{user.username}", f"e:{user.email}")
+        if any(key in seen for key in keys):
+            return "Duplicate username or email in file", None
+        seen.update(keys)
+        return None, user
+
+    async def _drop_existing(
+        self,
+        valid: List[Tuple[int, ImportedUser]],
+        report: Dict[str, Any]
+    ) -> List[Tuple[int, ImportedUser]]:
+        """哈希前剔除库中已存在的用户，避免为注定失败的行计算bcrypt"""
+        if not valid:
+            return valid
+        usernames = [user.username for _, user in valid]
+        emails = [user.email for _, user in valid]
+        async with primary_session() as db:
+            existing = (await db.execute(
+                select(User.username, User.email).where(
+                    or_(User.username.in_(usernames), User.email.in_(emails))
+                )
+            )).all()
+        taken = {row.username for row in existing} | {row.email for row in existing}
+        kept = []
+        for line, user in valid:
+            if user.username in taken or user.email in taken:
+                self._record_error(report, line, "Username or email already exists")
+            else:
+                kept.append((line, user))
+        return kept
+
+    async def _insert(self, rows: List[Tuple[int, Dict[str, Any]]], report: Dict[str, Any]) -> int:
+        """整块多行插入；并发写入导致冲突时退回逐行插入以定位冲突行"""
+        if not rows:
+            return 0
+        async with primary_session() as db:
+            try:
+                await db.execute(insert(User), [values for _, values in rows])
+                await db.commit()
+                return len(rows)
+            except IntegrityError:
+                await db.rollback()
+
+            created = 0
+            for line, values in rows:
+                try:
+                    async with db.begin_nested():
+                        await db.execute(insert(User), [values])
+                    created += 1
+                except IntegrityError:
+                    self._record_error(report, line, "Username or email already exists")
+            await db.commit()
+            return created
+
+    @staticmethod
+    def _record_error(report: Dict[str, Any], line: int, error: str) -> None:
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line, "error": error})
+
+user_importer = UserImporter(
+    settings.USER_IMPORT_DIR,
+    chunk_size=settings.USER_IMPORT_CHUNK_SIZE,
+    max_bytes=settings.USER_IMPORT_MAX_BYTES
+)
+
+@task_manager.register("import_users")
+async def import_users_task(path: str, fmt: str) -> Dict[str, Any]:
+    return await user_importer.run(path, fmt)
@@ -1,15 +1,20 @@
-from typing import Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from app.db.models import User, UserRole
-from app.core.security import get_password_hash, verify_password
+from app.core.security import password_hasher
+from app.services.principal_cache import principal_key
+from app.services.query_optimizer import CountStrategy, QueryOptimizer
+from app.services.search import SearchService
+from app.services.tiered_cache import tiered_cache
 from fastapi import HTTPException
 
 class UserService:
     @staticmethod
     async def create_user(
-        db: Session,
+        db: AsyncSession,
         username: str,
         email: str,
         password: str,
@@ -17,7 +22,7 @@ class UserService:
         whmcs_client_id: Optional[int] = None
     ) -> User:
         try:
-            hashed_password = get_password_hash(password)
+            hashed_password = await password_hasher.hash(password)
             user = User(
                 username=username,
                 email=email,
@@ -26,11 +31,11 @@ class UserService:
                 whmcs_client_id=whmcs_client_id
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
             return user
         except IntegrityError:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=400,
                 detail="Username or email already exists"
@@ -38,72 +43,99 @@ class UserService:
 
     @staticmethod
     async def authenticate_user(
-        db: Session,
+        db: AsyncSession,
         username: str,
         password: str
     ) -> Optional[User]:
-        user = db.query(User).filter(User.username == username).first()
+        user = await UserService.get_user_by_username(db, username)
         if not user:
             return None
-        if not verify_password(password, user.hashed_password):
-            # 增加失败登录计数
-            user.failed_login_attempts += 1
-            db.commit()
+        if not await password_hasher.verify(password, user.hashed_password):
+            # 增加失败登录计数；在SQL中累加，不依赖可能来自副本的旧值
+            user.failed_login_attempts = User.failed_login_attempts + 1
+            await db.commit()
             return None
         
         # 登录成功，重置失败计数并更新最后登录时间
         user.failed_login_attempts = 0
         user.last_login = datetime.utcnow()
-        db.commit()
+        await db.commit()
         return user
 
     @staticmethod
-    async def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
-        return db.query(User).filter(User.id == user_id).first()
+    async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
+        return await db.scalar(select(User).where(User.id == user_id))
 
     @staticmethod
-    async def get_user_by_username(db: Session, username: str) -> Optional[User]:
-        return db.query(User).filter(User.username == username).first()
+    async def list_users(
+        db: AsyncSession,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        role: Optional[UserRole] = None,
+        count_strategy: CountStrategy = CountStrategy.NONE
+    ) -> Tuple[List[User], Optional[str], Optional[int]]:
+        query = select(User)
+        if role is not None:
+            query = query.where(User.role == role)
+        users, next_cursor = await QueryOptimizer.fetch_page(db, query, User, cursor, limit)
+        total = await QueryOptimizer.count(db, query, count_strategy)
+        return users, next_cursor, total
+
+    @staticmethod
+    async def search_users(
+        db: AsyncSession,
+        term: str,
+        page: int = 1,
+        per_page: int = 20
+    ) -> Tuple[List[User], bool]:
+        return await SearchService.search(db, User, term, page, per_page)
+
+    @staticmethod
+    async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
+        return await db.scalar(select(User).where(User.username == username))
 
     @staticmethod
     async def update_user(
-        db: Session,
+        db: AsyncSession,
         user_id: int,
         **kwargs
     ) -> Optional[User]:
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await UserService.get_user_by_id(db, user_id)
         if not user:
             return None
         
         for key, value in kwargs.items():
-            if hasattr(user, key):
-                if key == "password":
-                    value = get_password_hash(value)
+            if key == "password":
+                if value is not None:
+                    user.hashed_password = await password_hasher.hash(value)
+            elif hasattr(user, key):
                 setattr(user, key, value)
         
         try:
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
+            await tiered_cache.invalidate(principal_key(user_id))
             return user
         except IntegrityError:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=400,
                 detail="Update failed due to constraint violation"
             )
 
     @staticmethod
-    async def delete_user(db: Session, user_id: int) -> bool:
-        user = db.query(User).filter(User.id == user_id).first()
+    async def delete_user(db: AsyncSession, user_id: int) -> bool:
+        user = await UserService.get_user_by_id(db, user_id)
         if not user:
             return False
         
         try:
-            db.delete(user)
-            db.commit()
+            await db.delete(user)
+            await db.commit()
+            await tiered_cache.invalidate(principal_key(user_id))
             return True
         except IntegrityError:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=400,
                 detail="Cannot delete user due to existing dependencies"
@@ -0,0 +1,4 @@
+from whmcs import WHMCSClient
+
+# 每个worker共用一个WHMCS客户端，复用其连接池
+whmcs_client = WHMCSClient()
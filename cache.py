@@ -1,70 +1,201 @@
 from functools import wraps
-from typing import Any, Callable
+from typing import Any, Callable, Dict, Optional, Sequence
+import asyncio
+import inspect
+import json
 import time
 from collections import OrderedDict
+from prometheus_client import Counter
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.exc import NoInspectionAvailable
 from logger import setup_logger
 
 logger = setup_logger("cache")
 
+CACHE_REQUESTS = Counter(
+    'cache_requests_total',
+    'Cache lookups by namespace and result',
+    ['namespace', 'result']
+)
+
+# 缓存未命中标记，允许缓存 None 结果
+MISSING = object()
+
 class LRUCache:
     def __init__(self, maxsize: int = 100, ttl: int = 300):
         self.maxsize = maxsize
         self.ttl = ttl
         self.cache = OrderedDict()
-        self.timestamps = {}
+        self.expires = {}
+        # 每个键的命中统计，单独按LRU限制大小，键被淘汰后仍保留一段时间
+        self.stats: OrderedDict = OrderedDict()
+        self.stats_maxsize = maxsize * 4
 
-    def get(self, key: str) -> Any:
+    def get(self, key: str, default: Any = None) -> Any:
         """获取缓存值"""
         if key in self.cache:
             # 检查是否过期
-            if time.time() - self.timestamps[key] > self.ttl:
-                self.cache.pop(key)
-                self.timestamps.pop(key)
-                return None
+            if time.time() >= self.expires[key]:
+                self.delete(key)
+                self._record(key, "misses")
+                return default
             # 更新访问顺序
             self.cache.move_to_end(key)
+            self._record(key, "hits")
             return self.cache[key]
-        return None
+        self._record(key, "misses")
+        return default
 
-    def set(self, key: str, value: Any) -> None:
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
         """设置缓存值"""
         if key in self.cache:
             self.cache.move_to_end(key)
         else:
             if len(self.cache) >= self.maxsize:
                 # 移除最久未使用的项
-                oldest = next(iter(self.cache))
-                self.cache.pop(oldest)
-                self.timestamps.pop(oldest)
+                self.delete(next(iter(self.cache)))
         self.cache[key] = value
-        self.timestamps[key] = time.time()
+        self.expires[key] = time.time() + (ttl or self.ttl)
+
+    def delete(self, key: str) -> None:
+        """删除缓存值"""
+        self.cache.pop(key, None)
+        self.expires.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> int:
+        """删除指定前缀的所有缓存"""
+        keys = [key for key in self.cache if key.startswith(prefix)]
+        for key in keys:
+            self.delete(key)
+        return len(keys)
 
     def clear(self) -> None:
         """清除所有缓存"""
         self.cache.clear()
-        self.timestamps.clear()
+        self.expires.clear()
+        self.stats.clear()
+
+    def _record(self, key: str, result: str) -> None:
+        key_stats = self.stats.get(key)
+        if key_stats is None:
+            if len(self.stats) >= self.stats_maxsize:
+                self.stats.popitem(last=False)
+            key_stats = self.stats[key] = {"hits": 0, "misses": 0}
+        else:
+            self.stats.move_to_end(key)
+        key_stats[result] += 1
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """获取每个键的命中统计"""
+        return {key: dict(value) for key, value in self.stats.items()}
 
 # 创建全局缓存实例
 cache = LRUCache()
 
-def cached(ttl: int = 300):
-    """缓存装饰器"""
+# 正在计算中的缓存键，用于合并并发的未命中请求
+_inflight: Dict[str, asyncio.Future] = {}
+
+def to_dto(value: Any) -> Any:
+    """将ORM对象转换为只包含列值的字典，列表逐项转换"""
+    if isinstance(value, (list, tuple)):
+        return [to_dto(item) for item in value]
+    try:
+        mapper = sa_inspect(value).mapper
+    except NoInspectionAvailable:
+        return value
+    return {
+        attr.key: getattr(value, attr.key)
+        for attr in mapper.column_attrs
+    }
+
+def make_key(namespace: str, params: Dict[str, Any]) -> str:
+    """根据命名空间和参数生成缓存键"""
+    if not params:
+        return f"{namespace}:"
+    return f"{namespace}:{json.dumps(params, sort_keys=True, default=str)}"
+
+def invalidate(namespace: str, **params: Any) -> int:
+    """使缓存失效；不传参数时清除整个命名空间"""
+    if params:
+        key = make_key(namespace, params)
+        existed = key in cache.cache
+        cache.delete(key)
+        return int(existed)
+    return cache.delete_prefix(f"{namespace}:")
+
+def cached(
+    ttl: int = 300,
+    key_params: Sequence[str] = (),
+    namespace: Optional[str] = None,
+    serializer: Callable[[Any], Any] = to_dto,
+    backend: Any = None
+):
+    """缓存装饰器
+
+    缓存键只由 key_params 中声明的参数组成，数据库会话等依赖注入参数不参与；
+    结果经 serializer 转换为DTO后缓存，并发的相同未命中请求只执行一次。
+    指定 backend（如两级缓存 TieredCache）时由其负责存储，此时 invalidate 返回协程；
+    调用时传入了键以外的参数时，过期值不在后台刷新，避免请求结束后继续使用其会话。
+    """
     def decorator(func: Callable):
+        signature = inspect.signature(func)
+        cache_namespace = namespace or func.__name__
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
             # 生成缓存键
-            cache_key = f"{func.__name__}:{str(args)}:{str(kwargs)}"
+            bound = signature.bind_partial(*args, **kwargs)
+            request_scoped = any(name not in key_params for name in bound.arguments)
+            bound.apply_defaults()
+            params = {name: bound.arguments.get(name) for name in key_params}
+            cache_key = make_key(cache_namespace, params)
             
+            if backend is not None:
+                async def load():
+                    return serializer(await func(*args, **kwargs))
+                return await backend.get_or_load(
+                    cache_key, load, ttl, background=not request_scoped
+                )
+
             # 尝试从缓存获取
-            cached_value = cache.get(cache_key)
-            if cached_value is not None:
+            cached_value = cache.get(cache_key, MISSING)
+            if cached_value is not MISSING:
+                CACHE_REQUESTS.labels(namespace=cache_namespace, result="hit").inc()
                 logger.debug(f"Cache hit for {cache_key}")
                 return cached_value
-            
-            # 执行函数并缓存结果
-            result = await func(*args, **kwargs)
-            cache.set(cache_key, result)
-            logger.debug(f"Cache miss for {cache_key}, cached new result")
-            return result
+            CACHE_REQUESTS.labels(namespace=cache_namespace, result="miss").inc()
+
+            # 已有相同键在计算中，等待其结果
+            inflight = _inflight.get(cache_key)
+            if inflight is not None:
+                return await asyncio.shield(inflight)
+
+            future = asyncio.get_running_loop().create_future()
+            _inflight[cache_key] = future
+            try:
+                # 执行函数并缓存结果
+                result = serializer(await func(*args, **kwargs))
+                cache.set(cache_key, result, ttl)
+                future.set_result(result)
+                logger.debug(f"Cache miss for {cache_key}, cached new result")
+                return result
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                # 标记异常已被获取，避免无人等待时输出警告
+                future.exception()
+                raise
+            finally:
+                _inflight.pop(cache_key, None)
+
+        if backend is not None:
+            wrapper.invalidate = lambda **params: (
+                backend.invalidate(make_key(cache_namespace, params)) if params
+                else backend.invalidate_prefix(cache_namespace)
+            )
+        else:
+            wrapper.invalidate = lambda **params: invalidate(cache_namespace, **params)
         return wrapper
     return decorator
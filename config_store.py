@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+from logger import setup_logger
+
+logger = setup_logger("config_store")
+
+# 建立索引的配置字段
+INDEXED_FIELDS = ("owner", "type")
+
+class ConfigStore:
+    """FRP配置的内存索引，按文件mtime/size增量重载"""
+
+    def __init__(self, config_dir: str, refresh_interval: float = 2):
+        self.config_dir = config_dir
+        self.refresh_interval = refresh_interval
+        self.configs: Dict[str, dict] = {}
+        self.file_stats: Dict[str, Tuple[int, int]] = {}
+        self.indexes: Dict[str, Dict[str, Set[str]]] = {
+            field: {} for field in INDEXED_FIELDS
+        }
+        self._lock = threading.Lock()
+        # 扫描期间 create() 写入的配置名，扫描结果不能覆盖或删除它们
+        self._created_during_scan: Optional[Set[str]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """加载配置目录并启动变更轮询"""
+        await asyncio.to_thread(self.refresh)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止变更轮询"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.error(f"Error refreshing configs: {str(e)}")
+
+    def refresh(self) -> None:
+        """重新扫描目录，只重新解析有变化的文件"""
+        if not os.path.isdir(self.config_dir):
+            return
+
+        # 扫描和解析不持锁，避免阻塞读取；扫描期间新建的配置在合并时保留
+        with self._lock:
+            self._created_during_scan = set()
+        seen = set()
+        changed = {}
+        with os.scandir(self.config_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.json') or not entry.is_file():
+                    continue
+                name = entry.name[:-len('.json')]
+                seen.add(name)
+                stat = entry.stat()
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if self.file_stats.get(name) == signature:
+                    continue
+                try:
+                    with open(entry.path, 'r') as f:
+                        changed[name] = (signature, json.load(f))
+                except (OSError, ValueError) as e:
+                    logger.error(f"Failed to load config {entry.name}: {str(e)}")
+
+        with self._lock:
+            created = self._created_during_scan
+            self._created_during_scan = None
+            for name in set(self.configs) - seen - created:
+                self._remove(name)
+            for name, (signature, config) in changed.items():
+                if name in created:
+                    continue
+                self._put(name, config)
+                self.file_stats[name] = signature
+
+        if changed:
+            logger.info(f"Reloaded {len(changed)} config(s) from {self.config_dir}")
+
+    def get(self, name: str) -> Optional[dict]:
+        """按名称获取配置"""
+        return self.configs.get(name)
+
+    def list(self, **filters: Any) -> List[dict]:
+        """列出配置，可按索引字段过滤"""
+        with self._lock:
+            names: Optional[Set[str]] = None
+            for field, value in filters.items():
+                if value is None:
+                    continue
+                matched = self.indexes[field].get(str(value), set())
+                names = matched if names is None else names & matched
+            if names is None:
+                return list(self.configs.values())
+            return [self.configs[name] for name in names]
+
+    def create(self, config: dict) -> dict:
+        """写入新配置并更新索引"""
+        name = config['name']
+        config_path = os.path.join(self.config_dir, f"{name}.json")
+        os.makedirs(self.config_dir, exist_ok=True)
+        with self._lock:
+            if name in self.configs or os.path.exists(config_path):
+                raise FileExistsError(name)
+            with open(config_path, 'w') as f:
+                json.dump(config, f, indent=4)
+            stat = os.stat(config_path)
+            self.file_stats[name] = (stat.st_mtime_ns, stat.st_size)
+            self._put(name, config)
+            if self._created_during_scan is not None:
+                self._created_during_scan.add(name)
+        return config
+
+    def _put(self, name: str, config: dict) -> None:
+        if name in self.configs:
+            self._remove(name)
+        self.configs[name] = config
+        for field in INDEXED_FIELDS:
+            if config.get(field) is not None:
+                self.indexes[field].setdefault(str(config[field]), set()).add(name)
+
+    def _remove(self, name: str) -> None:
+        config = self.configs.pop(name)
+        self.file_stats.pop(name, None)
+        for field in INDEXED_FIELDS:
+            value = config.get(field)
+            if value is None:
+                continue
+            names = self.indexes[field].get(str(value))
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self.indexes[field][str(value)]
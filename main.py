@@ -1,27 +1,44 @@
-from fastapi import FastAPI, HTTPException, Depends, Security, Request
+from fastapi import FastAPI, HTTPException, Depends, Security, Request, Query, Header
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 import os
-import json
 import time
+import asyncio
+import uuid
 import sentry_sdk
 import aioredis
-from prometheus_client import make_asgi_app, Counter, Histogram
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
+from prometheus_client import make_asgi_app, Counter, Gauge, Histogram
+from starlette.routing import Match
 
-from models import Base, User, Product, Order, UserRole
-from database import engine, get_db
-from whmcs import WHMCSClient
+from models import Base, User, Product, Order, OrderOutbox, UserRole
+from schemas import (
+    Token, UserResponse, ProductResponse, ProductSearchPage, OrderResponse, OrderPage,
+    ORDER_PAGE_ADAPTER, PRODUCT_SEARCH_PAGE_ADAPTER
+)
+from database import engine, get_async_db, replica_set
+from whmcs import WHMCSClient, WHMCSError
+from outbox import OrderOutboxWorker
 from logger import setup_logger
 from monitoring import SystemMonitor
-from cache import cached
+from cache import cached, cache
 from system_check import SystemChecker
+from config_store import ConfigStore
+from app.core.hashing import HashingExecutor
+from app.services.principal_cache import principal_cache
+from app.services.read_your_writes import read_your_writes
+from app.services.query_optimizer import CountStrategy, QueryOptimizer
+from app.services.search import SearchService, install_search_indexes
+from app.services.dataloader import DataLoader
+from app.api.responses import render
+from app.services.rate_limiter import create_rate_limit_engine
+from app.services.tiered_cache import tiered_cache
 
 # 创建日志记录器
 logger = setup_logger("main")
@@ -44,7 +61,8 @@ if SENTRY_DSN:
 app = FastAPI(
     title="FRP Manager API",
     description="FRP Manager API with WHMCS Integration",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # 配置 CORS
@@ -65,19 +83,55 @@ redis = aioredis.from_url(
     decode_responses=True
 )
 
-# 配置 Rate Limiting
+# 配置 Rate Limiting，所有时间窗口在一次Redis调用内完成检查
+rate_limiter = create_rate_limit_engine(redis)
+
 @app.on_event("startup")
 async def startup():
-    await FastAPILimiter.init(redis)
-
-# 定义速率限制装饰器
-rate_limit_minute = RateLimiter(times=60, seconds=60)  # 每分钟60次
-rate_limit_hour = RateLimiter(times=1000, seconds=3600)  # 每小时1000次
+    # 定期回写本地限速令牌的计数
+    await rate_limiter.start()
+    # 启动系统指标后台采样
+    await system_monitor.start()
+    # 加载FRP配置索引
+    await config_store.start()
+    # 订阅缓存失效广播
+    await tiered_cache.start()
+    # 只读副本健康检查
+    if replica_set is not None:
+        await replica_set.start()
+    if ORDER_OUTBOX_ENABLED:
+        await order_outbox.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await rate_limiter.stop()
+    await order_outbox.stop()
+    if replica_set is not None:
+        await replica_set.stop()
+    await system_monitor.stop()
+    await config_store.stop()
+    await tiered_cache.stop()
+    await whmcs_client.close()
+    password_hasher.shutdown()
 
 # 创建数据库表
 Base.metadata.create_all(bind=engine)
+with engine.begin() as conn:
+    install_search_indexes(conn)
 
 # Prometheus metrics
+# 延迟直方图的桶边界（秒），可通过环境变量覆盖
+LATENCY_BUCKETS = [
+    float(bucket) for bucket in os.getenv(
+        "METRICS_LATENCY_BUCKETS",
+        "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10"
+    ).split(",")
+]
+RESPONSE_SIZE_BUCKETS = [100 * 4 ** i for i in range(9)]  # 100B ~ 6.5MB
+
+# 未匹配任何路由的请求统一归入该标签，避免标签基数无限增长
+UNMATCHED_ROUTE = "__unmatched__"
+
 REQUEST_COUNT = Counter(
     'http_requests_total',
     'Total HTTP requests',
@@ -86,39 +140,78 @@ REQUEST_COUNT = Counter(
 REQUEST_LATENCY = Histogram(
     'http_request_duration_seconds',
     'HTTP request latency',
-    ['method', 'endpoint']
+    ['method', 'endpoint'],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_IN_PROGRESS = Gauge(
+    'http_requests_in_progress',
+    'HTTP requests currently being processed',
+    ['method']
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes',
+    'HTTP response size',
+    ['method', 'endpoint'],
+    buckets=RESPONSE_SIZE_BUCKETS
 )
 
-# 添加Prometheus metrics endpoint
-metrics_app = make_asgi_app()
-app.mount("/metrics", metrics_app)
+def get_route_template(request: Request) -> str:
+    """获取请求匹配的路由模板，如 /orders/{order_id}"""
+    route = request.scope.get("route")
+    if route is not None:
+        return route.path
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return UNMATCHED_ROUTE
 
 # 中间件用于记录请求
 @app.middleware("http")
 async def add_metrics(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    duration = time.time() - start_time
+    REQUEST_IN_PROGRESS.labels(method=request.method).inc()
+    start_time = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        REQUEST_IN_PROGRESS.labels(method=request.method).dec()
+    duration = time.perf_counter() - start_time
+    endpoint = get_route_template(request)
     
     REQUEST_COUNT.labels(
         method=request.method,
-        endpoint=request.url.path,
+        endpoint=endpoint,
         status=response.status_code
     ).inc()
     
     REQUEST_LATENCY.labels(
         method=request.method,
-        endpoint=request.url.path
+        endpoint=endpoint
     ).observe(duration)
     
+    content_length = response.headers.get("content-length")
+    if content_length is not None:
+        RESPONSE_SIZE.labels(
+            method=request.method,
+            endpoint=endpoint
+        ).observe(int(content_length))
+    
     return response
 
 # 为所有路由添加速率限制
 @app.middleware("http")
 async def add_rate_limit(request: Request, call_next):
-    if not request.url.path.startswith("/metrics") and not request.url.path.startswith("/health"):
-        await rate_limit_minute(request)
-        await rate_limit_hour(request)
+    path = request.url.path
+    if not path.startswith("/metrics") and not path.startswith("/health"):
+        forwarded = request.headers.get("X-Forwarded-For")
+        identifier = forwarded.split(",")[0].strip() if forwarded else request.client.host
+        allowed, retry_after = await rate_limiter.hit(identifier, path)
+        if not allowed:
+            return JSONResponse(
+                status_code=429,
+                content={"detail": "Too Many Requests"},
+                headers={"Retry-After": str(retry_after)}
+            )
     return await call_next(request)
 
 # 安全配置
@@ -126,21 +219,50 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 密码哈希进程池，bcrypt不在事件循环中执行
+password_hasher = HashingExecutor(
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", "0")) or None,
+    max_concurrency=int(os.getenv("PASSWORD_HASH_MAX_CONCURRENCY", "0")) or None
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # WHMCS客户端
 whmcs_client = WHMCSClient()
 
-# 系统监控
-system_monitor = SystemMonitor()
+# 订单发件箱模式：下单只写本地数据库，由后台worker异步投递到WHMCS
+ORDER_OUTBOX_ENABLED = os.getenv("ORDER_OUTBOX_ENABLED", "false").lower() == "true"
+order_outbox = OrderOutboxWorker(
+    whmcs_client,
+    concurrency=int(os.getenv("ORDER_OUTBOX_CONCURRENCY", "5"))
+)
+
+# 系统监控，由后台任务定期采样
+system_monitor = SystemMonitor(
+    interval=float(os.getenv("SYSTEM_METRICS_INTERVAL", "5")),
+    history_size=int(os.getenv("SYSTEM_METRICS_HISTORY", "120"))
+)
+
+# FRP配置存储
+CONFIG_CACHE_KEY = "configs"
+CONFIG_DIR = os.getenv("CONFIG_DIR", "configs")
+config_store = ConfigStore(
+    CONFIG_DIR,
+    refresh_interval=float(os.getenv("CONFIG_REFRESH_INTERVAL", "2"))
+)
+
+def refresh_configs_on_invalidate(name: str) -> None:
+    """其他worker写入配置后立即重新扫描，无需等待下一次轮询"""
+    if name == CONFIG_CACHE_KEY:
+        asyncio.create_task(asyncio.to_thread(config_store.refresh))
+
+tiered_cache.add_listener(refresh_configs_on_invalidate)
 
 # 辅助函数
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await password_hasher.hash(password)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -149,7 +271,15 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_loader(db: AsyncSession = Depends(get_async_db)) -> DataLoader:
+    return DataLoader(db)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    cached_user = principal_cache.get(token)
+    if cached_user is not None:
+        await read_your_writes.apply(db, cached_user.id)
+        return cached_user
+
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
@@ -162,9 +292,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.username == username).first()
+    user = await db.scalar(select(User).where(User.username == username))
     if user is None:
         raise credentials_exception
+    principal_cache.set(token, user, payload.get("exp"))
+    await read_your_writes.apply(db, user.id)
     return user
 
 # API路由
@@ -172,8 +304,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
 async def health_check():
     """健康检查端点"""
     health_info = system_monitor.check_health()
-    system_info = SystemChecker.get_system_info()
-    warnings, errors = SystemChecker.check_requirements()
+    system_info = system_monitor.get_system_info()
+    warnings, errors = system_monitor.check_requirements()
     
     return {
         "health_status": health_info,
@@ -185,12 +317,13 @@ async def health_check():
 @app.get("/system/status")
 async def system_status():
     """系统状态端点"""
+    warnings, errors = system_monitor.check_requirements()
     return {
-        "system_info": SystemChecker.get_system_info(),
+        "system_info": system_monitor.get_system_info(),
         "system_metrics": system_monitor.get_system_metrics(),
         "requirements_check": {
-            "warnings": SystemChecker.check_requirements()[0],
-            "errors": SystemChecker.check_requirements()[1]
+            "warnings": warnings,
+            "errors": errors
         }
     }
 
@@ -199,11 +332,23 @@ async def system_metrics():
     """系统指标端点"""
     return system_monitor.get_system_metrics()
 
-@app.post("/token")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+@app.get("/metrics/system/history")
+async def system_metrics_history():
+    """系统指标历史端点"""
+    return system_monitor.get_history()
+
+@app.get("/metrics/cache")
+async def cache_metrics(current_user: User = Security(get_current_user, scopes=["admin"])):
+    """缓存命中统计端点"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return cache.get_stats()
+
+@app.post("/token", response_model=Token)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     try:
-        user = db.query(User).filter(User.username == form_data.username).first()
-        if not user or not verify_password(form_data.password, user.hashed_password):
+        user = await db.scalar(select(User).where(User.username == form_data.username))
+        if not user or not await verify_password(form_data.password, user.hashed_password):
             raise HTTPException(
                 status_code=401,
                 detail="Incorrect username or password",
@@ -216,13 +361,13 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
         logger.error(f"Login failed for user {form_data.username}: {str(e)}")
         raise
 
-@app.post("/users/")
+@app.post("/users/", response_model=UserResponse)
 async def create_user(
     username: str,
     password: str,
     email: str,
     role: UserRole,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Security(get_current_user, scopes=["admin"])
 ):
     if current_user.role != UserRole.ADMIN:
@@ -231,39 +376,65 @@ async def create_user(
     db_user = User(
         username=username,
         email=email,
-        hashed_password=get_password_hash(password),
+        hashed_password=await get_password_hash(password),
         role=role
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-@app.get("/products/")
-@cached(ttl=300)  # 缓存5分钟
-async def list_products(db: Session = Depends(get_db)):
+@app.get("/products/", response_model=List[ProductResponse])
+@cached(ttl=300, namespace="products", backend=tiered_cache)  # 缓存5分钟
+async def list_products(db: AsyncSession = Depends(get_async_db)):
     try:
-        products = db.query(Product).filter(Product.is_active == True).all()
+        products = (await db.scalars(select(Product).where(Product.is_active == True))).all()
         return products
     except Exception as e:
         logger.error(f"Error listing products: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-@app.post("/orders/")
+@app.get("/products/search", response_model=ProductSearchPage)
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=100),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    products, has_more = await SearchService.search(
+        db, Product, q, page, per_page, filters=[Product.is_active == True]
+    )
+    return render(
+        PRODUCT_SEARCH_PAGE_ADAPTER,
+        {"items": products, "page": page, "has_more": has_more}
+    )
+
+@app.post("/orders/", response_model=OrderResponse)
 async def create_order(
     product_id: int,
-    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    if ORDER_OUTBOX_ENABLED:
+        return await enqueue_order(db, current_user, product, idempotency_key)
+    
+    # 结束只读事务，等待WHMCS响应期间不占用数据库连接
+    await db.commit()
+    
     # 创建WHMCS订单
-    whmcs_response = await whmcs_client.create_order(
-        client_id=current_user.whmcs_client_id,
-        product_id=product.whmcs_product_id
-    )
+    try:
+        whmcs_response = await whmcs_client.create_order(
+            client_id=current_user.whmcs_client_id,
+            product_id=product.whmcs_product_id
+        )
+    except WHMCSError as e:
+        logger.error(f"WHMCS order creation failed: {str(e)}")
+        raise HTTPException(status_code=503, detail="WHMCS service unavailable")
     
     if whmcs_response.get("result") != "success":
         raise HTTPException(status_code=400, detail="Failed to create WHMCS order")
@@ -272,31 +443,110 @@ async def create_order(
         user_id=current_user.id,
         product_id=product_id,
         whmcs_order_id=whmcs_response.get("orderid"),
+        whmcs_service_id=WHMCSClient.parse_service_id(whmcs_response),
         amount=product.price,
         status="pending"
     )
     
     db.add(order)
-    db.commit()
-    db.refresh(order)
+    await db.commit()
+    await db.refresh(order)
     return order
 
-@app.get("/orders/")
+def accepted_order_response(order: Order) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content={
+            "id": order.id,
+            "status": order.status,
+            "whmcs_order_id": order.whmcs_order_id,
+            "idempotency_key": order.idempotency_key
+        }
+    )
+
+async def enqueue_order(
+    db: AsyncSession,
+    current_user: User,
+    product: Product,
+    idempotency_key: Optional[str]
+) -> JSONResponse:
+    """在同一事务内写入待处理订单和发件箱记录，返回202"""
+    if idempotency_key:
+        existing = await db.scalar(
+            select(Order).where(Order.idempotency_key == idempotency_key)
+        )
+        if existing is not None:
+            if existing.user_id != current_user.id:
+                raise HTTPException(status_code=409, detail="Idempotency key already used")
+            return accepted_order_response(existing)
+    else:
+        idempotency_key = uuid.uuid4().hex
+    
+    order = Order(
+        user_id=current_user.id,
+        product_id=product.id,
+        amount=product.price,
+        status="pending",
+        idempotency_key=idempotency_key
+    )
+    db.add(order)
+    try:
+        await db.flush()
+        db.add(OrderOutbox(
+            order_id=order.id,
+            idempotency_key=idempotency_key,
+            whmcs_client_id=current_user.whmcs_client_id,
+            whmcs_product_id=product.whmcs_product_id
+        ))
+        await db.commit()
+    except IntegrityError:
+        # 相同幂等键的并发请求，返回先写入的订单
+        await db.rollback()
+        existing = await db.scalar(
+            select(Order).where(Order.idempotency_key == idempotency_key)
+        )
+        if existing is None or existing.user_id != current_user.id:
+            raise HTTPException(status_code=409, detail="Idempotency key already used")
+        return accepted_order_response(existing)
+    
+    order_outbox.notify()
+    return accepted_order_response(order)
+
+@app.get("/orders/", response_model=OrderPage)
 async def list_orders(
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db),
+    loader: DataLoader = Depends(get_loader),
     current_user: User = Depends(get_current_user)
 ):
-    if current_user.role == UserRole.ADMIN:
-        return db.query(Order).all()
-    return db.query(Order).filter(Order.user_id == current_user.id).all()
+    query = QueryOptimizer.bulk_query(Order)
+    # 管理员查看全表，用执行计划估算总数；普通用户的订单量小，缓存精确计数
+    count_strategy = CountStrategy.ESTIMATE
+    if current_user.role != UserRole.ADMIN:
+        query = query.where(Order.user_id == current_user.id)
+        count_strategy = CountStrategy.CACHED
+    try:
+        orders, next_cursor = await QueryOptimizer.fetch_page(
+            db, query, Order, cursor, limit
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # 整页订单的产品合并为一条 IN 查询
+    await loader.attach(orders, "product")
+    total = await QueryOptimizer.count(db, query, count_strategy)
+    return render(
+        ORDER_PAGE_ADAPTER,
+        {"items": orders, "next_cursor": next_cursor, "total": total}
+    )
 
-@app.get("/orders/{order_id}")
+@app.get("/orders/{order_id}", response_model=OrderResponse)
 async def get_order(
     order_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = await db.get(Order, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -305,50 +555,42 @@ async def get_order(
     
     return order
 
-@app.put("/orders/{order_id}/status")
+@app.put("/orders/{order_id}/status", response_model=OrderResponse)
 async def update_order_status(
     order_id: int,
     status: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Security(get_current_user, scopes=["admin"])
  ):
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = await db.get(Order, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
     order.status = status
-    db.commit()
+    await db.commit()
     return order
 
 # FRP配置相关路由
 @app.get("/configs")
-async def list_configs(current_user: User = Depends(get_current_user)):
-    configs = []
-    try:
-        for filename in os.listdir(CONFIG_DIR):
-            if filename.endswith('.json'):
-                with open(os.path.join(CONFIG_DIR, filename), 'r') as f:
-                    config = json.load(f)
-                    configs.append(config)
-        return configs
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def list_configs(
+    owner: Optional[str] = None,
+    config_type: Optional[str] = Query(None, alias="type"),
+    current_user: User = Depends(get_current_user)
+):
+    return config_store.list(owner=owner, type=config_type)
 
 @app.get("/configs/{name}")
 async def get_config(
     name: str,
     current_user: User = Depends(get_current_user)
 ):
-    try:
-        with open(os.path.join(CONFIG_DIR, f"{name}.json"), 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
+    config = config_store.get(name)
+    if config is None:
         raise HTTPException(status_code=404, detail="Config not found")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return config
 
 @app.post("/configs")
 async def create_config(
@@ -359,18 +601,19 @@ async def create_config(
         raise HTTPException(status_code=403, detail="Not authorized")
     
     try:
-        config_path = os.path.join(CONFIG_DIR, f"{config['name']}.json")
-        if os.path.exists(config_path):
-            raise HTTPException(status_code=400, detail="Config already exists")
-        
-        with open(config_path, 'w') as f:
-            json.dump(config, f, indent=4)
-        return config
-    except HTTPException:
-        raise
+        created = config_store.create(config)
+        await tiered_cache.invalidate(CONFIG_CACHE_KEY)
+        return created
+    except FileExistsError:
+        raise HTTPException(status_code=400, detail="Config already exists")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# 添加Prometheus metrics endpoint
+# 需在其他路由之后挂载，否则会覆盖 /metrics/system 等路由
+metrics_app = make_asgi_app()
+app.mount("/metrics", metrics_app)
+
 # 错误处理
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -0,0 +1,207 @@
+"""orders outbox, traffic metering and usage invoicing schema
+
+已部署的数据库由 create_all 建表，不会补齐后来增加的列和表；本迁移按现状补齐，
+全新数据库上则创建全部表。每一步都先检查是否已存在，可以在任何现有库上执行。
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _tables():
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def _columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _indexes(table):
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def _add_missing_columns(table, columns):
+    existing = _columns(table)
+    missing = [column for column in columns if column.name not in existing]
+    if missing:
+        with op.batch_alter_table(table) as batch:
+            for column in missing:
+                batch.add_column(column)
+
+
+def _create_missing_indexes(table, indexes):
+    existing = _indexes(table)
+    for name, columns, unique in indexes:
+        if name not in existing:
+            op.create_index(name, table, columns, unique=unique)
+
+
+def upgrade():
+    tables = _tables()
+
+    if 'users' not in tables:
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('username', sa.String()),
+            sa.Column('email', sa.String()),
+            sa.Column('hashed_password', sa.String()),
+            sa.Column('role', sa.Enum('ADMIN', 'RESELLER', 'CLIENT', name='userrole')),
+            sa.Column('whmcs_client_id', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime()),
+            sa.Column('is_active', sa.Boolean()),
+        )
+    _add_missing_columns('users', [
+        sa.Column('last_login', sa.DateTime(), nullable=True),
+        sa.Column('failed_login_attempts', sa.Integer(), nullable=True, server_default='0'),
+    ])
+    _create_missing_indexes('users', [
+        ('ix_users_id', ['id'], False),
+        ('ix_users_username', ['username'], True),
+        ('ix_users_email', ['email'], True),
+        ('idx_user_email_username', ['email', 'username'], False),
+        ('idx_user_role_active', ['role', 'is_active'], False),
+        ('idx_user_created_id', ['created_at', 'id'], False),
+        ('idx_user_whmcs_client', ['whmcs_client_id'], False),
+    ])
+
+    if 'products' not in tables:
+        op.create_table(
+            'products',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String()),
+            sa.Column('description', sa.String()),
+            sa.Column('price', sa.Float()),
+            sa.Column('whmcs_product_id', sa.Integer()),
+            sa.Column('is_active', sa.Boolean()),
+        )
+    _add_missing_columns('products', [
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    ])
+    _create_missing_indexes('products', [
+        ('ix_products_id', ['id'], False),
+        ('idx_product_active', ['is_active'], False),
+        ('idx_product_whmcs', ['whmcs_product_id'], False),
+    ])
+
+    if 'orders' not in tables:
+        op.create_table(
+            'orders',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id')),
+            sa.Column('product_id', sa.Integer(), sa.ForeignKey('products.id')),
+            sa.Column('whmcs_order_id', sa.Integer(), nullable=True),
+            sa.Column('amount', sa.Float()),
+            sa.Column('status', sa.String()),
+            sa.Column('created_at', sa.DateTime()),
+            sa.Column('expires_at', sa.DateTime(), nullable=True),
+        )
+    _add_missing_columns('orders', [
+        sa.Column('whmcs_service_id', sa.Integer(), nullable=True),
+        sa.Column('idempotency_key', sa.String(), nullable=True),
+        sa.Column('last_renewed_at', sa.DateTime(), nullable=True),
+    ])
+    # 已有表上不能直接添加 UNIQUE 列，幂等键的唯一性由唯一索引保证
+    _create_missing_indexes('orders', [
+        ('ix_orders_id', ['id'], False),
+        ('uq_order_idempotency_key', ['idempotency_key'], True),
+        ('idx_order_user', ['user_id'], False),
+        ('idx_order_status', ['status'], False),
+        ('idx_order_dates', ['created_at', 'expires_at'], False),
+        ('idx_order_status_expires', ['status', 'expires_at', 'id'], False),
+        ('idx_order_created_id', ['created_at', 'id'], False),
+        ('idx_order_user_created_id', ['user_id', 'created_at', 'id'], False),
+    ])
+
+    if 'order_outbox' not in tables:
+        op.create_table(
+            'order_outbox',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('order_id', sa.Integer(), sa.ForeignKey('orders.id')),
+            sa.Column('idempotency_key', sa.String(), unique=True),
+            sa.Column('whmcs_client_id', sa.Integer(), nullable=True),
+            sa.Column('whmcs_product_id', sa.Integer()),
+            sa.Column('status', sa.String()),
+            sa.Column('attempts', sa.Integer()),
+            sa.Column('next_attempt_at', sa.DateTime()),
+            sa.Column('locked_until', sa.DateTime(), nullable=True),
+            sa.Column('last_error', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime()),
+        )
+    _add_missing_columns('order_outbox', [
+        sa.Column('claim_token', sa.String(), nullable=True),
+    ])
+    _create_missing_indexes('order_outbox', [
+        ('ix_order_outbox_id', ['id'], False),
+        ('ix_order_outbox_status', ['status'], False),
+        ('idx_outbox_status_next', ['status', 'next_attempt_at'], False),
+    ])
+
+    if 'traffic_samples' not in tables:
+        op.create_table(
+            'traffic_samples',
+            sa.Column('order_id', sa.Integer(), primary_key=True),
+            sa.Column('ts', sa.Integer(), primary_key=True),
+            sa.Column('bytes_in', sa.BigInteger()),
+            sa.Column('bytes_out', sa.BigInteger()),
+        )
+
+    if 'traffic_rollups' not in tables:
+        op.create_table(
+            'traffic_rollups',
+            sa.Column('order_id', sa.Integer(), primary_key=True),
+            sa.Column('resolution', sa.Integer(), primary_key=True),
+            sa.Column('bucket', sa.Integer(), primary_key=True),
+            sa.Column('bytes_in', sa.BigInteger()),
+            sa.Column('bytes_out', sa.BigInteger()),
+        )
+    _create_missing_indexes('traffic_rollups', [
+        ('idx_rollup_resolution_bucket', ['resolution', 'bucket'], False),
+    ])
+
+    if 'usage_invoices' not in tables:
+        op.create_table(
+            'usage_invoices',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('whmcs_client_id', sa.Integer(), nullable=False),
+            sa.Column('period', sa.String(7), nullable=False),
+            sa.Column('status', sa.String()),
+            sa.Column('amount', sa.Float()),
+            sa.Column('whmcs_invoice_id', sa.Integer(), nullable=True),
+            sa.Column('last_error', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime()),
+            sa.Column('invoiced_at', sa.DateTime(), nullable=True),
+            sa.UniqueConstraint('whmcs_client_id', 'period', name='uq_usage_invoice_client_period'),
+        )
+    _create_missing_indexes('usage_invoices', [
+        ('ix_usage_invoices_id', ['id'], False),
+        ('idx_usage_invoice_period_status', ['period', 'status'], False),
+    ])
+
+
+def downgrade():
+    # 只删除本迁移新增的表和列，基线表保留
+    op.drop_table('usage_invoices')
+    op.drop_table('traffic_rollups')
+    op.drop_table('traffic_samples')
+    op.drop_table('order_outbox')
+    op.drop_index('uq_order_idempotency_key', table_name='orders')
+    for name in ('idx_order_status_expires', 'idx_order_created_id', 'idx_order_user_created_id'):
+        op.drop_index(name, table_name='orders')
+    with op.batch_alter_table('orders') as batch:
+        batch.drop_column('idempotency_key')
+        batch.drop_column('whmcs_service_id')
+    op.drop_index('idx_user_created_id', table_name='users')
+    op.drop_index('idx_user_whmcs_client', table_name='users')
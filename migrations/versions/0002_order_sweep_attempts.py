@@ -0,0 +1,33 @@
+"""order sweep attempts
+
+暂停/恢复失败的订单记录失败次数和下次重试时间，达到上限后转为 needs_review
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('orders')}
+    with op.batch_alter_table('orders') as batch:
+        if 'sweep_attempts' not in columns:
+            batch.add_column(sa.Column('sweep_attempts', sa.Integer(), nullable=True, server_default='0'))
+        if 'sweep_next_attempt_at' not in columns:
+            batch.add_column(sa.Column('sweep_next_attempt_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('orders') as batch:
+        batch.drop_column('sweep_next_attempt_at')
+        batch.drop_column('sweep_attempts')
@@ -0,0 +1,38 @@
+"""search indexes
+
+SQLite 的 FTS5 表和触发器、PostgreSQL 的 GIN 索引、MySQL 的 FULLTEXT 索引
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+from sqlalchemy import text
+
+from app.services.search import SEARCH_SPECS, install_search_indexes
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    install_search_indexes(op.get_bind())
+
+
+def downgrade():
+    bind = op.get_bind()
+    for spec in SEARCH_SPECS.values():
+        if bind.dialect.name == "sqlite":
+            for suffix in ("ai", "ad", "au"):
+                bind.execute(text(f"DROP TRIGGER IF EXISTS {spec.fts_table}_{suffix}"))
+            bind.execute(text(f"DROP TABLE IF EXISTS {spec.fts_table}"))
+        elif bind.dialect.name == "postgresql":
+            bind.execute(text(f"DROP INDEX IF EXISTS idx_{spec.table}_search_tsv"))
+            bind.execute(text(f"DROP INDEX IF EXISTS idx_{spec.table}_search_trgm"))
+        elif bind.dialect.name in ("mysql", "mariadb"):
+            bind.execute(text(f"ALTER TABLE {spec.table} DROP INDEX ft_{spec.table}_search"))
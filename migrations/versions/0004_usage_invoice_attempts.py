@@ -0,0 +1,33 @@
+"""usage invoice attempts
+
+被拒绝的开票记录保留为 failed 并记录发送次数；claim_token 标识认领记录的运行
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('usage_invoices')}
+    with op.batch_alter_table('usage_invoices') as batch:
+        if 'attempts' not in columns:
+            batch.add_column(sa.Column('attempts', sa.Integer(), nullable=True, server_default='0'))
+        if 'claim_token' not in columns:
+            batch.add_column(sa.Column('claim_token', sa.String(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('usage_invoices') as batch:
+        batch.drop_column('claim_token')
+        batch.drop_column('attempts')
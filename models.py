@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -24,6 +24,10 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     
     orders = relationship("Order", back_populates="user")
+    
+    __table_args__ = (
+        Index('idx_user_created_id', 'created_at', 'id'),
+    )
 
 class Product(Base):
     __tablename__ = "products"
@@ -44,10 +48,34 @@ class Order(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     product_id = Column(Integer, ForeignKey("products.id"))
     whmcs_order_id = Column(Integer, nullable=True)
+    whmcs_service_id = Column(Integer, nullable=True)
     amount = Column(Float)
-    status = Column(String)  # pending, active, suspended, cancelled
+    status = Column(String)  # pending, active, suspended, cancelled, failed
+    idempotency_key = Column(String, unique=True, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     expires_at = Column(DateTime, nullable=True)
     
     user = relationship("User", back_populates="orders")
     product = relationship("Product", back_populates="orders")
+    
+    # 键集分页使用的复合索引
+    __table_args__ = (
+        Index('idx_order_created_id', 'created_at', 'id'),
+        Index('idx_order_user_created_id', 'user_id', 'created_at', 'id'),
+    )
+
+class OrderOutbox(Base):
+    __tablename__ = "order_outbox"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"))
+    idempotency_key = Column(String, unique=True)
+    whmcs_client_id = Column(Integer, nullable=True)
+    whmcs_product_id = Column(Integer)
+    status = Column(String, default="pending", index=True)  # pending, sending, done, failed, needs_review
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)
+    claim_token = Column(String, nullable=True)  # 本次认领的标识，投递前核对
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
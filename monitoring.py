@@ -1,23 +1,81 @@
 from fastapi import HTTPException
+import asyncio
 import psutil
 import time
-from typing import Dict, Any
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
 from logger import setup_logger
+from system_check import SystemChecker
 
 logger = setup_logger("monitoring")
 
 class SystemMonitor:
+    def __init__(
+        self,
+        interval: float = 5,
+        history_size: int = 120,
+        requirements_interval: float = 300
+    ):
+        self.interval = interval
+        self.requirements_interval = requirements_interval
+        # 固定大小的环形缓冲区，保存最近的指标快照
+        self.history: deque = deque(maxlen=history_size)
+        self.system_info: Optional[Dict[str, Any]] = None
+        self.requirements: Tuple[List[str], List[str]] = ([], [])
+        self.requirements_checked_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
     @staticmethod
-    def get_system_metrics() -> Dict[str, Any]:
-        """获取系统指标"""
+    def collect_metrics() -> Dict[str, Any]:
+        """采集一次系统指标（阻塞调用，应在线程中执行）"""
+        return {
+            # interval=None 返回自上次调用以来的CPU使用率，不会休眠
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory_percent": psutil.virtual_memory().percent,
+            "disk_usage": psutil.disk_usage("/").percent,
+            "network_connections": len(psutil.net_connections()),
+            "timestamp": int(time.time())
+        }
+
+    async def start(self) -> None:
+        """启动后台采样任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台采样任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self.sample()
+            await asyncio.sleep(self.interval)
+
+    async def sample(self) -> None:
+        """采样一次并写入缓冲区"""
         try:
-            return {
-                "cpu_percent": psutil.cpu_percent(interval=1),
-                "memory_percent": psutil.virtual_memory().percent,
-                "disk_usage": psutil.disk_usage("/").percent,
-                "network_connections": len(psutil.net_connections()),
-                "timestamp": int(time.time())
-            }
+            if self.system_info is None:
+                self.system_info = await asyncio.to_thread(SystemChecker.get_system_info)
+            if time.time() - self.requirements_checked_at >= self.requirements_interval:
+                # 检查Docker需要启动子进程，按较长周期刷新
+                self.requirements = await asyncio.to_thread(SystemChecker.check_requirements)
+                self.requirements_checked_at = time.time()
+            self.history.append(await asyncio.to_thread(self.collect_metrics))
+        except Exception as e:
+            logger.error(f"Error sampling system metrics: {str(e)}")
+
+    def get_system_metrics(self) -> Dict[str, Any]:
+        """获取最新的系统指标"""
+        if self.history:
+            return self.history[-1]
+        try:
+            return self.collect_metrics()
         except Exception as e:
             logger.error(f"Error getting system metrics: {str(e)}")
             raise HTTPException(
@@ -25,11 +83,24 @@ class SystemMonitor:
                 detail="Failed to get system metrics"
             )
 
-    @staticmethod
-    def check_health() -> Dict[str, str]:
+    def get_history(self) -> List[Dict[str, Any]]:
+        """获取缓冲区内的指标快照"""
+        return list(self.history)
+
+    def get_system_info(self) -> Dict[str, Any]:
+        """获取缓存的系统信息"""
+        if self.system_info is None:
+            self.system_info = SystemChecker.get_system_info()
+        return self.system_info
+
+    def check_requirements(self) -> Tuple[List[str], List[str]]:
+        """获取最近一次系统要求检查结果"""
+        return self.requirements
+
+    def check_health(self) -> Dict[str, str]:
         """健康检查"""
         try:
-            metrics = SystemMonitor.get_system_metrics()
+            metrics = self.get_system_metrics()
             
             # 定义警告阈值
             warnings = []
@@ -0,0 +1,192 @@
+import asyncio
+import aiohttp
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import select, update
+from database import primary_session
+from models import Order, OrderOutbox
+from whmcs import WHMCSClient, WHMCSError, WHMCSUnavailableError
+from logger import setup_logger
+
+logger = setup_logger("outbox")
+
+class OrderOutboxWorker:
+    """将订单发件箱中的记录投递到WHMCS
+
+    投递前先把记录标记为 sending 并提交；若请求结果不确定（超时、连接中断、5xx），
+    记录转为 needs_review 而不会自动重发，保证同一幂等键不会产生第二个WHMCS订单。
+    每次最多认领 concurrency 条，认领后立即投递，租约不会在排队等待时过期。
+    """
+
+    def __init__(
+        self,
+        whmcs_client: WHMCSClient,
+        concurrency: int = 5,
+        batch_size: int = 50,
+        poll_interval: float = 1,
+        max_attempts: int = 10,
+        lease_seconds: int = 120
+    ):
+        self.whmcs_client = whmcs_client
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def start(self) -> None:
+        """启动投递循环"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止投递循环"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self) -> None:
+        """有新记录写入时唤醒投递循环"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._recover_expired()
+                processed = await self.drain_once()
+            except Exception as e:
+                logger.error(f"Outbox drain failed: {str(e)}")
+                processed = 0
+            if processed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def _recover_expired(self) -> None:
+        # 租约过期的 sending 记录可能已经发出请求，转人工核对
+        async with primary_session() as db:
+            await db.execute(
+                update(OrderOutbox)
+                .where(
+                    OrderOutbox.status == "sending",
+                    OrderOutbox.locked_until < datetime.utcnow()
+                )
+                .values(status="needs_review", last_error="Lease expired while sending")
+            )
+            await db.commit()
+
+    async def drain_once(self) -> int:
+        """分组认领到期记录并投递，每组不超过并发数，最多处理 batch_size 条，返回处理条数"""
+        processed = 0
+        while processed < self.batch_size:
+            token, ids = await self._claim(min(self.concurrency, self.batch_size - processed))
+            if not ids:
+                break
+            await asyncio.gather(*(self._dispatch(outbox_id, token) for outbox_id in ids))
+            processed += len(ids)
+        return processed
+
+    async def _claim(self, limit: int) -> Tuple[str, List[int]]:
+        """用一条条件更新认领记录，多个worker同时运行时每条记录只会被一个worker拿到"""
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        async with primary_session() as db:
+            # MySQL不允许UPDATE的子查询引用被更新的表，先取出候选ID
+            ids = (await db.scalars(
+                select(OrderOutbox.id)
+                .where(
+                    OrderOutbox.status == "pending",
+                    OrderOutbox.next_attempt_at <= now
+                )
+                .order_by(OrderOutbox.next_attempt_at)
+                .limit(limit)
+            )).all()
+            if not ids:
+                return token, []
+            await db.execute(
+                update(OrderOutbox)
+                .where(OrderOutbox.id.in_(ids), OrderOutbox.status == "pending")
+                .values(
+                    status="sending",
+                    attempts=OrderOutbox.attempts + 1,
+                    locked_until=now + timedelta(seconds=self.lease_seconds),
+                    claim_token=token
+                )
+                .execution_options(synchronize_session=False)
+            )
+            claimed = (await db.scalars(
+                select(OrderOutbox.id)
+                .where(OrderOutbox.id.in_(ids), OrderOutbox.claim_token == token)
+            )).all()
+            await db.commit()
+        return token, list(claimed)
+
+    async def _dispatch(self, outbox_id: int, token: str) -> None:
+        async with primary_session() as db:
+            record = await db.get(OrderOutbox, outbox_id)
+        # 租约过期后记录可能已被其他worker转为 needs_review，此时不能再发送
+        if record is None or record.status != "sending" or record.claim_token != token:
+            logger.warning(f"Outbox {outbox_id} is no longer claimed by this worker, skipping")
+            return
+
+        # 等待WHMCS响应期间不占用数据库连接，结果在新的会话中写入
+        try:
+            response = await self.whmcs_client.create_order(
+                client_id=record.whmcs_client_id,
+                product_id=record.whmcs_product_id
+            )
+        except WHMCSError as e:
+            async with primary_session() as db:
+                await self._handle_error(db, await db.get(OrderOutbox, outbox_id), e)
+            return
+
+        async with primary_session() as db:
+            record = await db.get(OrderOutbox, outbox_id)
+            order = await db.get(Order, record.order_id)
+            if response.get("result") == "success":
+                order.whmcs_order_id = response.get("orderid")
+                order.whmcs_service_id = WHMCSClient.parse_service_id(response)
+                record.status = "done"
+                logger.info(f"Outbox {record.idempotency_key} delivered as WHMCS order {order.whmcs_order_id}")
+            else:
+                # WHMCS明确拒绝，未创建订单
+                order.status = "failed"
+                record.status = "failed"
+                record.last_error = str(response.get("message"))
+                logger.error(f"Outbox {record.idempotency_key} rejected by WHMCS: {record.last_error}")
+            record.locked_until = None
+            await db.commit()
+
+    async def _handle_error(self, db, record: OrderOutbox, error: WHMCSError) -> None:
+        record.last_error = str(error)
+        record.locked_until = None
+        # 熔断或无法建立连接时请求肯定未发出，可以安全重试
+        not_sent = isinstance(error, WHMCSUnavailableError) or isinstance(
+            error.__cause__, aiohttp.ClientConnectorError
+        )
+        if not_sent and record.attempts < self.max_attempts:
+            record.status = "pending"
+            record.next_attempt_at = datetime.utcnow() + timedelta(
+                seconds=min(300, 2 ** record.attempts)
+            )
+            logger.warning(f"Outbox {record.idempotency_key} not sent, retrying later: {str(error)}")
+        elif not_sent:
+            record.status = "failed"
+            order = await db.get(Order, record.order_id)
+            order.status = "failed"
+            logger.error(f"Outbox {record.idempotency_key} gave up after {record.attempts} attempts")
+        else:
+            record.status = "needs_review"
+            logger.error(f"Outbox {record.idempotency_key} outcome unknown, needs review: {str(error)}")
+        await db.commit()
@@ -0,0 +1,59 @@
+from typing import List, Optional
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+from models import UserRole
+
+class ORMModel(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str
+
+class UserResponse(ORMModel):
+    # 不包含 hashed_password
+    id: int
+    username: str
+    email: str
+    role: UserRole
+    whmcs_client_id: Optional[int] = None
+    is_active: bool
+    created_at: Optional[datetime] = None
+
+class ProductResponse(ORMModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    price: Optional[float] = None
+    whmcs_product_id: Optional[int] = None
+    is_active: bool
+
+class ProductSearchPage(BaseModel):
+    items: List[ProductResponse]
+    page: int
+    has_more: bool
+
+class OrderResponse(ORMModel):
+    id: int
+    user_id: int
+    product_id: int
+    whmcs_order_id: Optional[int] = None
+    whmcs_service_id: Optional[int] = None
+    amount: Optional[float] = None
+    status: str
+    idempotency_key: Optional[str] = None
+    created_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+
+class OrderListItem(OrderResponse):
+    # 列表接口通过 DataLoader 批量填充
+    product: Optional[ProductResponse] = None
+
+class OrderPage(BaseModel):
+    items: List[OrderListItem]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+# 列表接口直接从ORM行序列化为bytes
+ORDER_PAGE_ADAPTER = TypeAdapter(OrderPage)
+PRODUCT_SEARCH_PAGE_ADAPTER = TypeAdapter(ProductSearchPage)
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from sqlalchemy import MetaData
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+import models
+from app.db import models as app_models
+
+class FakeWHMCS:
+    """记录调用的WHMCS客户端
+
+    outcomes 按客户ID或服务ID预设响应，异常实例直接抛出；未预设的调用返回成功
+    """
+
+    def __init__(self, outcomes=None, delay: float = 0):
+        self.outcomes = outcomes or {}
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    def calls_to(self, action):
+        return [key for called, key in self.calls if called == action]
+
+    async def _respond(self, action, key, success):
+        self.calls.append((action, key))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        outcome = self.outcomes.get(key, success)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    async def create_order(self, client_id, product_id):
+        return await self._respond("create_order", client_id, {
+            "result": "success", "orderid": 100 + len(self.calls), "serviceids": "7"
+        })
+
+    async def suspend_product(self, service_id, reason):
+        return await self._respond("suspend_product", service_id, {"result": "success"})
+
+    async def unsuspend_product(self, service_id):
+        return await self._respond("unsuspend_product", service_id, {"result": "success"})
+
+    async def create_invoice(self, client_id, items, due_date=None):
+        return await self._respond("create_invoice", client_id, {"result": "success", "invoiceid": "1"})
+
+async def _session_factory(metadata: MetaData):
+    # 内存数据库在所有会话间共用同一个连接
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+    return engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+@pytest.fixture
+async def db_factory():
+    """app.db.models 表结构的会话工厂，替代 primary_session"""
+    engine, factory = await _session_factory(app_models.Base.metadata)
+    yield factory
+    await engine.dispose()
+
+@pytest.fixture
+async def legacy_db_factory():
+    """根目录 models 表结构的会话工厂"""
+    engine, factory = await _session_factory(models.Base.metadata)
+    yield factory
+    await engine.dispose()
+
+@pytest.fixture
+def use_primary(monkeypatch):
+    """把模块的 primary_session 替换为测试会话工厂"""
+    def patch(module, factory):
+        monkeypatch.setattr(module, "primary_session", factory)
+        return factory
+    return patch
+
+@pytest.fixture
+def fake_whmcs():
+    return FakeWHMCS()
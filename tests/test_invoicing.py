@@ -0,0 +1,134 @@
+from datetime import datetime
+import asyncio
+import time
+import pytest
+from sqlalchemy import select
+from app.db.models import UsageInvoice, User
+from app.services import invoicing
+from app.services.invoicing import UsageInvoicer
+from whmcs import WHMCSError, WHMCSUnavailableError
+
+PERIOD = "2026-09"
+END = datetime(2026, 10, 1)
+
+@pytest.fixture
+def make_invoicer(db_factory, use_primary, fake_whmcs):
+    use_primary(invoicing, db_factory)
+
+    def make(outcomes):
+        fake_whmcs.outcomes.update(outcomes)
+        invoicer = UsageInvoicer(fake_whmcs, concurrency=1, max_per_second=1000)
+        # run() 负责初始化限速状态，这里直接测试 _dispatch
+        invoicer._pace_lock = asyncio.Lock()
+        return invoicer
+    return make
+
+def items(amount=10.0):
+    return [{"description": "Order #1", "amount": amount}]
+
+async def invoice_rows(factory):
+    async with factory() as db:
+        rows = (await db.scalars(select(UsageInvoice).order_by(UsageInvoice.whmcs_client_id))).all()
+    return {row.whmcs_client_id: row for row in rows}
+
+async def test_claim_records_pending_and_empty_clients(make_invoicer, db_factory):
+    invoicer = make_invoicer({})
+    claims = await invoicer._claim(PERIOD, [1, 2], {1: items(12.5)})
+
+    rows = await invoice_rows(db_factory)
+    assert set(claims) == {1} and claims[1] == rows[1].id
+    assert rows[1].status == "pending" and rows[1].amount == 12.5
+    assert rows[2].status == "empty"
+
+async def test_claim_skips_clients_claimed_by_another_run(make_invoicer, db_factory):
+    invoicer = make_invoicer({})
+    first = await invoicer._claim(PERIOD, [1], {1: items()})
+    second = await invoicer._claim(PERIOD, [1, 2], {1: items(), 2: items()})
+
+    assert set(first) == {1} and set(second) == {2}
+    rows = await invoice_rows(db_factory)
+    assert rows[1].claim_token != rows[2].claim_token
+
+async def test_rejected_invoice_is_retried_until_max_attempts(make_invoicer, db_factory):
+    invoices = {1: items()}
+    invoicer = make_invoicer({1: {"result": "error", "message": "Client not found"}})
+    invoicer.max_attempts = 2
+    async with db_factory() as db:
+        db.add(User(username="client", email="client@example.com", whmcs_client_id=1))
+        await db.commit()
+
+    for _ in range(2):
+        assert await invoicer._next_clients(PERIOD, None) == [1]
+        claims = await invoicer._claim(PERIOD, [1], invoices)
+        assert set(claims) == {1}
+        await invoicer._dispatch(PERIOD, END, invoices, claims, time.monotonic() + 60)
+
+    rows = await invoice_rows(db_factory)
+    assert rows[1].status == "failed" and rows[1].attempts == 2
+    assert invoicer.whmcs_client.calls_to("create_invoice") == [1, 1]
+    assert await invoicer._next_clients(PERIOD, None) == []
+    assert await invoicer._claim(PERIOD, [1], invoices) == {}
+
+async def test_dispatch_records_each_outcome(make_invoicer, db_factory):
+    invoices = {client_id: items() for client_id in (1, 2, 3, 4)}
+    invoicer = make_invoicer({
+        1: {"result": "success", "invoiceid": "55"},
+        2: ValueError("Expecting value: line 1 column 1"),
+        3: WHMCSError("WHMCS CreateInvoice failed: timeout"),
+        4: {"result": "error", "message": "Client not found"},
+    })
+    claims = await invoicer._claim(PERIOD, list(invoices), invoices)
+
+    invoiced, failed, aborted = await invoicer._dispatch(
+        PERIOD, END, invoices, claims, time.monotonic() + 60
+    )
+
+    assert (invoiced, failed, aborted) == (1, 3, False)
+    rows = await invoice_rows(db_factory)
+    assert rows[1].status == "invoiced" and rows[1].whmcs_invoice_id == 55
+    assert rows[2].status == "needs_review" and "Expecting value" in rows[2].last_error
+    assert rows[3].status == "needs_review"
+    assert rows[4].status == "failed" and rows[4].last_error == "Client not found"
+    assert all(row.attempts == 1 for row in rows.values())
+
+async def test_dispatch_releases_unsent_clients_when_whmcs_is_unavailable(make_invoicer, db_factory):
+    invoices = {client_id: items() for client_id in (1, 2, 3)}
+    invoicer = make_invoicer({
+        1: {"result": "success", "invoiceid": "7"},
+        2: WHMCSUnavailableError("circuit open"),
+        3: {"result": "success", "invoiceid": "8"},
+    })
+    claims = await invoicer._claim(PERIOD, list(invoices), invoices)
+
+    invoiced, _, aborted = await invoicer._dispatch(PERIOD, END, invoices, claims, time.monotonic() + 60)
+
+    assert invoiced == 1 and aborted
+    assert invoicer.whmcs_client.calls_to("create_invoice") == [1, 2]
+    rows = await invoice_rows(db_factory)
+    assert set(rows) == {1} and rows[1].status == "invoiced"
+
+async def test_dispatch_persists_created_invoices_when_a_call_crashes(make_invoicer, db_factory):
+    invoices = {1: items(), 2: items()}
+    invoicer = make_invoicer({
+        1: {"result": "success", "invoiceid": "9"},
+        # 成功响应中的发票号无法解析
+        2: {"result": "success", "invoiceid": "not-a-number"},
+    })
+    claims = await invoicer._claim(PERIOD, list(invoices), invoices)
+
+    invoiced, _, _ = await invoicer._dispatch(PERIOD, END, invoices, claims, time.monotonic() + 60)
+
+    assert invoiced == 1
+    rows = await invoice_rows(db_factory)
+    assert rows[1].status == "invoiced" and rows[1].whmcs_invoice_id == 9
+    assert rows[2].status == "needs_review"
+
+async def test_dispatch_releases_clients_past_deadline(make_invoicer, db_factory):
+    invoices = {1: items()}
+    invoicer = make_invoicer({1: {"result": "success", "invoiceid": "1"}})
+    claims = await invoicer._claim(PERIOD, list(invoices), invoices)
+
+    invoiced, _, _ = await invoicer._dispatch(PERIOD, END, invoices, claims, time.monotonic() - 1)
+
+    assert invoiced == 0 and invoicer.whmcs_client.calls_to("create_invoice") == []
+    assert await invoice_rows(db_factory) == {}
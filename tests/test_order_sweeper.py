@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select
+from app.db.models import Order
+from app.services import order_sweeper as sweeper_module
+from app.services.order_sweeper import SUSPEND, UNSUSPEND, OrderSweeper
+
+@pytest.fixture
+def sweeper(db_factory, use_primary, fake_whmcs):
+    use_primary(sweeper_module, db_factory)
+    return OrderSweeper(fake_whmcs, batch_size=10, concurrency=2)
+
+async def add_order(factory, **values) -> int:
+    async with factory() as db:
+        order = Order(amount=1, **values)
+        db.add(order)
+        await db.commit()
+        return order.id
+
+async def order_status(factory, order_id):
+    async with factory() as db:
+        return await db.scalar(select(Order.status).where(Order.id == order_id))
+
+async def test_claim_rechecks_expiry(sweeper, db_factory):
+    now = datetime.utcnow()
+    expired = await add_order(db_factory, status="active", whmcs_service_id=1, expires_at=now - timedelta(days=1))
+    renewed = await add_order(db_factory, status="active", whmcs_service_id=2, expires_at=now - timedelta(days=1))
+    batch = await sweeper._next_batch("active", now, True, None)
+    assert [row[0] for row in batch] == [expired, renewed]
+
+    # 查询之后、认领之前订单被续期
+    async with db_factory() as db:
+        order = await db.get(Order, renewed)
+        order.expires_at = now + timedelta(days=30)
+        await db.commit()
+
+    claimed = await sweeper._claim(SUSPEND, batch, now)
+    assert [row[0] for row in claimed] == [expired]
+    assert await order_status(db_factory, renewed) == "active"
+
+async def test_claim_skips_orders_whose_status_changed(sweeper, db_factory):
+    now = datetime.utcnow()
+    order_id = await add_order(db_factory, status="active", expires_at=now - timedelta(days=1))
+    batch = await sweeper._next_batch("active", now, True, None)
+    async with db_factory() as db:
+        (await db.get(Order, order_id)).status = "cancelled"
+        await db.commit()
+
+    assert await sweeper._claim(SUSPEND, batch, now) == []
+    assert await order_status(db_factory, order_id) == "cancelled"
+
+async def test_unsuspend_claim_requires_renewal(sweeper, db_factory):
+    now = datetime.utcnow()
+    manual = await add_order(db_factory, status="suspended", expires_at=now + timedelta(days=1))
+    renewed = await add_order(
+        db_factory, status="suspended", expires_at=now + timedelta(days=1), last_renewed_at=now
+    )
+    batch = [(manual, None, now + timedelta(days=1)), (renewed, None, now + timedelta(days=1))]
+
+    claimed = await sweeper._claim(UNSUSPEND, batch, now)
+    assert [row[0] for row in claimed] == [renewed]
+    assert await order_status(db_factory, manual) == "suspended"
+
+async def test_dispatch_sends_only_claimed_orders(sweeper, db_factory):
+    now = datetime.utcnow()
+    expired = await add_order(db_factory, status="active", whmcs_service_id=1, expires_at=now - timedelta(days=1))
+    renewed = await add_order(db_factory, status="active", whmcs_service_id=2, expires_at=now - timedelta(days=1))
+    batch = await sweeper._next_batch("active", now, True, None)
+    async with db_factory() as db:
+        (await db.get(Order, renewed)).expires_at = now + timedelta(days=30)
+        await db.commit()
+
+    claimed = await sweeper._claim(SUSPEND, batch, now)
+    assert await sweeper._dispatch(SUSPEND, claimed) == 1
+    assert sweeper.whmcs_client.calls_to("suspend_product") == [1]
+    assert await order_status(db_factory, expired) == "suspended"
+    assert await order_status(db_factory, renewed) == "active"
+
+async def test_failed_dispatch_backs_off_then_needs_review(sweeper, db_factory):
+    now = datetime.utcnow()
+    order_id = await add_order(db_factory, status="active", whmcs_service_id=1, expires_at=now - timedelta(days=1))
+    sweeper.whmcs_client.outcomes[1] = {"result": "error", "message": "Service not found"}
+    sweeper.max_attempts = 2
+    claimed = await sweeper._claim(SUSPEND, await sweeper._next_batch("active", now, True, None), now)
+
+    assert await sweeper._dispatch(SUSPEND, claimed) == 0
+    async with db_factory() as db:
+        order = await db.get(Order, order_id)
+    assert order.status == "suspending" and order.sweep_attempts == 1
+    assert order.sweep_next_attempt_at > now
+    # 未到重试时间的订单不会被继续处理
+    assert await sweeper._resume_pending(SUSPEND, now) == 0
+    assert sweeper.whmcs_client.calls_to("suspend_product") == [1]
+
+    later = order.sweep_next_attempt_at
+    assert await sweeper._resume_pending(SUSPEND, later) == 0
+    assert sweeper.whmcs_client.calls_to("suspend_product") == [1, 1]
+    assert await order_status(db_factory, order_id) == "needs_review"
+    assert await sweeper._resume_pending(SUSPEND, later + timedelta(days=1)) == 0
+    assert sweeper.whmcs_client.calls_to("suspend_product") == [1, 1]
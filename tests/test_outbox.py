@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select
+import outbox
+from models import Order, OrderOutbox
+from outbox import OrderOutboxWorker
+
+@pytest.fixture
+def worker(legacy_db_factory, use_primary, fake_whmcs):
+    use_primary(outbox, legacy_db_factory)
+    return OrderOutboxWorker(fake_whmcs, concurrency=2, batch_size=5)
+
+async def add_records(factory, count, **values):
+    async with factory() as db:
+        for index in range(count):
+            order = Order(status="pending", amount=1, idempotency_key=f"key-{index}")
+            db.add(order)
+            await db.flush()
+            db.add(OrderOutbox(
+                order_id=order.id,
+                idempotency_key=f"key-{index}",
+                whmcs_client_id=1,
+                whmcs_product_id=2,
+                **values
+            ))
+        await db.commit()
+
+async def statuses(factory):
+    async with factory() as db:
+        return list((await db.scalars(select(OrderOutbox.status).order_by(OrderOutbox.id))).all())
+
+async def test_claim_takes_at_most_limit_rows_once(worker, legacy_db_factory):
+    await add_records(legacy_db_factory, 3)
+
+    token, ids = await worker._claim(2)
+    assert len(ids) == 2
+    _, again = await worker._claim(2)
+    assert set(again).isdisjoint(ids) and len(again) == 1
+
+    async with legacy_db_factory() as db:
+        claimed = (await db.scalars(select(OrderOutbox).where(OrderOutbox.id.in_(ids)))).all()
+    assert all(record.status == "sending" and record.claim_token == token for record in claimed)
+    assert all(record.attempts == 1 and record.locked_until is not None for record in claimed)
+
+async def test_claim_skips_records_not_yet_due(worker, legacy_db_factory):
+    await add_records(legacy_db_factory, 1, next_attempt_at=datetime.utcnow() + timedelta(minutes=5))
+    _, ids = await worker._claim(5)
+    assert ids == []
+
+async def test_dispatch_skips_record_recovered_after_lease_expiry(worker, legacy_db_factory):
+    await add_records(legacy_db_factory, 1)
+    token, ids = await worker._claim(1)
+    async with legacy_db_factory() as db:
+        record = await db.get(OrderOutbox, ids[0])
+        record.locked_until = datetime.utcnow() - timedelta(seconds=1)
+        await db.commit()
+
+    await worker._recover_expired()
+    await worker._dispatch(ids[0], token)
+
+    assert worker.whmcs_client.calls == []
+    assert await statuses(legacy_db_factory) == ["needs_review"]
+
+async def test_dispatch_skips_record_claimed_under_another_token(worker, legacy_db_factory):
+    await add_records(legacy_db_factory, 1)
+    _, ids = await worker._claim(1)
+    await worker._dispatch(ids[0], "other-token")
+    assert worker.whmcs_client.calls == []
+    assert await statuses(legacy_db_factory) == ["sending"]
+
+async def test_recover_expired_leaves_live_leases(worker, legacy_db_factory):
+    await add_records(legacy_db_factory, 1)
+    await worker._claim(1)
+    await worker._recover_expired()
+    assert await statuses(legacy_db_factory) == ["sending"]
+
+async def test_drain_once_sends_in_groups_no_larger_than_concurrency(worker, legacy_db_factory):
+    worker.whmcs_client.delay = 0.01
+    await add_records(legacy_db_factory, 5)
+
+    assert await worker.drain_once() == 5
+    assert worker.whmcs_client.max_active <= worker.concurrency
+    assert await statuses(legacy_db_factory) == ["done"] * 5
+    async with legacy_db_factory() as db:
+        orders = (await db.scalars(select(Order))).all()
+    assert all(order.whmcs_order_id is not None and order.whmcs_service_id == 7 for order in orders)
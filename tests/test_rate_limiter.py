@@ -0,0 +1,97 @@
+import time
+import pytest
+from app.services.rate_limiter import RateLimitEngine, parse_rules
+
+class FakeRedis:
+    """按 RATE_LIMIT_SCRIPT 的语义计数，不模拟窗口过期"""
+
+    def __init__(self):
+        self.counts = {}
+        self.calls = 0
+
+    def register_script(self, source):
+        return self.script
+
+    async def script(self, keys, args):
+        self.calls += 1
+        carry, cost = args[0], args[1]
+        limits = args[2::2]
+        for key in keys:
+            self.counts[key] = self.counts.get(key, 0) + carry
+        if any(self.counts.get(key, 0) + cost > limit for key, limit in zip(keys, limits)):
+            return [0, 30000, 0]
+        for key in keys:
+            self.counts[key] = self.counts.get(key, 0) + cost
+        return [1, 0, min(limit - self.counts[key] for key, limit in zip(keys, limits))]
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+def engine(redis, **kwargs):
+    return RateLimitEngine(redis, [(100, 60)], {"/api/v1/auth": [(2, 60)]}, **kwargs)
+
+def test_parse_rules():
+    assert parse_rules("60/minute, 1000/hours,5/300") == [(60, 60), (1000, 3600), (5, 300)]
+
+async def test_default_limits_are_counted_per_path(redis):
+    limiter = engine(redis)
+    await limiter.hit("1.2.3.4", "/orders")
+    await limiter.hit("1.2.3.4", "/products")
+    assert redis.counts == {"ratelimit:1.2.3.4:/orders:60": 1, "ratelimit:1.2.3.4:/products:60": 1}
+
+async def test_route_prefix_shares_one_counter_and_rejects(redis):
+    limiter = engine(redis)
+    assert await limiter.hit("1.2.3.4", "/api/v1/auth/login") == (True, 0)
+    assert await limiter.hit("1.2.3.4", "/api/v1/auth/register") == (True, 0)
+    assert await limiter.hit("1.2.3.4", "/api/v1/auth/login") == (False, 30)
+    assert redis.counts == {"ratelimit:1.2.3.4:/api/v1/auth:60": 2}
+
+async def test_local_tokens_are_written_back_on_next_slow_hit(redis):
+    limiter = engine(redis, local_batch=5, sync_interval=60)
+    for _ in range(4):
+        await limiter.hit("1.2.3.4", "/orders")
+    key = "ratelimit:1.2.3.4:/orders"
+    assert redis.calls == 1 and limiter.buckets[key].pending == 3
+
+    limiter.buckets[key].expires_at = 0
+    await limiter.hit("1.2.3.4", "/orders")
+    assert redis.counts[f"{key}:60"] == 5
+
+async def test_flush_writes_back_expired_buckets_only(redis):
+    limiter = engine(redis, local_batch=5, sync_interval=60)
+    for identifier in ("a", "b"):
+        for _ in range(3):
+            await limiter.hit(identifier, "/orders")
+    limiter.buckets["ratelimit:a:/orders"].expires_at = time.monotonic() - 1
+
+    await limiter.flush()
+
+    assert redis.counts["ratelimit:a:/orders:60"] == 3
+    assert redis.counts["ratelimit:b:/orders:60"] == 1
+    assert list(limiter.buckets) == ["ratelimit:b:/orders"]
+
+async def test_stop_flushes_all_pending_counts(redis):
+    limiter = engine(redis, local_batch=5, sync_interval=60)
+    await limiter.start()
+    for _ in range(3):
+        await limiter.hit("a", "/orders")
+
+    await limiter.stop()
+
+    assert redis.counts["ratelimit:a:/orders:60"] == 3
+    assert limiter.buckets == {}
+
+async def test_failed_flush_keeps_pending_count(redis):
+    limiter = engine(redis, local_batch=5, sync_interval=60)
+    for _ in range(3):
+        await limiter.hit("a", "/orders")
+    bucket = limiter.buckets["ratelimit:a:/orders"]
+    bucket.expires_at = 0
+
+    async def down(keys, args):
+        raise ConnectionError("redis down")
+    limiter.script = down
+    await limiter.flush()
+
+    assert bucket.pending == 2 and limiter.buckets["ratelimit:a:/orders"] is bucket
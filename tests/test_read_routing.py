@@ -0,0 +1,117 @@
+import asyncio
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from app.db.models import Base, User
+from app.db.replicas import ReplicaSet
+from app.db.routing import RoutingSession, WRITER_KEY, is_write
+from app.services import read_your_writes as ryw_module
+from app.services.read_your_writes import ReadYourWrites
+
+class FakeCache:
+    def __init__(self, fail=False):
+        self.data = {}
+        self.fail = fail
+
+    async def exists(self, key):
+        if self.fail:
+            raise ConnectionError("redis down")
+        return key in self.data
+
+    async def set(self, key, value, ttl=None):
+        self.data[key] = value
+
+async def make_engine(label):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        # 每个库里放一个标记用户，用来判断查询走了哪个库
+        await conn.execute(User.__table__.insert().values(username=label, email=f"{label}@example.com"))
+    return engine
+
+@pytest.fixture
+async def routed():
+    primary = await make_engine("primary")
+    replica = await make_engine("replica")
+    readers = ReplicaSet([replica])
+    factory = async_sessionmaker(
+        primary,
+        class_=AsyncSession,
+        sync_session_class=RoutingSession,
+        readers=readers,
+        expire_on_commit=False,
+    )
+    yield factory, readers
+    await primary.dispose()
+    await replica.dispose()
+
+async def source(db):
+    return await db.scalar(select(User.username).where(User.id == 1))
+
+def test_is_write():
+    assert is_write(User.__table__.insert())
+    assert is_write(select(User).with_for_update())
+    assert is_write(text("  update users set is_active = 0"))
+    assert not is_write(select(User))
+    assert not is_write(text("SELECT 1"))
+
+async def test_reads_use_replica_until_first_write(routed):
+    factory, _ = routed
+    async with factory() as db:
+        assert await source(db) == "replica"
+        db.add(User(username="new", email="new@example.com"))
+        await db.flush()
+        # 写入之后同一会话读主库，能看到自己未提交的写入
+        assert await source(db) == "primary"
+        assert await db.scalar(select(User.id).where(User.username == "new")) is not None
+
+async def test_pinned_session_reads_primary(routed):
+    factory, _ = routed
+    async with factory(info={WRITER_KEY: True}) as db:
+        assert await source(db) == "primary"
+
+async def test_unhealthy_replica_falls_back_to_primary(routed):
+    factory, readers = routed
+    readers.healthy = {key: False for key in readers.healthy}
+    async with factory() as db:
+        assert await source(db) == "primary"
+
+@pytest.fixture
+def ryw(monkeypatch):
+    tracker = ReadYourWrites(FakeCache(), ttl=5, enabled=True)
+    # after_commit 监听器使用模块级实例
+    monkeypatch.setattr(ryw_module, "read_your_writes", tracker)
+    return tracker
+
+async def test_commit_marks_user_and_next_request_reads_primary(routed, ryw):
+    factory, _ = routed
+    async with factory() as db:
+        await ryw.apply(db, user_id=42)
+        assert await source(db) == "replica"
+        db.add(User(username="new", email="new@example.com"))
+        await db.commit()
+    await asyncio.gather(*ryw._background)
+    assert "ryw:42" in ryw.cache.data
+
+    async with factory() as db:
+        await ryw.apply(db, user_id=42)
+        assert await source(db) == "primary"
+    async with factory() as db:
+        await ryw.apply(db, user_id=7)
+        assert await source(db) == "replica"
+
+async def test_read_only_commit_does_not_mark(routed, ryw):
+    factory, _ = routed
+    async with factory() as db:
+        await ryw.apply(db, user_id=42)
+        await source(db)
+        await db.commit()
+    assert ryw.cache.data == {} and not ryw._background
+
+async def test_marker_lookup_failure_reads_primary(routed, ryw):
+    factory, _ = routed
+    ryw.cache.fail = True
+    async with factory() as db:
+        await ryw.apply(db, user_id=42)
+        assert await source(db) == "primary"
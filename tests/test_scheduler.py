@@ -0,0 +1,151 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from app.services import leader_election, scheduler as scheduler_module
+from app.services.leader_election import ACQUIRE_SCRIPT, RELEASE_SCRIPT, RENEW_SCRIPT, LeaderElector
+from app.services.scheduler import CronSchedule, PeriodicScheduler
+
+class FakeRedis:
+    """只实现选举脚本和调度器用到的命令，不模拟键过期"""
+
+    def __init__(self):
+        self.data = {}
+        self.counter = 0
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value):
+        self.data[key] = value
+
+    def register_script(self, source):
+        scripts = {ACQUIRE_SCRIPT: self._acquire, RENEW_SCRIPT: self._renew, RELEASE_SCRIPT: self._release}
+        return scripts[source]
+
+    async def _acquire(self, keys, args):
+        if keys[0] in self.data:
+            return 0
+        self.counter += 1
+        self.data[keys[0]] = f"{args[0]}:{self.counter}"
+        return self.counter
+
+    async def _renew(self, keys, args):
+        return int(self.data.get(keys[0]) == args[0])
+
+    async def _release(self, keys, args):
+        if self.data.get(keys[0]) == args[0]:
+            del self.data[keys[0]]
+            return 1
+        return 0
+
+@pytest.fixture
+def redis(monkeypatch):
+    redis = FakeRedis()
+    fake_cache = SimpleNamespace(redis_client=redis)
+    monkeypatch.setattr(leader_election, "cache_service", fake_cache)
+    monkeypatch.setattr(scheduler_module, "cache_service", fake_cache)
+    return redis
+
+class FakeElector:
+    def __init__(self, token=None):
+        self.fencing_token = token
+
+    @property
+    def is_leader(self):
+        return self.fencing_token is not None
+
+    async def validate(self, token):
+        return token is not None and token == self.fencing_token
+
+def test_cron_matches_day_or_weekday_when_both_restricted():
+    # 2026-10-17 是星期六
+    start = datetime(2026, 10, 17)
+    assert CronSchedule("0 0 1 * 1").next_after(start) == datetime(2026, 10, 19)
+    assert CronSchedule("0 0 1 * *").next_after(start) == datetime(2026, 11, 1)
+    assert CronSchedule("0 0 * * 1").next_after(start) == datetime(2026, 10, 19)
+    assert CronSchedule("*/15 2 * * *").next_after(datetime(2026, 10, 17, 2, 50)) == datetime(2026, 10, 18, 2)
+
+def test_cron_rejects_invalid_expressions():
+    with pytest.raises(ValueError):
+        CronSchedule("0 0 * *")
+    with pytest.raises(ValueError):
+        CronSchedule("0 24 * * *")
+
+async def test_elector_hands_over_with_a_new_fencing_token(redis):
+    first = LeaderElector("jobs", lease_seconds=0.03)
+    second = LeaderElector("jobs", lease_seconds=0.03)
+    await first.start()
+    await asyncio.sleep(0.01)
+    await second.start()
+    await asyncio.sleep(0.01)
+    assert first.fencing_token == 1 and not second.is_leader
+    assert await first.validate(1)
+
+    # 租约被其他节点接管（例如本节点停顿超过租约时长）
+    del redis.data["leader:jobs"]
+    await asyncio.sleep(0.05)
+
+    assert second.fencing_token == 2 and not first.is_leader
+    assert not await first.validate(1)
+    await first.stop()
+    await second.stop()
+    assert "leader:jobs" not in redis.data
+
+async def test_tick_runs_due_jobs_once_with_the_current_token(redis):
+    elector = FakeElector(token=7)
+    scheduler = PeriodicScheduler(elector)
+    runs = []
+
+    async def job():
+        runs.append(elector.fencing_token)
+    scheduler.add_job("sync", job, interval=60)
+
+    await scheduler._tick()
+    await scheduler.jobs["sync"].task
+    await scheduler._tick()
+
+    assert runs == [7] and scheduler.jobs["sync"].token == 7
+    assert "scheduler:last_run:sync" in redis.data
+
+async def test_new_leader_resumes_from_the_last_run(redis):
+    redis.data["scheduler:last_run:sync"] = datetime.utcnow().isoformat()
+    scheduler = PeriodicScheduler(FakeElector(token=2))
+    runs = []
+
+    async def job():
+        runs.append(1)
+    scheduler.add_job("sync", job, interval=60)
+
+    await scheduler._tick()
+    assert runs == [] and scheduler.jobs["sync"].next_run > datetime.utcnow() + timedelta(seconds=50)
+
+async def test_running_job_is_cancelled_when_leadership_changes(redis):
+    elector = FakeElector(token=1)
+    scheduler = PeriodicScheduler(elector)
+    started = asyncio.Event()
+
+    async def job():
+        started.set()
+        await asyncio.sleep(60)
+    scheduler.add_job("sync", job, interval=60)
+    await scheduler._tick()
+    await started.wait()
+
+    elector.fencing_token = None
+    await scheduler._tick()
+
+    with pytest.raises(asyncio.CancelledError):
+        await scheduler.jobs["sync"].task
+
+async def test_job_is_skipped_when_token_no_longer_valid(redis):
+    elector = FakeElector(token=1)
+    scheduler = PeriodicScheduler(elector)
+    runs = []
+
+    async def job():
+        runs.append(1)
+    scheduler.add_job("sync", job, interval=60)
+
+    await scheduler._execute(scheduler.jobs["sync"], 0)
+    assert runs == []
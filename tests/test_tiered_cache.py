@@ -0,0 +1,139 @@
+import asyncio
+import json
+import pytest
+from app.services.tiered_cache import TieredCache
+
+class FakePubSub:
+    def __init__(self, messages):
+        self.messages = messages
+        self.closed = False
+
+    async def subscribe(self, channel):
+        pass
+
+    async def listen(self):
+        for message in self.messages:
+            yield message
+        raise asyncio.CancelledError
+
+    async def close(self):
+        self.closed = True
+
+class FakeRedisClient:
+    def __init__(self):
+        self.published = []
+        self.incoming = []
+
+    async def publish(self, channel, message):
+        self.published.append(json.loads(message))
+
+    def pubsub(self):
+        return FakePubSub(self.incoming)
+
+class FakeL2:
+    def __init__(self):
+        self.data = {}
+        self.redis_client = FakeRedisClient()
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ttl=None):
+        self.data[key] = value
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def clear_prefix(self, prefix):
+        for key in [key for key in self.data if key.startswith(f"{prefix}:")]:
+            del self.data[key]
+
+@pytest.fixture
+def cache():
+    return TieredCache(FakeL2(), ttl=60, stale_ttl=30)
+
+def counting_loader(value="v"):
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return value
+    return load, calls
+
+async def test_miss_loads_once_and_fills_both_tiers(cache):
+    load, calls = counting_loader()
+    assert await cache.get_or_load("k", load) == "v"
+    assert await cache.get_or_load("k", load) == "v"
+    assert len(calls) == 1
+    assert json.loads(cache.l2.data["k"])["value"] == "v"
+
+async def test_invalidate_clears_both_tiers_and_broadcasts(cache):
+    load, calls = counting_loader()
+    await cache.get_or_load("k", load)
+
+    await cache.invalidate("k")
+
+    assert "k" not in cache.entries and "k" not in cache.l2.data
+    assert cache.l2.redis_client.published == [{"keys": ["k"], "origin": cache.node_id}]
+    await cache.get_or_load("k", load)
+    assert len(calls) == 2
+
+async def test_invalidate_prefix_only_matches_namespace(cache):
+    load, _ = counting_loader()
+    for key in ("products:1", "products:2", "productsx:1"):
+        await cache.get_or_load(key, load)
+
+    await cache.invalidate_prefix("products")
+
+    assert list(cache.entries) == ["productsx:1"]
+    assert list(cache.l2.data) == ["productsx:1"]
+
+async def test_value_loaded_across_an_invalidation_is_not_cached(cache):
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_load():
+        started.set()
+        await release.wait()
+        return "old"
+
+    task = asyncio.create_task(cache.get_or_load("k", slow_load))
+    await started.wait()
+    await cache.invalidate("k")
+    release.set()
+
+    # 等待者仍拿到结果，但结果不写回任何一级缓存
+    assert await task == "old"
+    assert "k" not in cache.entries and "k" not in cache.l2.data
+
+async def test_stale_value_without_background_reloads_synchronously(cache):
+    await cache.set("k", "old", ttl=0, stale_ttl=60)
+    load, calls = counting_loader("new")
+
+    assert await cache.get_or_load("k", load, background=False) == "new"
+    assert len(calls) == 1
+
+async def test_stale_value_is_served_while_refreshing_in_background(cache):
+    await cache.set("k", "old", ttl=0, stale_ttl=60)
+    load, calls = counting_loader("new")
+
+    assert await cache.get_or_load("k", load) == "old"
+    await asyncio.gather(*cache._background)
+    assert len(calls) == 1 and cache.entries["k"][0] == "new"
+
+async def test_remote_invalidations_apply_and_own_are_ignored(cache):
+    await cache.set("a", 1)
+    await cache.set("b", 2)
+    await cache.set("products:1", 3)
+    seen = []
+    cache.add_listener(seen.append)
+    cache.l2.redis_client.incoming = [
+        {"type": "subscribe", "data": 1},
+        {"type": "message", "data": json.dumps({"keys": ["a"], "origin": cache.node_id})},
+        {"type": "message", "data": json.dumps({"keys": ["b"], "prefixes": ["products"], "origin": "other"})},
+    ]
+
+    with pytest.raises(asyncio.CancelledError):
+        await cache._listen()
+
+    assert list(cache.entries) == ["a"]
+    assert seen == ["b", "products"]
@@ -0,0 +1,101 @@
+import json
+import pytest
+from sqlalchemy import select
+from app.db.models import User, UserRole
+from app.services import user_import
+from app.services.user_import import UserImporter
+
+PASSWORD = "Secret123!"
+
+class FakeTaskManager:
+    def __init__(self, progress=None):
+        self.progress = progress or {}
+        self.reports = []
+
+    async def get_progress(self):
+        return dict(self.progress)
+
+    async def report_progress(self, **progress):
+        self.reports.append(progress)
+
+class FakeHasher:
+    async def hash_many(self, passwords):
+        return [f"hashed:{password}" for password in passwords]
+
+@pytest.fixture
+def importer(db_factory, use_primary, monkeypatch, tmp_path):
+    use_primary(user_import, db_factory)
+    monkeypatch.setattr(user_import, "import_hasher", FakeHasher())
+    monkeypatch.setattr(user_import, "task_manager", FakeTaskManager())
+    return UserImporter(str(tmp_path), chunk_size=2)
+
+def record(name, **values):
+    return {"username": name, "email": f"{name}@example.com", "password": PASSWORD, **values}
+
+def write_ndjson(tmp_path, records):
+    path = tmp_path / "users.ndjson"
+    path.write_text("".join(json.dumps(item) + "\n" for item in records))
+    return str(path)
+
+async def usernames(factory):
+    async with factory() as db:
+        return sorted((await db.scalars(select(User.username))).all())
+
+def test_validate_accepts_roles(importer):
+    error, user = importer._validate(record("alice", role="admin"), set())
+    assert error is None and user.role == UserRole.ADMIN
+
+    error, user = importer._validate(record("bob"), set())
+    assert error is None and user.role == UserRole.CLIENT
+
+def test_validate_rejects_duplicates_within_file(importer):
+    seen = set()
+    assert importer._validate(record("alice"), seen)[0] is None
+    error, _ = importer._validate(record("alice"), seen)
+    assert error == "Duplicate username or email in file"
+
+async def test_insert_falls_back_to_rows_on_conflict(importer, db_factory):
+    async with db_factory() as db:
+        db.add(User(username="taken", email="taken@example.com", role=UserRole.CLIENT))
+        await db.commit()
+
+    report = {"failed": 0, "errors": []}
+    rows = [
+        (1, {"username": "taken", "email": "other@example.com", "hashed_password": "x", "role": UserRole.CLIENT}),
+        (2, {"username": "fresh", "email": "fresh@example.com", "hashed_password": "x", "role": UserRole.CLIENT}),
+    ]
+    assert await importer._insert(rows, report) == 1
+    assert report == {"failed": 1, "errors": [{"line": 1, "error": "Username or email already exists"}]}
+    assert await usernames(db_factory) == ["fresh", "taken"]
+
+async def test_run_resumes_after_committed_rows(importer, db_factory, tmp_path, monkeypatch):
+    path = write_ndjson(tmp_path, [record("first"), record("second"), record("third")])
+    tasks = FakeTaskManager({"processed": 2, "created": 2, "failed": 0, "errors": []})
+    monkeypatch.setattr(user_import, "task_manager", tasks)
+
+    report = await importer.run(path, "ndjson")
+
+    assert report["processed"] == 3 and report["created"] == 3
+    assert await usernames(db_factory) == ["third"]
+    assert tasks.reports[-1]["processed"] == 3
+
+async def test_run_reports_existing_and_invalid_rows(importer, db_factory, tmp_path):
+    async with db_factory() as db:
+        db.add(User(username="taken", email="taken@example.com", role=UserRole.CLIENT))
+        await db.commit()
+    path = write_ndjson(tmp_path, [record("taken"), record("weak", password="short"), record("new")])
+
+    report = await importer.run(path, "ndjson")
+
+    assert report["created"] == 1 and report["failed"] == 2
+    assert {error["line"] for error in report["errors"]} == {1, 2}
+    assert await usernames(db_factory) == ["new", "taken"]
+
+async def test_save_upload_streams_to_file(importer):
+    async def stream():
+        yield b'[{"username": '
+        yield b'"alice"}]'
+
+    path = await importer.save_upload(stream(), "json")
+    with open(path, "rb") as f:
+        assert f.read() == b'[{"username": "alice"}]'
@@ -1,30 +1,163 @@
 import aiohttp
+import asyncio
 import hashlib
+import random
+import time
 from datetime import datetime
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from dotenv import load_dotenv
+from logger import setup_logger
 
 load_dotenv()
 
+logger = setup_logger("whmcs")
+
+# 各接口的超时时间（秒），未列出的使用默认值
+ACTION_TIMEOUTS = {
+    'AddOrder': 30,
+    'CreateInvoice': 30,
+    'AddClient': 20,
+}
+
+# 幂等接口，失败时可以安全重试
+IDEMPOTENT_ACTIONS = {
+    'GetProducts',
+    'GetInvoice',
+    'GetClientsProducts',
+}
+
+class WHMCSError(Exception):
+    """WHMCS请求失败"""
+
+class WHMCSUnavailableError(WHMCSError):
+    """WHMCS不可用，熔断器处于打开状态"""
+
+class CircuitBreaker:
+    """连续失败达到阈值后打开，冷却期内直接失败，之后放行一个探测请求"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning("WHMCS circuit breaker opened")
+            self.opened_at = time.monotonic()
+
 class WHMCSClient:
     def __init__(self):
         self.api_url = os.getenv("WHMCS_API_URL")
         self.identifier = os.getenv("WHMCS_IDENTIFIER")
         self.secret = os.getenv("WHMCS_SECRET")
-        
+        self.default_timeout = float(os.getenv("WHMCS_TIMEOUT", "10"))
+        self.max_retries = int(os.getenv("WHMCS_MAX_RETRIES", "3"))
+        self.pool_size = int(os.getenv("WHMCS_POOL_SIZE", "20"))
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("WHMCS_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("WHMCS_BREAKER_RESET", "30"))
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取长连接会话，每个worker复用同一个连接池"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                ttl_dns_cache=300,
+                keepalive_timeout=60,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self) -> None:
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _build_fields(self, action: str, params: Dict[str, Any]) -> List[Tuple[str, str]]:
+        fields = []
+        for key, value in params.items():
+            # 列表参数（如 itemamount[]）展开为多个同名字段
+            values = value if isinstance(value, list) else [value]
+            for item in values:
+                if isinstance(item, bool):
+                    item = int(item)
+                fields.append((key, str(item)))
+        fields.extend([
+            ('identifier', self.identifier),
+            ('secret', self.secret),
+            ('action', action),
+            ('responsetype', 'json'),
+        ])
+        return fields
+
     async def _make_request(self, action: str, params: Dict[str, Any]) -> Dict:
         """发送请求到WHMCS API"""
-        params.update({
-            'identifier': self.identifier,
-            'secret': self.secret,
-            'action': action,
-            'responsetype': 'json',
-        })
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self.api_url, data=params) as response:
-                return await response.json()
+        # 半开状态下本次请求就是探测请求，无论以何种方式结束都要释放探测名额
+        probe = self.breaker.state == "half_open"
+        if not self.breaker.allow_request():
+            raise WHMCSUnavailableError(f"WHMCS circuit open, {action} rejected")
+
+        fields = self._build_fields(action, params)
+        timeout = aiohttp.ClientTimeout(
+            total=ACTION_TIMEOUTS.get(action, self.default_timeout)
+        )
+        attempts = self.max_retries + 1 if action in IDEMPOTENT_ACTIONS else 1
+
+        try:
+            for attempt in range(attempts):
+                try:
+                    session = self._get_session()
+                    async with session.post(self.api_url, data=fields, timeout=timeout) as response:
+                        if response.status >= 500:
+                            raise WHMCSError(f"WHMCS returned HTTP {response.status}")
+                        result = await response.json(content_type=None)
+                    self.breaker.record_success()
+                    return result
+                except Exception as e:
+                    # 包括非JSON响应体等意外错误，调用方统一按 WHMCSError 处理
+                    self.breaker.record_failure()
+                    if attempt + 1 >= attempts or not self.breaker.allow_request():
+                        logger.error(f"WHMCS {action} failed: {str(e)}")
+                        raise WHMCSError(f"WHMCS {action} failed: {str(e)}") from e
+                    # 带抖动的指数退避
+                    delay = random.uniform(0, min(10, 0.5 * 2 ** attempt))
+                    logger.warning(f"WHMCS {action} failed ({str(e)}), retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+        finally:
+            # 探测请求被取消时不会记录成功或失败，不释放则熔断器会一直拒绝请求
+            if probe:
+                self.breaker.probing = False
     
     async def create_client(self, email: str, password: str, firstname: str, 
                           lastname: str) -> Dict:
@@ -37,6 +170,12 @@ class WHMCSClient:
         }
         return await self._make_request('AddClient', params)
     
+    @staticmethod
+    def parse_service_id(response: Dict) -> Optional[int]:
+        """从AddOrder响应中取出第一个服务ID"""
+        service_ids = str(response.get('serviceids') or '').split(',')
+        return int(service_ids[0]) if service_ids[0] else None
+    
     async def create_order(self, client_id: int, product_id: int, 
                          payment_method: str = "alipay") -> Dict:
         """在WHMCS中创建订单"""